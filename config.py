@@ -58,13 +58,20 @@ def init_logging(level, log_to_file):
 class _FoulPlayConfig:
     battle_bot_module: str
     websocket_uri: str
+    login_uri: str
     username: str
     password: str
     bot_mode: str
     pokemon_mode: str = ""
     search_time_ms: int
+    dynamic_search_time: bool
     parallelism: int
+    anytime_search: bool
+    root_parallel_search: bool
     run_count: int
+    concurrent_battles: int
+    reconnect_attempts: int
+    results_file: Optional[str]
     team: str
     user_to_challenge: str
     save_replay: bool
@@ -78,15 +85,22 @@ class _FoulPlayConfig:
     def configure(self):
         self.battle_bot_module = env("BATTLE_BOT")
         self.websocket_uri = env("WEBSOCKET_URI")
+        self.login_uri = env("LOGIN_URI", "https://play.pokemonshowdown.com/api/login")
         self.username = env("PS_USERNAME")
         self.password = env("PS_PASSWORD")
         self.bot_mode = env("BOT_MODE")
         self.pokemon_mode = env("POKEMON_MODE")
 
         self.search_time_ms = env.int("SEARCH_TIME_MS", 100)
+        self.dynamic_search_time = env.bool("DYNAMIC_SEARCH_TIME", False)
         self.parallelism = env.int("MCTS_PARALLELISM", 1)
+        self.anytime_search = env.bool("ANYTIME_SEARCH", False)
+        self.root_parallel_search = env.bool("ROOT_PARALLEL_SEARCH", False)
 
         self.run_count = env.int("RUN_COUNT", 1)
+        self.concurrent_battles = env.int("BATTLE_CONCURRENCY", 1)
+        self.reconnect_attempts = env.int("RECONNECT_ATTEMPTS", 5)
+        self.results_file = env("RESULTS_FILE", None)
         self.team = env("TEAM_NAME", None)
         self.user_to_challenge = env("USER_TO_CHALLENGE", None)
 
@@ -107,5 +121,11 @@ class _FoulPlayConfig:
                 self.user_to_challenge is not None
             ), "If bot_mode is `CHALLENGE_USER, you must declare USER_TO_CHALLENGE"
 
+        assert self.concurrent_battles >= 1, "BATTLE_CONCURRENCY must be at least 1"
+        # battle factory sets depend on the tier of each battle
+        assert (
+            self.concurrent_battles == 1 or "battlefactory" not in self.pokemon_mode
+        ), "BATTLE_CONCURRENCY cannot be used with battle factory"
+
 
 FoulPlayConfig = _FoulPlayConfig()
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import ntpath
 from abc import ABC, abstractmethod
+from contextvars import ContextVar
 from dataclasses import dataclass
 
 import requests
@@ -17,7 +18,7 @@ from typing import Optional
 
 import constants
 from data import all_move_json
-from fp.helpers import calculate_stats
+from fp.helpers import calculate_speed_stats
 from fp.helpers import normalize_name
 
 PWD = os.path.dirname(os.path.abspath(__file__))
@@ -52,27 +53,34 @@ def spreads_are_alike(s1, s2):
     return all(v < 24 for v in diff)
 
 
+def get_speed_checks(pkmn: Pokemon, pkmn_sets: list[PokemonSet]) -> list[bool]:
+    """
+    Whether the speed of each set is within the pokemon's speed range
+    The speeds of all of the sets are calculated at once
+
+    The only non-observable speed modifier that should allow a
+    Pokemon's speed_range to be set is choicescarf
+    """
+    speeds = calculate_speed_stats(
+        pkmn.base_stats[constants.SPEED],
+        pkmn.level,
+        [(pkmn_set.nature, pkmn_set.evs) for pkmn_set in pkmn_sets],
+    )
+    return [
+        pkmn.speed_range.min
+        <= (int(speed * 1.5) if pkmn_set.item == "choicescarf" else speed)
+        <= pkmn.speed_range.max
+        for pkmn_set, speed in zip(pkmn_sets, speeds)
+    ]
+
+
 @dataclass
 class PredictedPokemonSet:
     pkmn_set: PokemonSet
     pkmn_moveset: PokemonMoveset
 
     def speed_check(self, pkmn: Pokemon):
-        """
-        The only non-observable speed modifier that should allow a
-        Pokemon's speed_range to be set is choicescarf
-        """
-        stats = calculate_stats(
-            pkmn.base_stats,
-            pkmn.level,
-            evs=self.pkmn_set.evs,
-            nature=self.pkmn_set.nature,
-        )
-        speed = stats[constants.SPEED]
-        if self.pkmn_set.item == "choicescarf":
-            speed = int(speed * 1.5)
-
-        return pkmn.speed_range.min <= speed <= pkmn.speed_range.max
+        return get_speed_checks(pkmn, [self.pkmn_set])[0]
 
     def item_check(self, pkmn: Pokemon) -> bool:
         if pkmn.item == self.pkmn_set.item:
@@ -146,13 +154,13 @@ class PokemonSet:
     level: Optional[int] = 100
     tera_type: Optional[str] = None
 
-    def set_makes_sense(self, pkmn: Pokemon, match_traits):
+    def set_makes_sense(self, pkmn: Pokemon, match_traits, speed_check=True):
         p = PredictedPokemonSet(pkmn_set=self, pkmn_moveset=PokemonMoveset(moves=()))
         return p.predicted_set_makes_sense(
             pkmn,
             match_ability=match_traits,
             match_item=match_traits,
-            speed_check=True,
+            speed_check=speed_check,
         )
 
 
@@ -193,11 +201,44 @@ class PokemonMoveset:
         return len(self.moves)
 
 
+# the sets each pokemon can still have in the battle being played, for every dataset
+# a battle is played in its own asyncio task so sets removed in one battle are not removed in another
+_battle_pkmn_sets: ContextVar[Optional[dict]] = ContextVar(
+    "battle_pkmn_sets", default=None
+)
+
+
+def start_battle_pkmn_sets():
+    """
+    Gives the battle being played its own sets in every dataset
+
+    Must be called from the task that plays the battle. Searches run in other threads
+    must be run in a copy of that task's context to see the battle's sets
+    """
+    _battle_pkmn_sets.set({})
+
+
 class PokemonSets(ABC):
+    # `raw_pkmn_sets` is shared by every battle. It is replaced rather than changed in place
+    # because other battles may be reading it from another thread
     raw_pkmn_sets: dict[str, list]
-    pkmn_sets: dict[str, list]
     pkmn_mode: str
 
+    @property
+    def pkmn_sets(self) -> dict[str, list]:
+        battle_pkmn_sets = _battle_pkmn_sets.get()
+        if battle_pkmn_sets is None:
+            return self._pkmn_sets
+        return battle_pkmn_sets.setdefault(self, {})
+
+    @pkmn_sets.setter
+    def pkmn_sets(self, pkmn_sets: dict[str, list]):
+        battle_pkmn_sets = _battle_pkmn_sets.get()
+        if battle_pkmn_sets is None:
+            self._pkmn_sets = pkmn_sets
+        else:
+            battle_pkmn_sets[self] = pkmn_sets
+
     @abstractmethod
     def initialize(self, pkmn_mode: str, pkmn_names: set[str]): ...
 
@@ -248,7 +289,7 @@ class _RandomBattleSets(PokemonSets):
         )
         with open(randombattle_sets_path, "r") as f:
             sets = json.load(f)
-        self.raw_pkmn_sets = sets
+        return sets
 
     def _initialize_pkmn_sets(self):
         for pkmn, sets in self.raw_pkmn_sets.items():
@@ -281,10 +322,10 @@ class _RandomBattleSets(PokemonSets):
     def initialize(self, pkmn_mode: str, _pkmn_names=None):
         # pkmn_names unused here since randombattles don't have team preview
         # always load entire JSON into memory
-        self.raw_pkmn_sets = {}
+        if pkmn_mode != self.pkmn_mode:
+            self.raw_pkmn_sets = self._load_raw_sets(pkmn_mode)
+            self.pkmn_mode = pkmn_mode
         self.pkmn_sets = {}
-        self.pkmn_mode = pkmn_mode
-        self._load_raw_sets(pkmn_mode)
         self._initialize_pkmn_sets()
 
     def remove_item_possibility(self, pkmn_name: str, item: str):
@@ -361,11 +402,13 @@ class _TeamDatasets(PokemonSets):
             sets_dict = self._get_battle_factory_sets_dict(battle_factory_tier_name)
         else:
             sets_dict = self._get_sets_dict()
+        raw_pkmn_sets = {}
         for pkmn in pkmn_names:
             try:
-                self.raw_pkmn_sets[pkmn] = sets_dict[pkmn]
+                raw_pkmn_sets[pkmn] = sets_dict[pkmn]
             except KeyError:
                 logger.warning("No pokemon sets for {}".format(pkmn))
+        return raw_pkmn_sets
 
     def _add_to_pkmn_sets(self, raw_sets: dict[str, list]):
         for pkmn, sets in raw_sets.items():
@@ -397,13 +440,24 @@ class _TeamDatasets(PokemonSets):
     def initialize(
         self, pkmn_mode: str, pkmn_names: set[str], battle_factory_tier_name=None
     ):
-        self.raw_pkmn_sets = {}
+        # the raw sets loaded for other battles in the same mode are kept and only new pokemon are loaded
+        # battle factory sets depend on the tier of each battle so they are always loaded
+        if pkmn_mode == self.pkmn_mode and battle_factory_tier_name is None:
+            self.raw_pkmn_sets = {
+                **self.raw_pkmn_sets,
+                **self._load_team_datasets(
+                    {p for p in pkmn_names if p not in self.raw_pkmn_sets}
+                ),
+            }
+        else:
+            self.pkmn_mode = pkmn_mode
+            self.raw_pkmn_sets = self._load_team_datasets(
+                pkmn_names, battle_factory_tier_name=battle_factory_tier_name
+            )
         self.pkmn_sets = {}
-        self.pkmn_mode = pkmn_mode
-        self._load_team_datasets(
-            pkmn_names, battle_factory_tier_name=battle_factory_tier_name
+        self._add_to_pkmn_sets(
+            {p: self.raw_pkmn_sets[p] for p in pkmn_names if p in self.raw_pkmn_sets}
         )
-        self._add_to_pkmn_sets(self.raw_pkmn_sets)
 
     def add_new_pokemon(self, pkmn_name: str):
         sets_dict = self._get_sets_dict()
@@ -426,17 +480,36 @@ class _TeamDatasets(PokemonSets):
     def predict_set(
         self, pkmn: Pokemon, match_traits=True
     ) -> Optional[PredictedPokemonSet]:
-        for pkmn_set in self.get_pkmn_sets_from_pkmn_name(pkmn.name, pkmn.base_name):
-            if pkmn_set.full_set_pkmn_can_have_set(
+        pkmn_sets = self.get_pkmn_sets_from_pkmn_name(pkmn.name, pkmn.base_name)
+        speed_checks = get_speed_checks(pkmn, [s.pkmn_set for s in pkmn_sets])
+        for pkmn_set, speed_check in zip(pkmn_sets, speed_checks):
+            if speed_check and pkmn_set.full_set_pkmn_can_have_set(
                 pkmn,
                 match_ability=match_traits,
                 match_item=match_traits,
-                speed_check=True,
+                speed_check=False,
             ):
                 return pkmn_set
 
         return None
 
+    def get_all_remaining_sets(
+        self, pkmn: Pokemon, match_traits=True
+    ) -> list[PredictedPokemonSet]:
+        remaining_sets = []
+        pkmn_sets = self.get_pkmn_sets_from_pkmn_name(pkmn.name, pkmn.base_name)
+        speed_checks = get_speed_checks(pkmn, [s.pkmn_set for s in pkmn_sets])
+        for pkmn_set, speed_check in zip(pkmn_sets, speed_checks):
+            if speed_check and pkmn_set.full_set_pkmn_can_have_set(
+                pkmn,
+                match_ability=match_traits,
+                match_item=match_traits,
+                speed_check=False,
+            ):
+                remaining_sets.append(pkmn_set)
+
+        return remaining_sets
+
 
 class _SmogonSets(PokemonSets):
     def __init__(self):
@@ -655,19 +728,30 @@ class _SmogonSets(PokemonSets):
             )
             self.current_pkmn_sets_url = smogon_stats_url
         else:
+            # the raw sets loaded for other battles in the same mode are kept and only new pokemon are loaded
             new_pkmn_names = [p for p in pkmn_names if p not in self.raw_pkmn_sets]
             if new_pkmn_names:
-                self.raw_pkmn_sets = self._get_pokemon_information(
-                    smogon_stats_url, pkmn_names
-                )
+                self.raw_pkmn_sets = {
+                    **self.raw_pkmn_sets,
+                    **self._get_pokemon_information(smogon_stats_url, pkmn_names),
+                }
 
-        self._initialize(self.raw_pkmn_sets)
+        self.pkmn_sets = {}
+        self._initialize(
+            {
+                p: sets
+                for p, sets in self.raw_pkmn_sets.items()
+                if not pkmn_names
+                or p in pkmn_names
+                or self._pokemon_is_similar(p, pkmn_names)
+            }
+        )
 
     def add_new_pokemon(self, pkmn_name: str):
         pkmn_information = self._get_pokemon_information(
             self.current_pkmn_sets_url, {pkmn_name}
         )
-        self.raw_pkmn_sets.update(pkmn_information)
+        self.raw_pkmn_sets = {**self.raw_pkmn_sets, **pkmn_information}
         self._initialize(pkmn_information)
 
     def remove_item_possibility(self, pkmn_name: str, item: str):
@@ -689,14 +773,39 @@ class _SmogonSets(PokemonSets):
             logger.warning("Called `predict_set` when pkmn_sets was empty")
 
         pokemon_set = None
-        for pkmn_set in self.get_pkmn_sets_from_pkmn_name(pkmn.name, pkmn.base_name):
-            if pkmn_set.set_makes_sense(pkmn, match_traits):
+        pkmn_sets = self.get_pkmn_sets_from_pkmn_name(pkmn.name, pkmn.base_name)
+        speed_checks = get_speed_checks(pkmn, pkmn_sets)
+        for pkmn_set, speed_check in zip(pkmn_sets, speed_checks):
+            if speed_check and pkmn_set.set_makes_sense(
+                pkmn, match_traits, speed_check=False
+            ):
                 pokemon_set = pkmn_set
                 break
 
         if pokemon_set is None:
             return None
 
+        return self.predict_moveset(pkmn, pokemon_set, num_predicted_moves)
+
+    def get_all_remaining_sets(
+        self, pkmn: Pokemon, match_traits=True
+    ) -> list[PokemonSet]:
+        if not self.pkmn_sets:
+            logger.warning("Called `get_all_remaining_sets` when pkmn_sets was empty")
+            return []
+
+        pkmn_sets = self.get_pkmn_sets_from_pkmn_name(pkmn.name, pkmn.base_name)
+        speed_checks = get_speed_checks(pkmn, pkmn_sets)
+        return [
+            pkmn_set
+            for pkmn_set, speed_check in zip(pkmn_sets, speed_checks)
+            if speed_check
+            and pkmn_set.set_makes_sense(pkmn, match_traits, speed_check=False)
+        ]
+
+    def predict_moveset(
+        self, pkmn: Pokemon, pokemon_set: PokemonSet, num_predicted_moves=4
+    ) -> PredictedPokemonSet:
         predicted_pokemon_set = PredictedPokemonSet(
             pkmn_set=pokemon_set,
             pkmn_moveset=PokemonMoveset(moves=tuple(m.name for m in pkmn.moves)),
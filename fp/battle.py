@@ -1,4 +1,3 @@
-from collections import defaultdict
 from collections import namedtuple
 from copy import copy
 from abc import ABC
@@ -57,6 +56,128 @@ boost_multiplier_lookup = {
 }
 
 
+def _copy_slots(obj):
+    # `copy` is much slower for objects with __slots__, it goes through __reduce_ex__
+    obj_copy = obj.__class__.__new__(obj.__class__)
+    for attr in obj.__slots__:
+        setattr(obj_copy, attr, getattr(obj, attr))
+    return obj_copy
+
+
+class _FixedIndexCounts:
+    """
+    Counts that are read and written like a dict that defaults to 0
+    The known keys have a fixed index in a list, other keys are kept in a dict
+    that is only created once one of them is written
+    """
+
+    __slots__ = ("values", "others")
+    KEYS = ()
+    INDICES = {}
+
+    def __init__(self, counts=None):
+        self.values = [0] * len(self.KEYS)
+        self.others = None
+        if counts:
+            self.update(counts)
+
+    def __getitem__(self, key):
+        index = self.INDICES.get(key)
+        if index is not None:
+            return self.values[index]
+        if self.others is None:
+            return 0
+        return self.others.get(key, 0)
+
+    def __setitem__(self, key, value):
+        index = self.INDICES.get(key)
+        if index is not None:
+            self.values[index] = value
+        else:
+            if self.others is None:
+                self.others = {}
+            self.others[key] = value
+
+    def items(self):
+        # only the keys that are not 0, like the keys of a dict that were set
+        items = [(k, v) for k, v in zip(self.KEYS, self.values) if v]
+        if self.others is not None:
+            items.extend((k, v) for k, v in self.others.items() if v)
+        return items
+
+    def keys(self):
+        return [k for k, _ in self.items()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def update(self, counts):
+        for key, value in counts.items():
+            self[key] = value
+
+    def clear(self):
+        self.values = [0] * len(self.KEYS)
+        self.others = None
+
+    def copy(self):
+        counts = self.__class__.__new__(self.__class__)
+        counts.values = self.values.copy()
+        counts.others = None if self.others is None else self.others.copy()
+        return counts
+
+    def __eq__(self, other):
+        # a key that is missing is the same as a key that is 0
+        if not isinstance(other, (_FixedIndexCounts, dict)):
+            return NotImplemented
+        return dict(self.items()) == {k: v for k, v in other.items() if v}
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, dict(self.items()))
+
+
+class Boosts(_FixedIndexCounts):
+    __slots__ = ()
+    KEYS = (
+        constants.ATTACK,
+        constants.DEFENSE,
+        constants.SPECIAL_ATTACK,
+        constants.SPECIAL_DEFENSE,
+        constants.SPEED,
+        constants.ACCURACY,
+        constants.EVASION,
+    )
+    INDICES = {k: i for i, k in enumerate(KEYS)}
+
+
+class SideConditions(_FixedIndexCounts):
+    __slots__ = ()
+    # the side conditions that poke-engine knows about
+    KEYS = (
+        constants.AURORA_VEIL,
+        "craftyshield",
+        constants.HEALING_WISH,
+        constants.LIGHT_SCREEN,
+        "luckychant",
+        "lunardance",
+        "matblock",
+        "mist",
+        constants.PROTECT,
+        "quickguard",
+        constants.REFLECT,
+        constants.SAFEGUARD,
+        constants.SPIKES,
+        constants.STEALTH_ROCK,
+        constants.STICKY_WEB,
+        constants.TAILWIND,
+        constants.TOXIC_COUNT,
+        constants.TOXIC_SPIKES,
+        "wideguard",
+    )
+    INDICES = {k: i for i, k in enumerate(KEYS)}
+
+
 class Battle(ABC):
     def __init__(self, battle_tag):
         self.battle_tag = battle_tag
@@ -85,6 +206,18 @@ class Battle(ABC):
 
         self.request_json = None
 
+    def snapshot(self):
+        """
+        A copy of the battle that can be changed without changing this battle
+
+        Only the parts that are changed when filling in or searching a battle are copied.
+        The request json, the pokedex data, strings and tuples are shared with the snapshot
+        """
+        battle = copy(self)
+        battle.user = self.user.snapshot()
+        battle.opponent = self.opponent.snapshot()
+        return battle
+
     def initialize_team_preview(self, user_json, opponent_pokemon, battle_type):
         self.user.initialize_first_turn_user_from_json(user_json)
         self.user.reserve.insert(0, self.user.active)
@@ -181,10 +314,24 @@ class Battle(ABC):
 
 
 class Battler:
+    __slots__ = (
+        "active",
+        "reserve",
+        "_side_conditions",
+        "name",
+        "trapped",
+        "baton_passing",
+        "wish",
+        "future_sight",
+        "account_name",
+        "last_selected_move",
+        "last_used_move",
+    )
+
     def __init__(self):
         self.active = None
         self.reserve = []
-        self.side_conditions = defaultdict(lambda: 0)
+        self.side_conditions = SideConditions()
 
         self.name = None
         self.trapped = False
@@ -201,6 +348,23 @@ class Battler:
         self.last_selected_move = LastUsedMove("", "", 0)
         self.last_used_move = LastUsedMove("", "", 0)
 
+    @property
+    def side_conditions(self):
+        return self._side_conditions
+
+    @side_conditions.setter
+    def side_conditions(self, side_conditions):
+        if not isinstance(side_conditions, SideConditions):
+            side_conditions = SideConditions(side_conditions)
+        self._side_conditions = side_conditions
+
+    def snapshot(self):
+        battler = _copy_slots(self)
+        battler.active = self.active.snapshot() if self.active is not None else None
+        battler.reserve = [p.snapshot() for p in self.reserve]
+        battler._side_conditions = self._side_conditions.copy()
+        return battler
+
     def mega_revealed(self):
         return self.active.is_mega or any(p.is_mega for p in self.reserve)
 
@@ -464,15 +628,60 @@ class Battler:
             constants.RESERVE: [p.to_dict() for p in self.reserve],
             constants.WISH: copy(self.wish),
             constants.FUTURE_SIGHT: copy(self.future_sight),
-            constants.SIDE_CONDITIONS: copy(self.side_conditions),
+            constants.SIDE_CONDITIONS: dict(self.side_conditions.items()),
         }
 
 
 class Pokemon:
+    __slots__ = (
+        "name",
+        "nickname",
+        "base_name",
+        "index",
+        "level",
+        "nature",
+        "evs",
+        "speed_range",
+        "hidden_power_possibilities",
+        "base_stats",
+        "stats",
+        "max_hp",
+        "hp",
+        "substitute_hit",
+        "ability",
+        "types",
+        "item",
+        "unknown_forme",
+        "moves_used_since_switch_in",
+        "zoroark_disguised_as",
+        "terastallized",
+        "tera_type",
+        "original_ability",
+        "fainted",
+        "reviving",
+        "moves",
+        "status",
+        "volatile_statuses",
+        "_boosts",
+        "rest_turns",
+        "sleep_turns",
+        "knocked_off",
+        "can_mega_evo",
+        "can_ultra_burst",
+        "can_dynamax",
+        "can_terastallize",
+        "is_mega",
+        "can_have_choice_item",
+        "item_inferred",
+        "gen_3_consecutive_sleep_talks",
+        "impossible_items",
+    )
+
     def __init__(self, name: str, level: int, nature="serious", evs=(85,) * 6):
         self.name = normalize_name(name)
         self.nickname = None
         self.base_name = self.name
+        self.index = None
         self.level = level
         self.nature = nature
         self.evs = evs
@@ -513,7 +722,7 @@ class Pokemon:
         self.moves = []
         self.status = None
         self.volatile_statuses = []
-        self.boosts = defaultdict(lambda: 0)
+        self.boosts = Boosts()
         self.rest_turns = 0
         self.sleep_turns = 0
         self.knocked_off = False
@@ -527,6 +736,28 @@ class Pokemon:
         self.gen_3_consecutive_sleep_talks = 0
         self.impossible_items = set()
 
+    @property
+    def boosts(self):
+        return self._boosts
+
+    @boosts.setter
+    def boosts(self, boosts):
+        if not isinstance(boosts, Boosts):
+            boosts = Boosts(boosts)
+        self._boosts = boosts
+
+    def snapshot(self):
+        # base_stats and types are never changed in place, they are replaced
+        pkmn = _copy_slots(self)
+        pkmn.stats = self.stats.copy()
+        pkmn._boosts = self._boosts.copy()
+        pkmn.moves = [m.snapshot() for m in self.moves]
+        pkmn.volatile_statuses = self.volatile_statuses.copy()
+        pkmn.moves_used_since_switch_in = self.moves_used_since_switch_in.copy()
+        pkmn.hidden_power_possibilities = self.hidden_power_possibilities.copy()
+        pkmn.impossible_items = self.impossible_items.copy()
+        return pkmn
+
     def forme_change(self, new_forme_switch_string):
         current_hp_percentage = self.hp / self.max_hp
 
@@ -631,7 +862,7 @@ class Pokemon:
             constants.STATS: self.stats,
             constants.NATURE: self.nature,
             constants.EVS: self.evs,
-            constants.BOOSTS: self.boosts,
+            constants.BOOSTS: dict(self.boosts.items()),
             constants.STATUS: self.status,
             constants.TERASTALLIZED: self.terastallized,
             constants.VOLATILE_STATUS: set(self.volatile_statuses),
@@ -655,6 +886,8 @@ class Pokemon:
 
 
 class Move:
+    __slots__ = ("name", "max_pp", "disabled", "can_z", "current_pp")
+
     def __init__(self, name):
         name = normalize_name(name)
         if (
@@ -673,6 +906,9 @@ class Move:
         self.can_z = False
         self.current_pp = self.max_pp
 
+    def snapshot(self):
+        return _copy_slots(self)
+
     def to_dict(self):
         return {
             "id": self.name,
@@ -1,12 +1,23 @@
 import logging
-from copy import deepcopy
+import random
+from collections import namedtuple
+from typing import Optional
 
 import constants
-from data.pkmn_sets import RandomBattleTeamDatasets, TeamDatasets, SmogonSets
-from fp.battle import Pokemon, Battle
+from data.pkmn_sets import (
+    PredictedPokemonSet,
+    RandomBattleTeamDatasets,
+    TeamDatasets,
+    SmogonSets,
+)
+from fp.battle import Pokemon, Battle, Battler
+from fp.helpers import get_pokemon_info_from_condition, normalize_name
 
 logger = logging.getLogger(__name__)
 
+# the parts of a battle that `format_decision` reads
+RequestBattle = namedtuple("RequestBattle", ["user", "rqid"])
+
 
 def log_predicted_set(pkmn, source=None):
     s = "Predicted set: {} {} {} {} {} {}".format(
@@ -26,7 +37,7 @@ def log_predicted_set(pkmn, source=None):
 
 
 def prepare_battle(battle: Battle, fn: callable):
-    battle = deepcopy(battle)
+    battle = battle.snapshot()
 
     fn(battle.opponent.active)
     for pkmn in filter(lambda x: x.is_alive(), battle.opponent.reserve):
@@ -73,6 +84,19 @@ def fill_in_randombattle_unknowns(pkmn: Pokemon):
                 break
 
 
+def apply_predicted_set(pkmn: Pokemon, predicted_set: PredictedPokemonSet, source=None):
+    pkmn.moves = []
+    for mv in predicted_set.pkmn_moveset.moves:
+        pkmn.add_move(mv)
+    pkmn.ability = pkmn.ability or predicted_set.pkmn_set.ability
+    if pkmn.item == constants.UNKNOWN_ITEM:
+        pkmn.item = predicted_set.pkmn_set.item
+    pkmn.set_spread(predicted_set.pkmn_set.nature, predicted_set.pkmn_set.evs)
+    if predicted_set.pkmn_set.tera_type is not None:
+        pkmn.tera_type = predicted_set.pkmn_set.tera_type
+    log_predicted_set(pkmn, source)
+
+
 def fill_in_battle_factory_unknowns(pkmn: Pokemon):
     predicted_team_set = TeamDatasets.predict_set(pkmn)
     predicted_team_set_no_ability_item_match = TeamDatasets.predict_set(
@@ -89,16 +113,7 @@ def fill_in_battle_factory_unknowns(pkmn: Pokemon):
         predicted_set = None
 
     if predicted_set is not None:
-        pkmn.moves = []
-        for mv in predicted_set.pkmn_moveset.moves:
-            pkmn.add_move(mv)
-        pkmn.ability = pkmn.ability or predicted_set.pkmn_set.ability
-        if pkmn.item == constants.UNKNOWN_ITEM:
-            pkmn.item = predicted_set.pkmn_set.item
-        pkmn.set_spread(predicted_set.pkmn_set.nature, predicted_set.pkmn_set.evs)
-        if predicted_set.pkmn_set.tera_type is not None:
-            pkmn.tera_type = predicted_set.pkmn_set.tera_type
-        log_predicted_set(pkmn, source)
+        apply_predicted_set(pkmn, predicted_set, source)
     else:
         logger.info("Could not predict set for {}".format(pkmn.name))
 
@@ -140,20 +155,99 @@ def fill_in_standardbattle_unknowns(pkmn: Pokemon):
         source = "randombattle_datasets"
 
     if predicted_set is not None:
-        pkmn.moves = []
-        for mv in predicted_set.pkmn_moveset.moves:
-            pkmn.add_move(mv)
-        pkmn.ability = pkmn.ability or predicted_set.pkmn_set.ability
-        if pkmn.item == constants.UNKNOWN_ITEM:
-            pkmn.item = predicted_set.pkmn_set.item
-        pkmn.set_spread(predicted_set.pkmn_set.nature, predicted_set.pkmn_set.evs)
-        if predicted_set.pkmn_set.tera_type is not None:
-            pkmn.tera_type = predicted_set.pkmn_set.tera_type
-        log_predicted_set(pkmn, source)
+        apply_predicted_set(pkmn, predicted_set, source)
     else:
         logger.info("Could not predict set for {}".format(pkmn.name))
 
 
+def _sample_by_count(sets: list, counts: list[int]):
+    index = random.choices(range(len(sets)), weights=counts)[0]
+    return sets[index], counts[index] / sum(counts)
+
+
+def sample_set(
+    pkmn: Pokemon, use_smogon_sets: bool
+) -> Optional[tuple[PredictedPokemonSet, float, str]]:
+    """
+    Samples a set `pkmn` could have, weighted by how often each set is used.
+    The datasets are tried in the same order as `fill_in_standardbattle_unknowns`
+    (or `fill_in_battle_factory_unknowns` when `use_smogon_sets` is False)
+
+    Returns the set, the chance of the set being sampled, and its source,
+    or None if no dataset has a set for `pkmn`
+    """
+    if pkmn.moves or not use_smogon_sets:
+        for match_traits, source in [
+            (True, "team_datasets"),
+            (False, "team_datasets_no_trait_match"),
+        ]:
+            remaining_sets = TeamDatasets.get_all_remaining_sets(
+                pkmn, match_traits=match_traits
+            )
+            if remaining_sets:
+                predicted_set, chance = _sample_by_count(
+                    remaining_sets, [s.pkmn_set.count for s in remaining_sets]
+                )
+                return predicted_set, chance, source
+
+    if not use_smogon_sets:
+        return None
+
+    num_predicted_moves = 4 if pkmn.moves else 6
+    smogon_source = "smogon_stats" if pkmn.moves else "smogon_stats_6_moves"
+    for match_traits, source in [
+        (True, smogon_source),
+        (False, "{}_no_trait_match".format(smogon_source)),
+    ]:
+        remaining_sets = SmogonSets.get_all_remaining_sets(
+            pkmn, match_traits=match_traits
+        )
+        if remaining_sets:
+            pkmn_set, chance = _sample_by_count(
+                remaining_sets, [s.count for s in remaining_sets]
+            )
+            predicted_set = SmogonSets.predict_moveset(
+                pkmn, pkmn_set, num_predicted_moves
+            )
+            return predicted_set, chance, source
+
+    return None
+
+
+def prepare_sampled_battles(
+    battle: Battle, num_battles: int, fn: callable
+) -> list[tuple[Battle, float]]:
+    """
+    Creates `num_battles` copies of `battle` with a set sampled for each of the opponent's pokemon.
+    `fn` is used for pokemon that no dataset has a set for,
+    and decides which datasets are sampled from (battle factory only uses team datasets)
+
+    Returns each battle with its chance, normalized to sum to 1
+    """
+    use_smogon_sets = fn is not fill_in_battle_factory_unknowns
+    sampled_battles = []
+    for _ in range(num_battles):
+        sampled_battle = battle.snapshot()
+        chance = 1.0
+        for pkmn in [sampled_battle.opponent.active] + [
+            p for p in sampled_battle.opponent.reserve if p.is_alive()
+        ]:
+            sample = sample_set(pkmn, use_smogon_sets)
+            if sample is None:
+                fn(pkmn)
+                continue
+
+            predicted_set, set_chance, source = sample
+            apply_predicted_set(pkmn, predicted_set, source)
+            chance *= set_chance
+
+        sampled_battle.opponent.lock_moves()
+        sampled_battles.append((sampled_battle, chance))
+
+    total_chance = sum(chance for _, chance in sampled_battles)
+    return [(b, chance / total_chance) for b, chance in sampled_battles]
+
+
 def format_decision(battle, decision):
     # Formats a decision for communication with Pokemon-Showdown
     # If the pokemon can mega-evolve, it will
@@ -191,3 +285,69 @@ def format_decision(battle, decision):
             message = "{} {}".format(message, constants.ZMOVE)
 
     return [message, str(battle.rqid)]
+
+
+def _request_move_name(move: dict) -> str:
+    # hidden power's ID is always 'hiddenpower' regardless of the type
+    if move[constants.ID] == constants.HIDDEN_POWER:
+        return normalize_name(move["move"])
+    return move[constants.ID]
+
+
+def get_legal_options(request_json: dict) -> list[str]:
+    """
+    The decisions the user can make according to the request JSON, formatted like `find_best_move`'s decisions
+    Mega-evolving, ultra-burst, z-moves and dynamaxing are not separate options
+    because `format_decision` always uses them when they are available
+    """
+    side_pokemon = request_json[constants.SIDE][constants.POKEMON]
+    reviving = any(p.get(constants.REVIVING, False) for p in side_pokemon)
+    switches = [
+        "switch {}".format(Pokemon.from_switch_string(p[constants.DETAILS]).name)
+        for p in side_pokemon
+        if not p[constants.ACTIVE]
+        # revival blessing chooses from the fainted pokemon instead
+        and p[constants.CONDITION].endswith(constants.FNT) == reviving
+    ]
+    if request_json.get(constants.FORCE_SWITCH):
+        return switches
+
+    active = request_json[constants.ACTIVE][0]
+    moves = []
+    for move in active[constants.MOVES]:
+        if move.get(constants.DISABLED, False) or move.get(constants.PP, 1) == 0:
+            continue
+        moves.append(_request_move_name(move))
+        if active.get(constants.CAN_TERASTALLIZE, False):
+            moves.append("{}-tera".format(_request_move_name(move)))
+
+    if active.get(constants.TRAPPED, False) or active.get(
+        constants.MAYBE_TRAPPED, False
+    ):
+        return moves
+    return moves + switches
+
+
+def format_decision_from_request_json(request_json: dict, decision: str):
+    """
+    Formats a decision with `format_decision` using only the request JSON
+    This lets a forced decision be sent without updating a copy of the battle
+    """
+    user = Battler()
+    for index, pkmn_dict in enumerate(request_json[constants.SIDE][constants.POKEMON]):
+        pkmn = Pokemon.from_switch_string(pkmn_dict[constants.DETAILS])
+        pkmn.index = index + 1
+        pkmn.hp, pkmn.max_hp, pkmn.status = get_pokemon_info_from_condition(
+            pkmn_dict[constants.CONDITION]
+        )
+        if pkmn_dict[constants.ACTIVE]:
+            user.active = pkmn
+        else:
+            user.reserve.append(pkmn)
+
+    if constants.ACTIVE in request_json:
+        user._initialize_user_active_from_request_json(request_json)
+
+    return format_decision(
+        RequestBattle(user=user, rqid=request_json[constants.RQID]), decision
+    )
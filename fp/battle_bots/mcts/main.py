@@ -1,19 +1,27 @@
 import logging
 
 import constants
-from fp.battle import Battle
 from config import FoulPlayConfig
+from fp.battle import Battle
 
 from ..helpers import (
     fill_in_standardbattle_unknowns,
     fill_in_randombattle_unknowns,
     prepare_battle,
     fill_in_battle_factory_unknowns,
+    prepare_sampled_battles,
 )
 from ..poke_engine_helpers import (
     get_payoff_matrix_from_mcts,
     battle_to_poke_engine_state,
+    deduplicate_states,
+    get_search_session,
+    get_state_signature,
+    get_transition,
+    search_worlds,
 )
+from ..policy_aggregator import PolicyAggregator
+from ..time_management import get_search_time_ms
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +31,7 @@ class BattleBot(Battle):
         super(BattleBot, self).__init__(*args, **kwargs)
 
     def find_best_move(self):
+        search_time_ms = get_search_time_ms(self)
         if self.team_preview:
             self.user.active = self.user.reserve.pop(0)
             self.opponent.active = self.opponent.reserve.pop(0)
@@ -34,14 +43,21 @@ class BattleBot(Battle):
         else:
             fn = fill_in_standardbattle_unknowns
 
-        battle = prepare_battle(self, fn)
+        if FoulPlayConfig.parallelism > 1 and fn is not fill_in_randombattle_unknowns:
+            choice = self.search_sampled_battles(fn, search_time_ms)
+        else:
+            battle = prepare_battle(self, fn)
 
-        logger.info("Searching for a move using MCTS...")
-        choice, win_percentage, num_iterations = get_payoff_matrix_from_mcts(
-            battle_to_poke_engine_state(battle), FoulPlayConfig.search_time_ms
-        )
-        logger.info("Choice: {}, {}".format(choice, win_percentage))
-        logger.info("Iterations: {}".format(num_iterations))
+            logger.info("Searching for a move using MCTS...")
+            transition = get_transition(battle)
+            choice, win_percentage, num_iterations = get_payoff_matrix_from_mcts(
+                battle_to_poke_engine_state(battle),
+                search_time_ms,
+                search_session=get_search_session(self.battle_tag),
+                transition=transition,
+            )
+            logger.info("Choice: {}, {}".format(choice, win_percentage))
+            logger.info("Iterations: {}".format(num_iterations))
 
         if self.team_preview:
             self.user.reserve.insert(0, self.user.active)
@@ -50,3 +66,47 @@ class BattleBot(Battle):
             self.opponent.active = None
 
         return choice
+
+    def search_sampled_battles(self, fn: callable, search_time_ms: int) -> str:
+        # one set is sampled for each of the opponent's pokemon in every battle
+        # and the battles are searched in parallel
+        battles = prepare_sampled_battles(self, FoulPlayConfig.parallelism, fn)
+        unique_states = deduplicate_states(
+            [battle_to_poke_engine_state(b) for b, _ in battles],
+            [chance for _, chance in battles],
+        )
+
+        logger.info(
+            "Searching {} battles for a move using MCTS...".format(len(unique_states))
+        )
+        search_session = get_search_session(self.battle_tag)
+        transition = get_transition(self)
+        world_results = {}
+        for world in search_worlds(
+            [s.state_string for s in unique_states],
+            [s.weight for s in unique_states],
+            search_time_ms,
+            root_parallel=FoulPlayConfig.root_parallel_search,
+        ):
+            if world.result is not None:
+                world_results[world.index] = world.result
+
+        # every world is warm-started once all of them are searched
+        # so that no world is warm-started with the result of another world of this decision
+        aggregator = PolicyAggregator()
+        warm_started = search_session.warm_start(
+            transition,
+            [
+                (get_state_signature(unique_states[index].state), result)
+                for index, result in world_results.items()
+            ],
+        )
+        for index, result in zip(world_results, warm_started):
+            aggregator.add(result, unique_states[index].weight, index)
+
+        if not aggregator.num_results:
+            raise ValueError("No searches completed")
+
+        choice = aggregator.best_move()
+        logger.info("Choice: {}".format(choice))
+        return choice
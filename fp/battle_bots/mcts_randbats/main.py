@@ -1,101 +1,114 @@
 import logging
-from concurrent.futures import ProcessPoolExecutor
-
-from poke_engine import MctsResult
 
 from fp.battle import Battle
 from config import FoulPlayConfig
 
+from ..policy_aggregator import PolicyAggregator
+from .search_scheduler import DeadlineScheduler
 from .team_sampler import (
     prepare_random_battles,
     fill_in_opponent_unrevealed_pkmn,
 )
 
-from poke_engine import (
-    State as PokeEngineState,
-    monte_carlo_tree_search,
+from ..poke_engine_helpers import (
+    battle_to_poke_engine_state,
+    deduplicate_states,
+    get_search_session,
+    get_state_signature,
+    get_transition,
+    search_worlds,
 )
-
-from ..poke_engine_helpers import battle_to_poke_engine_state
+from ..time_management import get_search_time_ms
 
 logger = logging.getLogger(__name__)
 
-# number of revealed pokemon -> number of teams to sample
-NUM_TEAM_MAP = {6: 2, 5: 4, 4: 8, 3: 16, 2: 16, 1: 16}
-
-
-def select_move_from_mcts_results(mcts_results: list[(MctsResult, float, int)]) -> str:
-    final_policy = {}
-    for mcts_result, sample_chance, index in mcts_results:
-        this_policy = max(mcts_result.side_one, key=lambda x: x.visits)
-        logger.info(
-            "Policy {}: {} visited {}% avg_score={} sample_chance_multiplier={}".format(
-                index,
-                this_policy.move_choice,
-                round(100 * this_policy.visits / mcts_result.total_visits, 2),
-                this_policy.total_score / this_policy.visits,
-                round(sample_chance, 3),
-            )
-        )
-        for s1_option in mcts_result.side_one:
-            final_policy[s1_option.move_choice] = final_policy.get(
-                s1_option.move_choice, 0
-            ) + (sample_chance * (s1_option.visits / mcts_result.total_visits))
-
-    final_policy = sorted(final_policy.items(), key=lambda x: x[1], reverse=True)
-    logger.info("Final policy: {}".format(final_policy))
-    return final_policy[0][0]
-
-
-def get_result_from_mcts(
-    poke_engine_state: PokeEngineState, search_time_ms: int, index: int
-) -> MctsResult:
-    state_string = poke_engine_state.to_string()
-    logger.debug("Calling with {} state: {}".format(index, state_string))
-
-    res = monte_carlo_tree_search(poke_engine_state, search_time_ms)
-    logger.info("Iterations {}: {}".format(index, res.total_visits))
-    return res
-
 
 class BattleBot(Battle):
     def __init__(self, *args, **kwargs):
         super(BattleBot, self).__init__(*args, **kwargs)
 
     def find_best_move(self):
+        scheduler = DeadlineScheduler(
+            get_search_time_ms(self), FoulPlayConfig.parallelism
+        )
         if self.team_preview:
             self.user.active = self.user.reserve.pop(0)
             self.opponent.active = self.opponent.reserve.pop(0)
 
-        revealed_pkmn = len(self.opponent.reserve)
-        if self.opponent.active is not None:
-            revealed_pkmn += 1
-
-        num_battles = max(NUM_TEAM_MAP[revealed_pkmn], FoulPlayConfig.parallelism)
-        battles = prepare_random_battles(self, num_battles)
+        # with root parallel search the cores are filled by searching the same worlds more than once
+        # instead of sampling more worlds than the opponent's revealed pokemon call for
+        battles = prepare_random_battles(
+            self,
+            1 if FoulPlayConfig.root_parallel_search else FoulPlayConfig.parallelism,
+        )
         for b, _ in battles:
             fill_in_opponent_unrevealed_pkmn(b)
 
+            # the order of the opponent's reserves doesn't matter to the search
+            # sorting them lets worlds that sampled the same pokemon in a different order be deduplicated
+            b.opponent.reserve.sort(key=lambda p: p.name)
+
+        # identical worlds are searched once and the time saved is shared by the remaining worlds
+        unique_states = deduplicate_states(
+            [battle_to_poke_engine_state(b) for b, _ in battles],
+            [chance for _, chance in battles],
+        )
+
         logger.info("Searching for a move using MCTS...")
-        search_time_per_battle = FoulPlayConfig.search_time_ms // (
-            max(num_battles // FoulPlayConfig.parallelism, 1)
+        search_session = get_search_session(self.battle_tag)
+        transition = get_transition(self)
+        aggregator = PolicyAggregator()
+        search_times = {}
+        pending_weight = sum(s.weight for s in unique_states)
+        worlds = search_worlds(
+            [s.state_string for s in unique_states],
+            [s.weight for s in unique_states],
+            scheduler.search_budget_ms(),
+            anytime=FoulPlayConfig.anytime_search,
+            root_parallel=FoulPlayConfig.root_parallel_search,
         )
-        with ProcessPoolExecutor(max_workers=FoulPlayConfig.parallelism) as executor:
-            futures = []
-            for index, (b, chance) in enumerate(battles):
-                fut = executor.submit(
-                    get_result_from_mcts,
-                    battle_to_poke_engine_state(b),
-                    search_time_per_battle,
-                    index,
+        for world in worlds:
+            search_times[world.index] = world.search_time_ms
+            if world.result is None:
+                continue
+
+            if world.index not in aggregator.results:
+                pending_weight -= unique_states[world.index].weight
+            aggregator.add(world.result, unique_states[world.index].weight, world.index)
+
+            if FoulPlayConfig.anytime_search and aggregator.is_converged(
+                pending_weight
+            ):
+                logger.info(
+                    "Policy converged after {}ms".format(round(scheduler.elapsed_ms()))
                 )
-                futures.append((fut, chance, index))
+                break
+        # stops any searches that are still running
+        worlds.close()
+
+        for search_time_ms in search_times.values():
+            scheduler.record(search_time_ms)
+
+        # each world's latest result is warm-started and stored for the next search
+        # worlds that were still running when the policy converged contribute their partial results
+        # worlds that never published a result are left out
+        world_results = list(aggregator.results.items())
+        warm_started = search_session.warm_start(
+            transition,
+            [
+                (get_state_signature(unique_states[index].state), result)
+                for index, (result, _) in world_results
+            ],
+        )
+        for (index, (_, chance)), result in zip(world_results, warm_started):
+            aggregator.add(result, chance, index)
+
+        if not aggregator.num_results:
+            raise ValueError("No searches completed")
 
-        mcts_results = [
-            (fut.result(), chance, index) for (fut, chance, index) in futures
-        ]
-        choice = select_move_from_mcts_results(mcts_results)
+        choice = aggregator.best_move()
         logger.info("Choice: {}".format(choice))
+        logger.info("Search time: {}".format(scheduler.report()))
 
         if self.team_preview:
             self.user.reserve.insert(0, self.user.active)
@@ -0,0 +1,80 @@
+import time
+from dataclasses import dataclass
+
+# time reserved at the end of the budget for aggregating the results
+AGGREGATION_MARGIN_MS = 5
+
+
+@dataclass
+class SearchReport:
+    budget_ms: int
+    elapsed_ms: float
+    search_ms: float
+    searches_completed: int
+    searches_skipped: int
+
+    @property
+    def overhead_ms(self) -> float:
+        return max(self.elapsed_ms - self.search_ms, 0)
+
+    def __str__(self):
+        return "budget={}ms elapsed={}ms searching={}ms overhead={}ms completed={} skipped={}".format(
+            self.budget_ms,
+            round(self.elapsed_ms),
+            round(self.search_ms),
+            round(self.overhead_ms),
+            self.searches_completed,
+            self.searches_skipped,
+        )
+
+
+class DeadlineScheduler:
+    """
+    Keeps track of the time budget of one decision so that it finishes by a hard deadline
+
+    The deadline is measured from when the scheduler is created so any work done
+    before the searches (sampling, converting states) counts against the budget.
+    The searches themselves are fitted into `search_budget_ms()` by the workers,
+    and each result is recorded so the time spent outside of searching can be reported.
+    """
+
+    def __init__(self, budget_ms: int, parallelism: int):
+        self.budget_ms = budget_ms
+        self.parallelism = max(parallelism, 1)
+        self.start_time = time.monotonic()
+        self.deadline = self.start_time + budget_ms / 1000
+        self.total_search_ms = 0.0
+        self.searches_completed = 0
+        self.searches_skipped = 0
+
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.start_time) * 1000
+
+    def remaining_ms(self) -> float:
+        return (self.deadline - time.monotonic()) * 1000
+
+    def search_budget_ms(self) -> int:
+        """The time the searches can use, leaving room to aggregate their results"""
+        return max(int(self.remaining_ms() - AGGREGATION_MARGIN_MS), 0)
+
+    def record(self, search_time_ms: int):
+        """Record one search. A search time of 0 means it was skipped"""
+        if search_time_ms > 0:
+            self.total_search_ms += search_time_ms
+            self.searches_completed += 1
+        else:
+            self.searches_skipped += 1
+
+    def report(self) -> SearchReport:
+        # searches run side by side so the wall-clock time spent searching
+        # is the total split between the workers that were used
+        workers_used = max(
+            min(self.parallelism, self.searches_completed + self.searches_skipped), 1
+        )
+        return SearchReport(
+            budget_ms=self.budget_ms,
+            elapsed_ms=self.elapsed_ms(),
+            search_ms=self.total_search_ms / workers_used,
+            searches_completed=self.searches_completed,
+            searches_skipped=self.searches_skipped,
+        )
@@ -1,6 +1,6 @@
 import logging
+import math
 import random
-from copy import deepcopy
 
 import constants
 from fp.battle import Battle, Pokemon
@@ -13,6 +13,15 @@ from fp.helpers import (
 
 logger = logging.getLogger(__name__)
 
+# bounds on the number of opponent teams sampled for a search
+MIN_SAMPLED_BATTLES = 1
+MAX_SAMPLED_BATTLES = 16
+
+# unrevealed pokemon are sampled from the entire format, but they are in the back
+# and matter less to the next few turns than the revealed pokemon
+# so each one adds this fixed amount of uncertainty instead of its true entropy
+UNREVEALED_PKMN_ENTROPY_BITS = 1.0
+
 
 def log_pkmn_set(pkmn: Pokemon):
     s = "Predicted set: {} {} {} {}".format(
@@ -76,12 +85,52 @@ def populate_pkmn_from_set(pkmn: Pokemon, set_: PredictedPokemonSet):
                 break
 
 
-def prepare_random_battles(battle: Battle, num_battles: int) -> list[(Battle, float)]:
-    revealed_pkmn_sets = get_all_remaining_sets_for_revealed_pkmn(deepcopy(battle))
+def get_set_entropy(sets: list[PredictedPokemonSet]) -> float:
+    """Shannon entropy in bits of which of `sets` a pokemon has, weighted by how common each set is"""
+    total_count = sum(s.pkmn_set.count for s in sets)
+    entropy = 0.0
+    for s in sets:
+        if s.pkmn_set.count > 0:
+            p = s.pkmn_set.count / total_count
+            entropy -= p * math.log2(p)
+    return entropy
+
+
+def get_num_battles_to_sample(battle: Battle, revealed_pkmn_sets: dict) -> int:
+    """
+    The number of opponent teams worth sampling given how uncertain the opponent's sets are
+
+    2^entropy is the effective number of distinct teams the opponent could have.
+    Sampling more teams than that mostly produces duplicates,
+    while a very uncertain opponent gets more samples that are each searched for less time
+    """
+    entropy = 0.0
+    num_revealed_pkmn = 0
+    for pkmn in [battle.opponent.active] + battle.opponent.reserve:
+        if pkmn is None:
+            continue
+        num_revealed_pkmn += 1
+        # fainted pokemon are not sampled
+        if pkmn.is_alive():
+            entropy += get_set_entropy(revealed_pkmn_sets.get(pkmn.name, []))
+
+    entropy += UNREVEALED_PKMN_ENTROPY_BITS * (6 - num_revealed_pkmn)
+    num_battles = math.ceil(round(2**entropy, 6))
+    return max(MIN_SAMPLED_BATTLES, min(num_battles, MAX_SAMPLED_BATTLES))
+
+
+def prepare_random_battles(
+    battle: Battle, min_num_battles: int = MIN_SAMPLED_BATTLES
+) -> list[(Battle, float)]:
+    revealed_pkmn_sets = get_all_remaining_sets_for_revealed_pkmn(battle)
+    num_battles = max(
+        get_num_battles_to_sample(battle, revealed_pkmn_sets), min_num_battles
+    )
+    logger.info("Sampling {} battles".format(num_battles))
 
     sampled_battles = []
     for index in range(num_battles):
-        battle_copy = deepcopy(battle)
+        battle_copy = battle.snapshot()
 
         sample_chance = 1.0
         active = battle_copy.opponent.active
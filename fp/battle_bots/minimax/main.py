@@ -1,17 +1,22 @@
 import logging
 
 import constants
-from fp.battle import Battle
 from config import FoulPlayConfig
+from fp.battle import Battle
 
 from ..helpers import (
     fill_in_standardbattle_unknowns,
     fill_in_randombattle_unknowns,
     prepare_battle,
     fill_in_battle_factory_unknowns,
+    prepare_sampled_battles,
 )
 from ..poke_engine_helpers import battle_to_poke_engine_state
+from ..poke_engine_helpers import deduplicate_states
 from ..poke_engine_helpers import get_payoff_matrix_with_minimax
+from ..poke_engine_helpers import search_worlds_with_minimax
+from ..time_management import get_search_time_ms
+from .priors import prune_dominated_moves
 
 
 logger = logging.getLogger(__name__)
@@ -22,6 +27,7 @@ class BattleBot(Battle):
         super(BattleBot, self).__init__(*args, **kwargs)
 
     def find_best_move(self):
+        search_time_ms = get_search_time_ms(self)
         if self.team_preview:
             self.user.active = self.user.reserve.pop(0)
             self.opponent.active = self.opponent.reserve.pop(0)
@@ -33,13 +39,40 @@ class BattleBot(Battle):
         else:
             fn = fill_in_standardbattle_unknowns
 
-        battle = prepare_battle(self, fn)
+        if FoulPlayConfig.parallelism > 1 and fn is not fill_in_randombattle_unknowns:
+            # one set is sampled for each of the opponent's pokemon in every battle
+            # and the battles are searched in parallel
+            battles = prepare_sampled_battles(self, FoulPlayConfig.parallelism, fn)
+            states = []
+            for b, _ in battles:
+                state = battle_to_poke_engine_state(b)
+                prune_dominated_moves(state)
+                states.append(state)
+            unique_states = deduplicate_states(
+                states, [chance for _, chance in battles]
+            )
+
+            logger.info(
+                "Searching {} battles for a move using Expectiminimax...".format(
+                    len(unique_states)
+                )
+            )
+            choice = search_worlds_with_minimax(
+                [s.state_string for s in unique_states],
+                [s.weight for s in unique_states],
+                search_time_ms,
+            )
+        else:
+            battle = prepare_battle(self, fn)
+
+            state = battle_to_poke_engine_state(battle)
+            prune_dominated_moves(state)
 
-        logger.info("Searching for a move using Expectiminimax...")
-        choice = get_payoff_matrix_with_minimax(
-            battle_to_poke_engine_state(battle),
-            search_time_ms=FoulPlayConfig.search_time_ms,
-        )
+            logger.info("Searching for a move using Expectiminimax...")
+            choice = get_payoff_matrix_with_minimax(
+                state,
+                search_time_ms=search_time_ms,
+            )
         logger.info("Choice: {}".format(choice))
 
         if self.team_preview:
@@ -0,0 +1,286 @@
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import constants
+from data import all_move_json
+from ..poke_engine_helpers import with_disabled_moves
+
+from poke_engine import (
+    State as PokeEngineState,
+    Side as PokeEngineSide,
+    calculate_damage,
+)
+
+logger = logging.getLogger(__name__)
+
+# keys a move can have in the move json without having an effect besides its damage
+PLAIN_MOVE_KEYS = {
+    constants.ACCURACY,
+    constants.BASE_POWER,
+    constants.CATEGORY,
+    "flags",
+    constants.ID,
+    "name",
+    constants.PP,
+    constants.PRIORITY,
+    "secondary",
+    "target",
+    constants.TYPE,
+    "noPPBoosts",
+}
+
+# damaging moves whose effects or conditions are not described by the move json
+MOVES_WITH_HIDDEN_EFFECTS = {
+    "knockoff",
+    "rapidspin",
+    "pursuit",
+    "poltergeist",
+    "steelroller",
+    "belch",
+    "lastresort",
+    "synchronoise",
+    "futuresight",
+    "doomdesire",
+    "counter",
+    "mirrorcoat",
+    "metalburst",
+    "comeuppance",
+    "bide",
+    "fling",
+    "naturalgift",
+    "suckerpunch",
+    "thunderclap",
+    "focuspunch",
+}
+
+# damaging moves whose power depends on the state of the battle or on the order the pokemon move in
+# their damage in the current state says nothing about their damage later in the search
+MOVES_WITH_VARIABLE_POWER = {
+    # the user's or the target's hp
+    "reversal",
+    "flail",
+    "eruption",
+    "waterspout",
+    "dragonenergy",
+    "brine",
+    "crushgrip",
+    "wringout",
+    "hardpress",
+    "naturesmadness",
+    "ruination",
+    "superfang",
+    "endeavor",
+    # boosts
+    "storedpower",
+    "powertrip",
+    "punishment",
+    # status, items, and speed
+    "hex",
+    "venoshock",
+    "facade",
+    "wakeupslap",
+    "smellingsalts",
+    "dreameater",
+    "acrobatics",
+    "gyroball",
+    "electroball",
+    "trumpcard",
+    "spitup",
+    "lastrespects",
+    # weather and terrain
+    "weatherball",
+    "terrainpulse",
+    "risingvoltage",
+    "expandingforce",
+    "grassyglide",
+    "psyblade",
+    # the order the pokemon move in or what happened on earlier turns
+    "payback",
+    "avalanche",
+    "revenge",
+    "boltbeak",
+    "fishiousrend",
+    "assurance",
+    "ragefist",
+    "retaliate",
+    "lashout",
+    "temperflare",
+    "stompingtantrum",
+    "echoedvoice",
+    "furycutter",
+    "rollout",
+    "iceball",
+    "round",
+}
+
+
+@dataclass
+class MovePrior:
+    move: str
+    # expected fraction of the defender's hp the move takes, None for moves that don't deal damage
+    expected_damage: Optional[float]
+    min_damage: int = 0
+    max_damage: int = 0
+
+
+def _is_plain_damaging_move(move: str) -> bool:
+    move_json = all_move_json[move]
+    return (
+        set(move_json.keys()) <= PLAIN_MOVE_KEYS
+        and move_json["secondary"] is None
+        and move_json[constants.PRIORITY] == 0
+        and move not in MOVES_WITH_HIDDEN_EFFECTS
+        and move not in MOVES_WITH_VARIABLE_POWER
+        and move not in constants.SWITCH_OUT_MOVES
+        and not {"charge", "recharge"} & set(move_json["flags"])
+    )
+
+
+def _accuracy(move: str) -> float:
+    accuracy = all_move_json[move][constants.ACCURACY]
+    if accuracy is True:
+        return 1.0
+    return accuracy / 100
+
+
+class _ConvertedState:
+    # poke-engine converts the state every time it is passed to the engine
+    # convert it once and reuse the result for every damage calculation
+    def __init__(self, state: PokeEngineState):
+        self.rust_state = state._into_rust_obj()
+
+    def _into_rust_obj(self):
+        return self.rust_state
+
+
+def get_move_priors(state: PokeEngineState, side_one: bool = True) -> list[MovePrior]:
+    """
+    Scores the active pokemon's usable moves on one side of the state with a one-ply damage calculation
+    The damage is what the move does against the other side's active pokemon if it moved first
+    """
+    attacking_side = state.side_one if side_one else state.side_two
+    defending_side = state.side_two if side_one else state.side_one
+    defender = defending_side.pokemon[int(defending_side.active_index)]
+    converted_state = _ConvertedState(state)
+
+    priors = []
+    for mv in _usable_moves(attacking_side):
+        if (
+            mv.id not in all_move_json
+            or all_move_json[mv.id][constants.CATEGORY]
+            not in constants.DAMAGING_CATEGORIES
+            or all_move_json[mv.id][constants.BASE_POWER] <= 0
+        ):
+            priors.append(MovePrior(mv.id, None))
+            continue
+
+        if side_one:
+            rolls, _ = calculate_damage(converted_state, mv.id, "splash", True)
+        else:
+            _, rolls = calculate_damage(converted_state, "splash", mv.id, False)
+
+        expected_damage = (
+            _accuracy(mv.id) * (sum(rolls) / len(rolls)) / max(defender.hp, 1)
+        )
+        priors.append(
+            MovePrior(mv.id, min(expected_damage, 1.0), min(rolls), max(rolls))
+        )
+
+    return priors
+
+
+def _usable_moves(side: PokeEngineSide):
+    active = side.pokemon[int(side.active_index)]
+    return [m for m in active.moves if not m.disabled and m.pp > 0 and m.id != "none"]
+
+
+def get_dominated_moves(priors: list[MovePrior]) -> set[str]:
+    """
+    Moves that should never be chosen:
+        - damaging moves that do nothing to the defender (immunities from typing, abilities, etc.)
+        - plain damaging moves that always do less damage than another plain damaging move
+          of the same category that is at least as accurate and doesn't make contact when they don't
+    Moves with variable power are never dominated
+    """
+    dominated = set()
+    for prior in priors:
+        if prior.expected_damage is None or prior.move in MOVES_WITH_VARIABLE_POWER:
+            continue
+        if prior.max_damage == 0:
+            dominated.add(prior.move)
+            continue
+        if not _is_plain_damaging_move(prior.move):
+            continue
+
+        contact = "contact" in all_move_json[prior.move]["flags"]
+        category = all_move_json[prior.move][constants.CATEGORY]
+        for other in priors:
+            if (
+                other.move != prior.move
+                and other.expected_damage is not None
+                and _is_plain_damaging_move(other.move)
+                and all_move_json[other.move][constants.CATEGORY] == category
+                and other.min_damage > prior.max_damage
+                and _accuracy(other.move) >= _accuracy(prior.move)
+                and (contact or "contact" not in all_move_json[other.move]["flags"])
+            ):
+                dominated.add(prior.move)
+                break
+
+    return dominated
+
+
+def defender_can_switch(side: PokeEngineSide) -> bool:
+    if side.force_trapped:
+        return False
+    active_index = int(side.active_index)
+    return any(p.hp > 0 for i, p in enumerate(side.pokemon) if i != active_index)
+
+
+def prune_dominated_moves(state: PokeEngineState) -> dict[str, set[str]]:
+    """
+    Disables the dominated moves of both active pokemon in the state so the search never considers them
+    The engine does not take move ordering hints, so removing options is how the
+    search is made to reach a deeper depth in the same amount of time.
+    A side always keeps at least one move.
+
+    Moves are only dominated against the defender that is active now, and they stay disabled for the
+    whole search. So a side's moves are only pruned when the defender cannot switch out
+    """
+    pruned = {}
+    if state.team_preview:
+        return pruned
+
+    for side_name, side, defending_side, side_one in [
+        ("side_one", state.side_one, state.side_two, True),
+        ("side_two", state.side_two, state.side_one, False),
+    ]:
+        if side.force_switch or defender_can_switch(defending_side):
+            continue
+
+        priors = get_move_priors(state, side_one=side_one)
+        dominated = get_dominated_moves(priors)
+        if not dominated or len(dominated) >= len(priors):
+            continue
+
+        # the engine pokemon can be shared with other states so the active pokemon is replaced
+        active_index = int(side.active_index)
+        pokemon = side.pokemon
+        pokemon[active_index] = with_disabled_moves(pokemon[active_index], dominated)
+        side.pokemon = pokemon
+
+        logger.info(
+            "Pruned {} moves: {}, priors: {}".format(
+                side_name,
+                sorted(dominated),
+                {
+                    p.move: round(p.expected_damage, 2)
+                    for p in priors
+                    if p.expected_damage is not None
+                },
+            )
+        )
+        pruned[side_name] = dominated
+
+    return pruned
@@ -1,8 +1,23 @@
+import hashlib
 import logging
+import math
+import queue
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError
+from dataclasses import dataclass
+from typing import Hashable, Iterator, Optional
 
 import constants
 from data import pokedex
 from fp.battle import Battle, Pokemon, Battler, LastUsedMove
+from fp.search_pool import (
+    SearchPool,
+    SharedStrings,
+    channel_closed,
+    publish,
+    read_shared_strings,
+)
 
 from poke_engine import (
     State as PokeEngineState,
@@ -10,6 +25,9 @@ from poke_engine import (
     SideConditions as PokeEngineSideConditions,
     Pokemon as PokeEnginePokemon,
     Move as PokeEngineMove,
+    MctsResult,
+    MctsSideResult,
+    IterativeDeepeningResult,
     monte_carlo_tree_search,
     calculate_damage,
     iterative_deepening_expectiminimax,
@@ -17,6 +35,23 @@ from poke_engine import (
 
 logger = logging.getLogger(__name__)
 
+# searches shorter than this are not worth the overhead of a call into the engine
+MIN_SEARCH_TIME_MS = 10
+
+# in anytime mode each world's search is split into this many slices
+# and the statistics so far are published after each one
+ANYTIME_SLICES = 4
+
+# how long to keep waiting for a worker after the deadline before giving up on its worlds
+LATE_RESULT_GRACE_MS = 1000
+
+# the cache of engine objects is cleared once it holds this many
+ENGINE_OBJECT_CACHE_SIZE = 2048
+
+# engine objects are reused for pokemon and side conditions that were converted with the same values before
+# they are shared by every state they are in, so they must never be changed after they are built
+_engine_objects: dict[tuple, object] = {}
+
 
 def status_to_string(status):
     if status == constants.SLEEP:
@@ -36,10 +71,22 @@ def status_to_string(status):
     raise ValueError(f"Unknown status: {status}")
 
 
+def _get_engine_object(key: tuple, build: callable):
+    engine_object = _engine_objects.get(key)
+    if engine_object is None:
+        if len(_engine_objects) >= ENGINE_OBJECT_CACHE_SIZE:
+            _engine_objects.clear()
+        engine_object = build()
+        _engine_objects[key] = engine_object
+    return engine_object
+
+
 def pokemon_to_poke_engine_pkmn(pkmn: Pokemon):
     """
     id,level,type0,type1,hp,maxhp,ability,item,atk,def,spa,spd,spe,atkb,defb,spab,spdb,speb,accb,evab,status,subhp,restturns
     nature,volatiles,m0,m1,m2,m3
+
+    Only pokemon that changed since they were last converted are built again
     """
 
     # Gen 3/4 don't remove items if knocked off
@@ -47,6 +94,36 @@ def pokemon_to_poke_engine_pkmn(pkmn: Pokemon):
     if pkmn.knocked_off or pkmn.item == "" or pkmn.item is None:
         pkmn.item = "None"
 
+    if len(pkmn.types) == 1:
+        pkmn.types = (pkmn.types[0], "typeless")
+
+    key = (
+        "pokemon",
+        pkmn.name,
+        pkmn.level,
+        tuple(pkmn.types),
+        pkmn.hp,
+        pkmn.max_hp,
+        pkmn.ability,
+        pkmn.item,
+        pkmn.nature,
+        tuple(pkmn.evs),
+        pkmn.stats[constants.ATTACK],
+        pkmn.stats[constants.DEFENSE],
+        pkmn.stats[constants.SPECIAL_ATTACK],
+        pkmn.stats[constants.SPECIAL_DEFENSE],
+        pkmn.stats[constants.SPEED],
+        pkmn.status,
+        pkmn.rest_turns,
+        pkmn.sleep_turns,
+        pkmn.tera_type,
+        pkmn.terastallized,
+        tuple((m.name, m.disabled, m.current_pp) for m in pkmn.moves),
+    )
+    return _get_engine_object(key, lambda: _build_poke_engine_pkmn(pkmn))
+
+
+def _build_poke_engine_pkmn(pkmn: Pokemon):
     num_moves = len(pkmn.moves)
     p = PokeEnginePokemon(
         id=str(pkmn.name),
@@ -75,9 +152,6 @@ def pokemon_to_poke_engine_pkmn(pkmn: Pokemon):
         terastallized=pkmn.terastallized,
     )
 
-    if len(pkmn.types) == 1:
-        pkmn.types = (pkmn.types[0], "typeless")
-
     while num_moves < 6:
         p.moves.append(PokeEngineMove(id="none", disabled=True, pp=0))
         num_moves += 1
@@ -85,8 +159,82 @@ def pokemon_to_poke_engine_pkmn(pkmn: Pokemon):
     return p
 
 
+def with_disabled_moves(p: PokeEnginePokemon, move_ids: set[str]):
+    """
+    A copy of the engine pokemon with the given moves disabled
+    Engine pokemon may be shared between states so they are not changed in place
+    """
+    return PokeEnginePokemon(
+        id=p.id,
+        level=p.level,
+        types=p.types,
+        hp=p.hp,
+        maxhp=p.maxhp,
+        ability=p.ability,
+        item=p.item,
+        nature=p.nature,
+        evs=p.evs,
+        attack=p.attack,
+        defense=p.defense,
+        special_attack=p.special_attack,
+        special_defense=p.special_defense,
+        speed=p.speed,
+        status=p.status,
+        rest_turns=p.rest_turns,
+        sleep_turns=p.sleep_turns,
+        weight_kg=p.weight_kg,
+        moves=[
+            PokeEngineMove(id=m.id, disabled=m.disabled or m.id in move_ids, pp=m.pp)
+            for m in p.moves
+        ],
+        tera_type=p.tera_type,
+        terastallized=p.terastallized,
+    )
+
+
 def get_dummy_poke_engine_pkmn():
-    return PokeEnginePokemon(id="pikachu", level=1, hp=0)
+    return _get_engine_object(
+        ("dummy",), lambda: PokeEnginePokemon(id="pikachu", level=1, hp=0)
+    )
+
+
+def side_conditions_to_poke_engine_side_conditions(battler: Battler):
+    side_conditions = battler.side_conditions
+    return _get_engine_object(
+        ("side_conditions",) + tuple(side_conditions.values),
+        lambda: PokeEngineSideConditions(
+            aurora_veil=side_conditions[constants.AURORA_VEIL],
+            crafty_shield=side_conditions["craftyshield"],
+            healing_wish=side_conditions[constants.HEALING_WISH],
+            light_screen=side_conditions[constants.LIGHT_SCREEN],
+            lucky_chant=side_conditions["luckychant"],
+            lunar_dance=side_conditions["lunardance"],
+            mat_block=side_conditions["matblock"],
+            mist=side_conditions["mist"],
+            protect=side_conditions[constants.PROTECT],
+            quick_guard=side_conditions["quickguard"],
+            reflect=side_conditions[constants.REFLECT],
+            safeguard=side_conditions[constants.SAFEGUARD],
+            spikes=side_conditions[constants.SPIKES],
+            stealth_rock=side_conditions[constants.STEALTH_ROCK],
+            sticky_web=side_conditions[constants.STICKY_WEB],
+            tailwind=side_conditions[constants.TAILWIND],
+            toxic_count=side_conditions[constants.TOXIC_COUNT],
+            toxic_spikes=side_conditions[constants.TOXIC_SPIKES],
+            wide_guard=side_conditions["wideguard"],
+        ),
+    )
+
+
+def get_substitute_health(pkmn: Pokemon):
+    # substitute health can't be known with certainty but the client can keep track of if the substitute was hit
+    # to approximate: the substitute health is 1/10 of the pokemon's max_hp if it was hit, 1/4 if it wasn't
+    if constants.SUBSTITUTE not in pkmn.volatile_statuses:
+        return 0
+    elif pkmn.substitute_hit:
+        return int(pkmn.max_hp / 10)
+    else:
+        return int(pkmn.max_hp / 4)
 
 
 def battler_to_poke_engine_side(
@@ -105,15 +253,6 @@ def battler_to_poke_engine_side(
         else:
             last_used_move = "move:0"
 
-    # substitute health can't be known with certainty but the client can keep track of if the substitute was hit
-    # to approximate: the substitute health is 1/10 of the pokemon's max_hp if it was hit, 1/4 if it wasn't
-    substitute_health = 0
-    if constants.SUBSTITUTE in battler.active.volatile_statuses:
-        if battler.active.substitute_hit:
-            substitute_health = int(battler.active.max_hp / 10)
-        else:
-            substitute_health = int(battler.active.max_hp / 4)
-
     future_sight_index = 0
     if battler.future_sight[0] > 0:
         if battler.active.name == battler.future_sight[1]:
@@ -139,34 +278,14 @@ def battler_to_poke_engine_side(
         baton_passing=battler.baton_passing,
         pokemon=[pokemon_to_poke_engine_pkmn(battler.active)]
         + [pokemon_to_poke_engine_pkmn(p) for p in battler.reserve],
-        side_conditions=PokeEngineSideConditions(
-            aurora_veil=battler.side_conditions[constants.AURORA_VEIL],
-            crafty_shield=battler.side_conditions["craftyshield"],
-            healing_wish=battler.side_conditions[constants.HEALING_WISH],
-            light_screen=battler.side_conditions[constants.LIGHT_SCREEN],
-            lucky_chant=battler.side_conditions["luckychant"],
-            lunar_dance=battler.side_conditions["lunardance"],
-            mat_block=battler.side_conditions["matblock"],
-            mist=battler.side_conditions["mist"],
-            protect=battler.side_conditions[constants.PROTECT],
-            quick_guard=battler.side_conditions["quickguard"],
-            reflect=battler.side_conditions[constants.REFLECT],
-            safeguard=battler.side_conditions[constants.SAFEGUARD],
-            spikes=battler.side_conditions[constants.SPIKES],
-            stealth_rock=battler.side_conditions[constants.STEALTH_ROCK],
-            sticky_web=battler.side_conditions[constants.STICKY_WEB],
-            tailwind=battler.side_conditions[constants.TAILWIND],
-            toxic_count=battler.side_conditions[constants.TOXIC_COUNT],
-            toxic_spikes=battler.side_conditions[constants.TOXIC_SPIKES],
-            wide_guard=battler.side_conditions["wideguard"],
-        ),
+        side_conditions=side_conditions_to_poke_engine_side_conditions(battler),
         wish=(int(battler.wish[0]), int(battler.wish[1])),
         future_sight=(battler.future_sight[0], str(future_sight_index)),
         force_switch=force_switch,
         force_trapped=battler.trapped,
         slow_uturn_move=stayed_in_on_switchout_move,
         volatile_statuses=battler.active.volatile_statuses,
-        substitute_health=substitute_health,
+        substitute_health=get_substitute_health(battler.active),
         attack_boost=battler.active.boosts[constants.ATTACK],
         defense_boost=battler.active.boosts[constants.DEFENSE],
         special_attack_boost=battler.active.boosts[constants.SPECIAL_ATTACK],
@@ -306,6 +425,291 @@ def battle_to_poke_engine_state(battle: Battle, swap=False):
     return state
 
 
+def get_state_hash(state_string: str) -> str:
+    return hashlib.blake2b(state_string.encode(), digest_size=16).hexdigest()
+
+
+@dataclass
+class UniqueState:
+    state: PokeEngineState
+    state_string: str
+    weight: float
+    count: int
+
+
+def deduplicate_states(
+    states: list[PokeEngineState], weights: list[float]
+) -> list[UniqueState]:
+    """
+    Collapse states that serialize to the same string into one entry
+    The weights of the duplicates are summed so that one search can stand in for all of them
+    """
+    unique_states = {}
+    for state, weight in zip(states, weights):
+        state_string = state.to_string()
+        state_hash = get_state_hash(state_string)
+        if state_hash in unique_states:
+            unique_states[state_hash].weight += weight
+            unique_states[state_hash].count += 1
+        else:
+            unique_states[state_hash] = UniqueState(
+                state=state, state_string=state_string, weight=weight, count=1
+            )
+
+    if len(unique_states) < len(states):
+        logger.info(
+            "Deduplicated {} states into {} unique states".format(
+                len(states), len(unique_states)
+            )
+        )
+
+    return list(unique_states.values())
+
+
+class SerializedState:
+    """
+    A state that was sent to a worker as the string from `State.to_string()`
+
+    poke-engine's search functions convert their argument with `_into_rust_obj()`.
+    `State.from_string` already returns the rust object, so the python dataclass
+    never has to be rebuilt on the worker.
+    """
+
+    def __init__(self, state_string: str):
+        self.state_string = state_string
+
+    def _into_rust_obj(self):
+        return PokeEngineState.from_string(self.state_string)
+
+
+@dataclass
+class WorldResult:
+    index: int
+    result: Optional[MctsResult]  # None if the world was skipped
+    search_time_ms: int
+    final: bool = True  # False for the intermediate results of an anytime search
+
+
+def _split_search_time(search_time_ms: int, num_slices: int) -> list[int]:
+    num_slices = max(min(num_slices, search_time_ms // MIN_SEARCH_TIME_MS), 1)
+    slice_ms = search_time_ms // num_slices
+    slices = [slice_ms] * num_slices
+    slices[-1] += search_time_ms - slice_ms * num_slices
+    return slices
+
+
+def _search_world_batch(
+    channel_id: int,
+    shared_strings_name: str,
+    worlds: list[tuple[int, int, int]],
+    search_time_ms: int,
+    deadline: float,
+    num_slices: int,
+):
+    # Runs on a worker. The worlds are searched one after the other and each result
+    # is published as soon as it is available. The search time shrinks if earlier
+    # searches ran long so that the batch still finishes by the deadline
+    try:
+        state_strings = read_shared_strings(
+            shared_strings_name, [(offset, length) for _, offset, length in worlds]
+        )
+    except FileNotFoundError:
+        # the search was already over and the states were freed before this batch started
+        return
+
+    for i, ((index, _, _), state_string) in enumerate(zip(worlds, state_strings)):
+        if channel_closed(channel_id):
+            return
+
+        time_left_ms = (deadline - time.time()) * 1000
+        this_search_time_ms = min(search_time_ms, int(time_left_ms / (len(worlds) - i)))
+
+        # each worker always searches its first world so that a move can be chosen
+        if this_search_time_ms < MIN_SEARCH_TIME_MS:
+            if i > 0:
+                publish(channel_id, WorldResult(index, None, 0))
+                continue
+            this_search_time_ms = MIN_SEARCH_TIME_MS
+
+        logger.debug("Calling with {} state: {}".format(index, state_string))
+        result = None
+        searched_ms = 0
+        for slice_ms in _split_search_time(this_search_time_ms, num_slices):
+            # each slice is a fresh search, so its root statistics are added to the previous slices
+            slice_result = monte_carlo_tree_search(
+                SerializedState(state_string), slice_ms
+            )
+            result = (
+                slice_result
+                if result is None
+                else merge_mcts_results([result, slice_result])
+            )
+            searched_ms += slice_ms
+            if searched_ms < this_search_time_ms:
+                if channel_closed(channel_id):
+                    return
+                publish(
+                    channel_id, WorldResult(index, result, searched_ms, final=False)
+                )
+
+        logger.info("Iterations {}: {}".format(index, result.total_visits))
+        publish(channel_id, WorldResult(index, result, this_search_time_ms))
+
+
+def _merge_replica_results(
+    index: int, replica_results: list[WorldResult], final: bool
+) -> WorldResult:
+    if not replica_results:
+        return WorldResult(index, None, 0)
+
+    return WorldResult(
+        index,
+        merge_mcts_results([r.result for r in replica_results]),
+        max(r.search_time_ms for r in replica_results),
+        final=final,
+    )
+
+
+def search_worlds(
+    state_strings: list[str],
+    weights: list[float],
+    budget_ms: int,
+    anytime: bool = False,
+    root_parallel: bool = False,
+) -> Iterator[WorldResult]:
+    """
+    Search a batch of sampled worlds with MCTS on the SearchPool
+
+    The serialized worlds are written once to shared memory and each worker is sent
+    one payload with the location of all of its worlds. Each worker streams back the result of each one as it finishes, so the caller can start
+    aggregating before the slowest world is done. Worlds are dealt to the workers
+    from most to least likely so the ones cut by the deadline are the least important.
+    Yields a `WorldResult` for every world, including ones that were skipped.
+
+    With `anytime=True` the intermediate statistics of each world are also yielded
+    (with `final=False`) while it is being searched. Closing the generator early
+    stops the searches that are still running.
+
+    With `root_parallel=True` and fewer worlds than workers, the spare workers run
+    independent searches of the most likely worlds. The root statistics of every
+    search of a world are summed into that world's result.
+    """
+    if not state_strings:
+        return
+
+    order = sorted(range(len(state_strings)), key=lambda i: weights[i], reverse=True)
+    if root_parallel and len(state_strings) < SearchPool.max_workers:
+        # each search is a "replica" of a world and every worker gets one
+        replica_worlds = [order[i % len(order)] for i in range(SearchPool.max_workers)]
+        batches = [[replica] for replica in range(len(replica_worlds))]
+    else:
+        replica_worlds = list(range(len(state_strings)))
+        num_workers = max(min(SearchPool.max_workers, len(state_strings)), 1)
+        batches = [order[i::num_workers] for i in range(num_workers)]
+
+    world_replicas = {}
+    for replica, index in enumerate(replica_worlds):
+        world_replicas.setdefault(index, []).append(replica)
+
+    search_time_ms = max(int(budget_ms / len(batches[0])), MIN_SEARCH_TIME_MS)
+    deadline = time.time() + budget_ms / 1000
+
+    # the states are written to shared memory once and each worker is only sent where its states are
+    shared_strings = SharedStrings(state_strings)
+    channel_id, channel = SearchPool.open_channel()
+    pending = set(range(len(replica_worlds)))
+    replica_results = {}
+
+    def collect(replica_result: WorldResult) -> Optional[WorldResult]:
+        # the result of a world with a single search is passed through unchanged
+        index = replica_worlds[replica_result.index]
+        replicas = world_replicas[index]
+        if len(replicas) == 1:
+            return replica_result
+
+        if replica_result.result is not None:
+            replica_results[replica_result.index] = replica_result
+        final = all(r not in pending for r in replicas)
+        if not final and not (anytime and replica_result.result is not None):
+            return None
+
+        return _merge_replica_results(
+            index,
+            [replica_results[r] for r in replicas if r in replica_results],
+            final,
+        )
+
+    try:
+        futures = {
+            SearchPool.submit(
+                _search_world_batch,
+                channel_id,
+                shared_strings.name,
+                [
+                    (replica, *shared_strings.locations[replica_worlds[replica]])
+                    for replica in batch
+                ],
+                search_time_ms,
+                deadline,
+                ANYTIME_SLICES if anytime else 1,
+            ): batch
+            for batch in batches
+        }
+        searched_any = False
+        while pending:
+            try:
+                replica_result = channel.get(timeout=MIN_SEARCH_TIME_MS / 1000)
+            except queue.Empty:
+                if not futures:
+                    # every batch finished and no result arrived since the last one did
+                    break
+                for fut, batch in list(futures.items()):
+                    if not fut.done():
+                        continue
+                    # a batch that finished has published all of its results
+                    # unless the pool was restarted while it was running
+                    futures.pop(fut)
+                    # batches that had not started when the pool was restarted are cancelled
+                    error = CancelledError() if fut.cancelled() else fut.exception()
+                    if error is not None:
+                        logger.warning("Search failed: {}".format(repr(error)))
+                        for replica in batch:
+                            if replica in pending:
+                                pending.discard(replica)
+                                world_result = collect(WorldResult(replica, None, 0))
+                                if world_result is not None:
+                                    yield world_result
+
+                late = time.time() > deadline + LATE_RESULT_GRACE_MS / 1000
+                if late and searched_any:
+                    break
+                continue
+
+            if replica_result.index in pending:
+                if replica_result.final:
+                    pending.discard(replica_result.index)
+                    searched_any = searched_any or replica_result.result is not None
+                world_result = collect(replica_result)
+                if world_result is not None:
+                    yield world_result
+
+        unfinished = sorted({replica_worlds[r] for r in pending})
+        pending.clear()
+        for index in unfinished:
+            yield _merge_replica_results(
+                index,
+                [
+                    replica_results[r]
+                    for r in world_replicas[index]
+                    if r in replica_results and replica_results[r].final
+                ],
+                True,
+            )
+    finally:
+        SearchPool.close_channel(channel_id)
+        shared_strings.close()
+
+
 def poke_engine_get_damage_rolls(
     battle: Battle, side_one_move, side_two_move, side_one_went_first
 ):
@@ -342,13 +746,263 @@ def poke_engine_get_damage_rolls(
     return s1_rolls, s2_rolls
 
 
+def poke_engine_get_damage_rolls_for_variants(
+    battle: Battle,
+    side_one_move,
+    side_two_move,
+    side_one_went_first,
+    variants: list[tuple[str, str, str, tuple]],
+):
+    """
+    The damage rolls of `poke_engine_get_damage_rolls` for every
+    (ability, item, nature, evs) variant of the opponent's active pokemon
+
+    The state is built once and only the opponent's active pokemon is replaced for each variant.
+    The battle is not changed
+    """
+    if side_one_move.startswith("switch"):
+        side_one_move = "switch"
+    if side_two_move.startswith("switch"):
+        side_two_move = "switch"
+
+    state = battle_to_poke_engine_state(battle)
+    side_two = state.side_two
+    pokemon = side_two.pokemon
+    active_index = int(side_two.active_index)
+
+    logger.debug(
+        "Calling calculate damage for {} variants with state: {}, m1: {}, m2: {}, s1_went_first: {}".format(
+            len(variants),
+            state.to_string(),
+            side_one_move,
+            side_two_move,
+            side_one_went_first,
+        )
+    )
+
+    rolls = []
+    for ability, item, nature, evs in variants:
+        pkmn = battle.opponent.active.snapshot()
+        pkmn.ability = ability
+        pkmn.item = item
+        pkmn.set_spread(nature, evs)
+
+        pokemon[active_index] = pokemon_to_poke_engine_pkmn(pkmn)
+        side_two.pokemon = pokemon
+        side_two.substitute_health = get_substitute_health(pkmn)
+        state.side_two = side_two
+        rolls.append(
+            calculate_damage(
+                state,
+                side_one_move,
+                side_two_move,
+                side_one_went_first,
+            )
+        )
+
+    logger.debug("Got Rolls for {} variants".format(len(rolls)))
+
+    return rolls
+
+
+def _merge_side_results(
+    side_results: list[list[MctsSideResult]], weights: list[float]
+) -> list[MctsSideResult]:
+    merged = {}
+    for side_result, weight in zip(side_results, weights):
+        for option in side_result:
+            total_score, visits = merged.get(option.move_choice, (0.0, 0))
+            merged[option.move_choice] = (
+                total_score + weight * option.total_score,
+                visits + int(weight * option.visits),
+            )
+
+    return [
+        MctsSideResult(move_choice=move_choice, total_score=total_score, visits=visits)
+        for move_choice, (total_score, visits) in merged.items()
+    ]
+
+
+def merge_mcts_results(
+    mcts_results: list[MctsResult], weights: Optional[list[float]] = None
+) -> MctsResult:
+    """
+    Combine the root statistics of searches that were done on the same state
+    Visits and scores are summed for each move, optionally scaling each result by a weight
+    """
+    if weights is None:
+        weights = [1.0] * len(mcts_results)
+
+    return MctsResult(
+        side_one=_merge_side_results([r.side_one for r in mcts_results], weights),
+        side_two=_merge_side_results([r.side_two for r in mcts_results], weights),
+        total_visits=sum(
+            int(w * r.total_visits) for r, w in zip(mcts_results, weights)
+        ),
+    )
+
+
+def get_transition(battle: Battle) -> tuple[str, str]:
+    """The observed (our move, their move) that led to the current state of the battle"""
+    return battle.user.last_used_move.move, battle.opponent.last_used_move.move
+
+
+def _pokemon_signature(p: PokeEnginePokemon) -> tuple:
+    return (
+        p.id,
+        p.ability,
+        p.item,
+        tuple(sorted(m.id for m in p.moves if m.id != "none")),
+    )
+
+
+def _side_signature(side: PokeEngineSide) -> tuple:
+    active_index = int(side.active_index)
+    active = side.pokemon[active_index]
+    side_conditions = side.side_conditions
+    return (
+        _pokemon_signature(active),
+        math.ceil(4 * active.hp / max(active.maxhp, 1)),
+        active.status,
+        (
+            side.attack_boost,
+            side.defense_boost,
+            side.special_attack_boost,
+            side.special_defense_boost,
+            side.speed_boost,
+            side.accuracy_boost,
+            side.evasion_boost,
+        ),
+        (
+            side_conditions.spikes,
+            side_conditions.toxic_spikes,
+            side_conditions.stealth_rock,
+            side_conditions.sticky_web,
+            side_conditions.reflect,
+            side_conditions.light_screen,
+            side_conditions.aurora_veil,
+            side_conditions.tailwind,
+        ),
+        tuple(
+            sorted(
+                _pokemon_signature(p)
+                for i, p in enumerate(side.pokemon)
+                if i != active_index and p.hp > 0
+            )
+        ),
+    )
+
+
+def get_state_signature(state: PokeEngineState) -> tuple:
+    """
+    A coarse description of a state that stays the same from turn to turn while the position does
+
+    Each side is described by its active pokemon, the active pokemon's hp in quarters, status and boosts,
+    the hazards and screens on that side, and which reserves are alive.
+    Weather, terrain and trick room are included. Exact hp, pp, and turn counters are left out
+    """
+    return (
+        _side_signature(state.side_one),
+        _side_signature(state.side_two),
+        state.weather,
+        state.terrain,
+        state.trick_room,
+    )
+
+
+def _keep_options(result: MctsResult, options_result: MctsResult) -> MctsResult:
+    side_one_options = {o.move_choice for o in options_result.side_one}
+    side_two_options = {o.move_choice for o in options_result.side_two}
+    side_one = [o for o in result.side_one if o.move_choice in side_one_options]
+    return MctsResult(
+        side_one=side_one,
+        side_two=[o for o in result.side_two if o.move_choice in side_two_options],
+        total_visits=sum(o.visits for o in side_one),
+    )
+
+
+class SearchSession:
+    """
+    Keeps the root statistics of the worlds searched for previous decisions in a battle
+
+    poke-engine always starts a search from an empty tree and cannot be seeded,
+    so the root statistics of a world searched for the previous decision are used as a prior instead.
+    A world is matched to a previous one when its state has the same `get_state_signature`
+    and was reached through the same (our move, their move) transition.
+    Each previous world is the prior of at most one world of a decision,
+    and the results of a decision are only stored once all of its worlds are warm-started.
+
+    The prior is added to the new search's root statistics after the search, scaled by `decay`.
+    Only the options that are available in the new search are kept. The merged statistics are
+    stored for the next decision, so a search from n decisions ago is weighted by decay ** n
+    """
+
+    def __init__(self, max_entries: int = 64, decay: float = 0.5):
+        self.max_entries = max_entries
+        self.decay = decay
+        self.results: OrderedDict[tuple, list[MctsResult]] = OrderedDict()
+
+    def warm_start(
+        self,
+        transition: tuple[str, str],
+        worlds: list[tuple[Hashable, MctsResult]],
+    ) -> list[MctsResult]:
+        """Warm-starts the (state signature, result) of every world searched for one decision"""
+        decision_results: OrderedDict[tuple, list[MctsResult]] = OrderedDict()
+        warm_started = []
+        for state_signature, result in worlds:
+            key = (transition, state_signature)
+            previous_results = self.results.get(key)
+            if previous_results:
+                previous_result = _keep_options(previous_results.pop(0), result)
+                logger.info(
+                    "Warm-starting search with {} iterations from a previous search".format(
+                        int(self.decay * previous_result.total_visits)
+                    )
+                )
+                result = merge_mcts_results(
+                    [previous_result, result], [self.decay, 1.0]
+                )
+
+            decision_results.setdefault(key, []).append(result)
+            warm_started.append(result)
+
+        for key, results in decision_results.items():
+            self.results.pop(key, None)
+            self.results[key] = results
+        while len(self.results) > self.max_entries:
+            self.results.popitem(last=False)
+
+        return warm_started
+
+
+_search_sessions: dict[str, SearchSession] = {}
+
+
+def get_search_session(battle_tag: str) -> SearchSession:
+    if battle_tag not in _search_sessions:
+        _search_sessions[battle_tag] = SearchSession()
+    return _search_sessions[battle_tag]
+
+
+def end_search_session(battle_tag: str):
+    _search_sessions.pop(battle_tag, None)
+
+
 def get_payoff_matrix_from_mcts(
-    poke_engine_state: PokeEngineState, search_time_ms: int
+    poke_engine_state: PokeEngineState,
+    search_time_ms: int,
+    search_session: Optional[SearchSession] = None,
+    transition: tuple[str, str] = ("", ""),
 ):
     state_string = poke_engine_state.to_string()
     logger.debug("Calling with state: {}".format(state_string))
 
     mcts_result = monte_carlo_tree_search(poke_engine_state, search_time_ms)
+    if search_session is not None:
+        [mcts_result] = search_session.warm_start(
+            transition, [(get_state_signature(poke_engine_state), mcts_result)]
+        )
 
     iterations = mcts_result.total_visits
 
@@ -380,4 +1034,84 @@ def get_payoff_matrix_with_minimax(
 
     id_result = iterative_deepening_expectiminimax(poke_engine_state, search_time_ms)
 
-    return id_result.get_safest_move()
+    return select_safest_move([(get_worst_case_move_values(id_result), 1.0)])
+
+
+def get_worst_case_move_values(
+    id_result: IterativeDeepeningResult,
+) -> dict[str, float]:
+    """
+    The lowest score each of side_one's moves gets against any of side_two's moves
+
+    `IterativeDeepeningResult.get_safest_move` never advances through the matrix
+    so it compares every move by the first row. The matrix is row-major by side_one's moves
+    and moves the search pruned are None.
+    """
+    num_side_two_moves = len(id_result.side_two)
+    move_values = {}
+    for i, move in enumerate(id_result.side_one):
+        row = id_result.matrix[i * num_side_two_moves : (i + 1) * num_side_two_moves]
+        scores = [score for score in row if score is not None]
+        if scores:
+            move_values[move] = min(scores)
+
+    return move_values
+
+
+def search_world_with_minimax(
+    state_string: str, search_time_ms: int
+) -> dict[str, float]:
+    id_result = iterative_deepening_expectiminimax(
+        SerializedState(state_string), search_time_ms
+    )
+    logger.debug("Searched to depth {}".format(id_result.depth_searched))
+    return get_worst_case_move_values(id_result)
+
+
+def select_safest_move(move_values: list[tuple[dict[str, float], float]]) -> str:
+    """
+    Picks the move with the best worst-case value weighted by the chance of each world.
+    A move that wasn't searched in a world is given the lowest value of that world
+    """
+    move_values = [(values, chance) for values, chance in move_values if values]
+    if not move_values:
+        raise ValueError("No move found")
+
+    all_moves = set()
+    for values, _ in move_values:
+        all_moves.update(values.keys())
+
+    weighted_values = {}
+    for move in all_moves:
+        weighted_values[move] = sum(
+            chance * values.get(move, min(values.values()))
+            for values, chance in move_values
+        )
+
+    if len(move_values) > 1:
+        logger.info(
+            "Weighted worst-case values: {}".format(
+                {
+                    move: round(value, 3)
+                    for move, value in sorted(
+                        weighted_values.items(), key=lambda x: x[1], reverse=True
+                    )
+                }
+            )
+        )
+
+    # sorted so that ties are broken the same way every time
+    return max(sorted(all_moves), key=lambda move: weighted_values[move])
+
+
+def search_worlds_with_minimax(
+    state_strings: list[str], weights: list[float], search_time_ms: int
+) -> str:
+    """
+    Searches each world with expectiminimax on the search pool and picks the safest move across them
+    """
+    move_values = SearchPool.run(
+        search_world_with_minimax,
+        [(state_string, search_time_ms) for state_string in state_strings],
+    )
+    return select_safest_move(list(zip(move_values, weights)))
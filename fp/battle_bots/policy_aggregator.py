@@ -0,0 +1,88 @@
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+# a world's visit share is treated as being within a Hoeffding bound of its final value
+# with probability 1 - CONFIDENCE_DELTA. Smaller values stop the search later but more safely
+CONFIDENCE_DELTA = 0.05
+
+
+class PolicyAggregator:
+    """
+    Accumulates the final policy as the results of each sampled world arrive
+
+    Each world contributes its visit distribution scaled by the chance of that world.
+    A world's result can be replaced by a newer one from the same world,
+    which is how the intermediate results of an anytime search are folded in.
+    """
+
+    def __init__(self):
+        self.results = {}
+
+    @property
+    def num_results(self) -> int:
+        return len(self.results)
+
+    def add(self, mcts_result, sample_chance: float, index: int):
+        self.results[index] = (mcts_result, sample_chance)
+
+    def policy(self) -> dict[str, float]:
+        policy = {}
+        for mcts_result, sample_chance in self.results.values():
+            for s1_option in mcts_result.side_one:
+                policy[s1_option.move_choice] = policy.get(s1_option.move_choice, 0) + (
+                    sample_chance * (s1_option.visits / mcts_result.total_visits)
+                )
+        return policy
+
+    def is_converged(self, pending_weight: float) -> bool:
+        """
+        True when the leading move can no longer be overtaken
+
+        Each world's visit shares are given a confidence interval that narrows as it is visited more.
+        `pending_weight` is the total chance of the worlds that have no result yet,
+        in the worst case all of it could go to any one of the other moves.
+        """
+        lower, upper = {}, {}
+        for mcts_result, sample_chance in self.results.values():
+            if not mcts_result.total_visits:
+                continue
+            radius = math.sqrt(
+                math.log(2 / CONFIDENCE_DELTA) / (2 * mcts_result.total_visits)
+            )
+            for s1_option in mcts_result.side_one:
+                share = s1_option.visits / mcts_result.total_visits
+                move = s1_option.move_choice
+                lower[move] = lower.get(move, 0) + sample_chance * max(
+                    share - radius, 0
+                )
+                upper[move] = upper.get(move, 0) + sample_chance * min(
+                    share + radius, 1
+                )
+
+        if not lower:
+            return False
+        if len(lower) == 1:
+            return True
+
+        best_move = max(lower, key=lower.get)
+        best_challenger = max(v for k, v in upper.items() if k != best_move)
+        return lower[best_move] > best_challenger + pending_weight
+
+    def best_move(self) -> str:
+        for index, (mcts_result, sample_chance) in self.results.items():
+            this_policy = max(mcts_result.side_one, key=lambda x: x.visits)
+            logger.info(
+                "Policy {}: {} visited {}% avg_score={} sample_chance_multiplier={}".format(
+                    index,
+                    this_policy.move_choice,
+                    round(100 * this_policy.visits / mcts_result.total_visits, 2),
+                    this_policy.total_score / this_policy.visits,
+                    round(sample_chance, 3),
+                )
+            )
+
+        final_policy = sorted(self.policy().items(), key=lambda x: x[1], reverse=True)
+        logger.info("Final policy: {}".format(final_policy))
+        return final_policy[0][0]
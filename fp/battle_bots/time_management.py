@@ -0,0 +1,102 @@
+import logging
+import math
+
+from config import FoulPlayConfig
+from fp.battle import Battle, Battler
+
+logger = logging.getLogger(__name__)
+
+# a decision with only one option is still searched for this long
+# so that the engine returns the option in the format the bot expects
+FORCED_SEARCH_TIME_MS = 10
+
+# the number of (user option, opponent option) pairs that `SEARCH_TIME_MS` is tuned for
+# 4 moves and a few switches on each side
+TYPICAL_BRANCHING_FACTOR = 64
+
+# bounds on how much the branching factor can scale the search time
+MIN_BRANCHING_SCALE = 0.5
+MAX_BRANCHING_SCALE = 2.0
+
+# the first turns are searched with a lot of the opponent's team unrevealed
+OPENING_TURNS = 2
+OPENING_SCALE = 0.75
+
+# when this few pokemon are left between both sides each decision is likely to decide the game
+ENDGAME_ALIVE_PKMN = 4
+ENDGAME_SCALE = 1.5
+
+# when the battle timer is on, never use more than this share of the time left this turn
+# the rest is left for sending the decision and for the turns that follow
+TIMER_SHARE = 0.25
+TIMER_SAFETY_MARGIN_MS = 3000
+
+
+def get_num_user_options(battle: Battle) -> int:
+    switches = [p for p in battle.user.reserve if p.is_alive()]
+    if battle.force_switch or battle.team_preview or battle.user.active is None:
+        return max(len(switches), 1)
+
+    moves = [m for m in battle.user.active.moves if not m.disabled and m.current_pp > 0]
+    num_options = max(len(moves), 1)  # struggle if there are no usable moves
+    if not battle.user.trapped:
+        num_options += len(switches)
+    return num_options
+
+
+def get_num_opponent_options(battler: Battler) -> int:
+    num_options = len([p for p in battler.reserve if p.is_alive()])
+    if battler.active is not None and battler.active.is_alive():
+        # unrevealed moves are assumed to be there
+        num_options += max(len(battler.active.moves), 4)
+    return max(num_options, 1)
+
+
+def get_num_alive_pkmn(battler: Battler) -> int:
+    pkmn = [battler.active] + battler.reserve
+    return len([p for p in pkmn if p is not None and p.is_alive()])
+
+
+def get_search_time_ms(battle: Battle) -> int:
+    """
+    The time to search for a move this decision
+
+    `SEARCH_TIME_MS` is scaled by how many options both sides have and by the phase of the battle,
+    and is capped by the battle timer when it is on. A decision with one option is not searched for long.
+    Returns `SEARCH_TIME_MS` unchanged if `DYNAMIC_SEARCH_TIME` is off
+    """
+    base_search_time_ms = FoulPlayConfig.search_time_ms
+    if not FoulPlayConfig.dynamic_search_time:
+        return base_search_time_ms
+
+    num_user_options = get_num_user_options(battle)
+    if num_user_options <= 1:
+        logger.info("Only one option, search time: {}ms".format(FORCED_SEARCH_TIME_MS))
+        return FORCED_SEARCH_TIME_MS
+
+    branching_factor = num_user_options * get_num_opponent_options(battle.opponent)
+    scale = math.log(branching_factor) / math.log(TYPICAL_BRANCHING_FACTOR)
+    scale = max(MIN_BRANCHING_SCALE, min(scale, MAX_BRANCHING_SCALE))
+
+    if battle.turn and battle.turn <= OPENING_TURNS:
+        scale *= OPENING_SCALE
+    elif (
+        get_num_alive_pkmn(battle.user) + get_num_alive_pkmn(battle.opponent)
+        <= ENDGAME_ALIVE_PKMN
+    ):
+        scale *= ENDGAME_SCALE
+
+    search_time_ms = int(base_search_time_ms * scale)
+    if battle.time_remaining is not None:
+        timer_limit_ms = int(
+            (battle.time_remaining * 1000 - TIMER_SAFETY_MARGIN_MS) * TIMER_SHARE
+        )
+        search_time_ms = min(search_time_ms, timer_limit_ms)
+
+    search_time_ms = max(search_time_ms, FORCED_SEARCH_TIME_MS)
+    logger.info(
+        "Branching factor: {}, search time: {}ms".format(
+            branching_factor, search_time_ms
+        )
+    )
+    return search_time_ms
@@ -16,7 +16,7 @@ from fp.battle import Pokemon
 from fp.battle import LastUsedMove
 from fp.battle import DamageDealt
 from fp.battle import StatRange
-from fp.battle_bots.poke_engine_helpers import poke_engine_get_damage_rolls
+from fp.battle_bots.poke_engine_helpers import poke_engine_get_damage_rolls_for_variants
 from fp.helpers import normalize_name
 from fp.helpers import get_pokemon_info_from_condition
 from fp.helpers import calculate_stats
@@ -290,7 +290,7 @@ def switch_or_drag(battle, split_msg, switch_or_drag="switch"):
             logger.info(
                 "Baton passing, preserving boosts: {}".format(dict(side.active.boosts))
             )
-            baton_passed_boosts = deepcopy(side.active.boosts)
+            baton_passed_boosts = side.active.boosts.copy()
 
             if constants.SUBSTITUTE in side.active.volatile_statuses:
                 logger.info("Baton passing, preserving substitute")
@@ -1382,8 +1382,9 @@ def clearboost(battle, split_msg):
         pkmn = battle.user.active
 
     for stat, value in pkmn.boosts.items():
-        logger.info("Setting {}'s {} boost to 0".format(pkmn.name, stat))
-        pkmn.boosts[stat] = 0
+        if value != 0:
+            logger.info("Setting {}'s {} boost to 0".format(pkmn.name, stat))
+            pkmn.boosts[stat] = 0
 
 
 def clearallboost(battle, _):
@@ -1650,16 +1651,16 @@ def transform(battle, split_msg):
     if is_opponent(battle, split_msg):
         transformed_into_name = battle.user.active.name
 
-        battle_copy = deepcopy(battle)
-        battle.opponent.active.boosts = deepcopy(battle.user.active.boosts)
+        battle.opponent.active.boosts = battle.user.active.boosts.copy()
 
+        # only the parts of `transformed_into` that are copied below are given to the opponent
         if (
-            battle_copy.user.active.name == transformed_into_name
-            or battle_copy.user.active.name.startswith(transformed_into_name)
+            battle.user.active.name == transformed_into_name
+            or battle.user.active.name.startswith(transformed_into_name)
         ):
-            transformed_into = battle_copy.user.active
+            transformed_into = battle.user.active
         else:
-            transformed_into = battle_copy.user.find_pokemon_in_reserves(
+            transformed_into = battle.user.find_pokemon_in_reserves(
                 transformed_into_name
             )
 
@@ -1670,9 +1671,9 @@ def transform(battle, split_msg):
         )
         battle.opponent.active.stats = deepcopy(transformed_into.stats)
         battle.opponent.active.ability = deepcopy(transformed_into.ability)
-        battle.opponent.active.moves = deepcopy(transformed_into.moves)
+        battle.opponent.active.moves = [m.snapshot() for m in transformed_into.moves]
         battle.opponent.active.types = deepcopy(transformed_into.types)
-        battle.opponent.active.boosts = deepcopy(transformed_into.boosts)
+        battle.opponent.active.boosts = transformed_into.boosts.copy()
 
         for mv in battle.opponent.active.moves:
             mv.current_pp = 5
@@ -1767,14 +1768,10 @@ def check_speed_ranges(battle, msg_lines):
     ):
         return
 
-    battle_copy = deepcopy(battle)
-    battle_copy_for_stats = deepcopy(battle_copy)
-    battle_copy.user.active.status = battle_copy_for_stats.user.active.stats
-
     speed_threshold = int(
-        boost_multiplier_lookup[battle_copy.user.active.boosts[constants.SPEED]]
-        * battle_copy.user.active.stats[constants.SPEED]
-        / boost_multiplier_lookup[battle_copy.opponent.active.boosts[constants.SPEED]]
+        boost_multiplier_lookup[battle.user.active.boosts[constants.SPEED]]
+        * battle.user.active.stats[constants.SPEED]
+        / boost_multiplier_lookup[battle.opponent.active.boosts[constants.SPEED]]
     )
 
     if battle.opponent.side_conditions[constants.TAILWIND]:
@@ -1910,7 +1907,7 @@ def check_choicescarf(battle, msg_lines):
     if moves[0][1][constants.PRIORITY] != moves[1][1][constants.PRIORITY]:
         return
 
-    battle_copy = deepcopy(battle)
+    battle_copy = battle.snapshot()
     if (
         battle.opponent.active is None
         or battle.opponent.active.item != constants.UNKNOWN_ITEM
@@ -2023,42 +2020,58 @@ def _do_check(
 ):
     actual_damage_dealt = damage_dealt.percent_damage * battle_copy.user.active.max_hp
 
-    indicies_to_remove = []
-    num_starting_possibilites = len(possibilites)
-    for i in range(num_starting_possibilites):
-        p = possibilites[i]
-        if isinstance(p, PredictedPokemonSet):
-            p = p.pkmn_set
-
-        if not battle.opponent.active.ability:
-            battle_copy.opponent.active.ability = p.ability
-        if battle.opponent.active.item == constants.UNKNOWN_ITEM:
-            battle_copy.opponent.active.item = p.item
-        battle_copy.opponent.active.set_spread(
-            p.nature, ",".join(str(x) for x in p.evs)
-        )
-
-        damage = None
-        if check_type == "damage_received":
-            actual_damage_dealt = (
-                damage_dealt.percent_damage * battle_copy.opponent.active.max_hp
-            )
-
-            if bot_went_first:
-                opponent_move = constants.DO_NOTHING_MOVE
-            else:
-                opponent_move = battle_copy.opponent.last_used_move.move
-
-            damage, _ = poke_engine_get_damage_rolls(
-                battle_copy, damage_dealt.move, opponent_move, bot_went_first
+    # every possibility is checked against the same state, only the opponent's active pokemon differs
+    pkmn_sets = [
+        p.pkmn_set if isinstance(p, PredictedPokemonSet) else p for p in possibilites
+    ]
+    variants = [
+        (
+            battle_copy.opponent.active.ability
+            if battle.opponent.active.ability
+            else p.ability,
+            p.item
+            if battle.opponent.active.item == constants.UNKNOWN_ITEM
+            else battle_copy.opponent.active.item,
+            p.nature,
+            tuple(p.evs),
+        )
+        for p in pkmn_sets
+    ]
+
+    if check_type == "damage_received":
+        if bot_went_first:
+            opponent_move = constants.DO_NOTHING_MOVE
+        else:
+            opponent_move = battle_copy.opponent.last_used_move.move
+        all_damage = [
+            s1_rolls
+            for s1_rolls, _ in poke_engine_get_damage_rolls_for_variants(
+                battle_copy, damage_dealt.move, opponent_move, bot_went_first, variants
             )
-        elif check_type == "damage_dealt":
-            _, damage = poke_engine_get_damage_rolls(
+        ]
+    elif check_type == "damage_dealt":
+        all_damage = [
+            s2_rolls
+            for _, s2_rolls in poke_engine_get_damage_rolls_for_variants(
                 battle_copy,
                 battle_copy.user.last_selected_move.move,
                 damage_dealt.move,
                 bot_went_first,
+                variants,
             )
+        ]
+
+    indicies_to_remove = []
+    num_starting_possibilites = len(possibilites)
+    for i, (p, damage) in enumerate(zip(pkmn_sets, all_damage)):
+        if check_type == "damage_received":
+            max_hp = calculate_stats(
+                battle_copy.opponent.active.base_stats,
+                battle_copy.opponent.active.level,
+                evs=p.evs,
+                nature=p.nature,
+            )[constants.HITPOINTS]
+            actual_damage_dealt = damage_dealt.percent_damage * max_hp
 
         lower_bound_violated = check_lower_bound and (
             actual_damage_dealt < (damage[0] * 0.975 - 5)
@@ -2127,7 +2140,7 @@ def update_dataset_possibilities(
     ):
         return
 
-    battle_copy = deepcopy(battle)
+    battle_copy = battle.snapshot()
 
     if battle.battle_type == constants.RANDOM_BATTLE:
         possibilites = RandomBattleTeamDatasets.get_pkmn_sets_from_pkmn_name(
@@ -1,3 +1,5 @@
+import array
+import functools
 import math
 import constants
 from config import FoulPlayConfig
@@ -148,11 +150,90 @@ def _calculate_stats(base_stats, level, ivs=(31,) * 6, evs=(85,) * 6, nature="se
     return new_stats
 
 
-def calculate_stats(base_stats, level, ivs=(31,) * 6, evs=(85,) * 6, nature="serious"):
-    if any(g in FoulPlayConfig.pokemon_mode for g in ["gen1", "gen2"]):
-        return _calculate_stats_gen_1_2(base_stats, level)
+STAT_NAMES = (
+    constants.HITPOINTS,
+    constants.ATTACK,
+    constants.DEFENSE,
+    constants.SPECIAL_ATTACK,
+    constants.SPECIAL_DEFENSE,
+    constants.SPEED,
+)
+
+# the number of distinct stat calculations and speed tables to keep
+STAT_CACHE_SIZE = 16384
+
+# speed for every nature multiplier (neutral, plus, minus) and every 4 EVs from 0 to 252
+SPEED_TABLE_ROW_LENGTH = 64
+
+
+def _is_gen_1_2():
+    return any(g in FoulPlayConfig.pokemon_mode for g in ["gen1", "gen2"])
+
+
+@functools.lru_cache(maxsize=STAT_CACHE_SIZE)
+def _cached_stats(gen_1_2, base_stats, level, ivs, evs, nature):
+    base_stats = dict(zip(STAT_NAMES, base_stats))
+    if gen_1_2:
+        stats = _calculate_stats_gen_1_2(base_stats, level)
     else:
-        return _calculate_stats(base_stats, level, ivs, evs, nature)
+        stats = _calculate_stats(base_stats, level, ivs, evs, nature)
+    return tuple(stats[s] for s in STAT_NAMES)
+
+
+def calculate_stats(base_stats, level, ivs=(31,) * 6, evs=(85,) * 6, nature="serious"):
+    """
+    Stats are cached by everything they are calculated from
+    A new dict is returned every time so it can be changed by the caller
+    """
+    stats = _cached_stats(
+        _is_gen_1_2(),
+        tuple(base_stats[s] for s in STAT_NAMES),
+        level,
+        tuple(ivs),
+        tuple(evs),
+        nature,
+    )
+    return dict(zip(STAT_NAMES, stats))
+
+
+@functools.lru_cache(maxsize=STAT_CACHE_SIZE)
+def _speed_table(base_speed, level):
+    table = array.array("i")
+    for multiplier in (None, 1.1, 0.9):
+        for i in range(SPEED_TABLE_ROW_LENGTH):
+            speed = common_pkmn_stat_calc(base_speed, 31, i * 4, level) + 5
+            table.append(speed if multiplier is None else int(speed * multiplier))
+    return table
+
+
+def _speed_nature_row(nature):
+    nature_modifiers = natures.get(nature, {})
+    if nature_modifiers.get("plus") == constants.SPEED:
+        return 1
+    elif nature_modifiers.get("minus") == constants.SPEED:
+        return 2
+    return 0
+
+
+def calculate_speed_stats(
+    base_speed: int, level: int, spreads: list[tuple[str, tuple]]
+) -> list[int]:
+    """
+    The speed stat for every (nature, evs) spread of one pokemon
+    Every spread is a lookup into a table of speeds that is built once for the base speed and level
+    """
+    if _is_gen_1_2():
+        speed = common_pkmn_stat_calc_gen_1_2(base_speed, level) + 5
+        return [speed] * len(spreads)
+
+    table = _speed_table(base_speed, level)
+    return [
+        table[
+            _speed_nature_row(nature) * SPEED_TABLE_ROW_LENGTH
+            + min(evs[5] // 4, SPEED_TABLE_ROW_LENGTH - 1)
+        ]
+        for nature, evs in spreads
+    ]
 
 
 POKEMON_TYPE_INDICES = {
@@ -228,3 +309,11 @@ def is_super_effective(move_type, defending_pokemon_types):
 def is_not_very_effective(move_type, defending_pokemon_types):
     multiplier = type_effectiveness_modifier(move_type, defending_pokemon_types)
     return multiplier < 1
+
+
+def get_percentile(values, percentile):
+    if not values:
+        return 0
+    values = sorted(values)
+    index = min(int(len(values) * percentile / 100), len(values) - 1)
+    return values[index]
@@ -0,0 +1,552 @@
+"""
+A local stand-in for a Showdown server, for running the bot without a network connection
+
+It speaks enough of the protocol for `run.py` to log in, find battles with `/search`,
+`/challenge` and `/accept`, play them, and rejoin them after reconnecting.
+There is no battle simulator: every battle is a replay of a battle recorded with
+`LOG_TO_FILE=True`. A player is sent the recorded battle from their side and the replay
+waits for their choice after each request, the same as a live battle, but the choices
+do not change what happens.
+Two bots matched against each other each replay their own side of the same battle if
+both sides were recorded, otherwise each is matched with the opponent from the recording.
+
+Run with `python -m fp.local_server` and point the bot at it with
+`WEBSOCKET_URI=ws://localhost:8000` and `LOGIN_URI=http://localhost:8001`
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+import urllib.parse
+from collections import deque
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import websockets
+from websockets.asyncio.server import ServerConnection
+
+import constants
+from config import env, init_logging
+from fp.helpers import get_percentile
+from fp.websocket_client import get_room, normalize_username
+
+logger = logging.getLogger(__name__)
+
+RECEIVED_MESSAGE_PREFIX = "Received message from websocket: "
+
+# recorded lines that are not replayed
+# the stand-in sends its own init message and has no chat, spectators, or timer
+SKIPPED_LINE_PREFIXES = (
+    "|init|",
+    "|title|",
+    "|j|",
+    "|J|",
+    "|l|",
+    "|L|",
+    "|n|",
+    "|N|",
+    "|c|",
+    "|c:|",
+    "|inactive|",
+    "|inactiveoff|",
+    "|deinit",
+)
+
+# how long to wait for a choice before replaying the rest of the battle without it
+CHOICE_TIMEOUT_S = 60
+
+# how many of the most recent decision latencies are kept for the summary
+MAX_DECISION_LATENCIES = 10000
+
+
+@dataclass
+class RecordedSide:
+    name: str
+    lines: list[str]
+
+
+@dataclass
+class Recording:
+    battle_tag: str
+    battle_format: str
+    # the recorded player names, keyed by side id
+    names: dict[str, str]
+    # the lines received by each recorded side, keyed by side id
+    sides: dict[str, RecordedSide] = field(default_factory=dict)
+
+
+@dataclass
+class LocalBattle:
+    battle_tag: str
+    recording: Recording
+    # the username playing each side, keyed by side id
+    players: dict[str, str]
+    # every message sent to a player, resent when they rejoin the room
+    sent_messages: dict[str, list[str]] = field(default_factory=dict)
+    choices: dict[str, asyncio.Queue] = field(default_factory=dict)
+    waiting_for_choice: set[str] = field(default_factory=set)
+    finished_players: set[str] = field(default_factory=set)
+
+
+def read_battle_log(path: str) -> dict[str, list[str]]:
+    """The lines of every battle room received in a `LOG_TO_FILE` log, keyed by the battle tag"""
+    rooms = {}
+    room_lines = None
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if RECEIVED_MESSAGE_PREFIX in line:
+                room = get_room(line.split(RECEIVED_MESSAGE_PREFIX, 1)[1])
+                room_lines = (
+                    rooms.setdefault(room, []) if room.startswith("battle-") else None
+                )
+            elif room_lines is not None and line.startswith("|"):
+                room_lines.append(line)
+            else:
+                room_lines = None
+
+    return rooms
+
+
+def _get_request_json(line: str) -> Optional[dict]:
+    split_line = line.split("|", 2)
+    if len(split_line) < 3 or split_line[1] != "request" or not split_line[2].strip():
+        return None
+    return json.loads(split_line[2])
+
+
+def _is_finished_battle(lines: list[str]) -> bool:
+    return any(line.startswith(constants.START_STRING) for line in lines) and any(
+        line.startswith((constants.WIN_STRING, constants.TIE_STRING)) for line in lines
+    )
+
+
+def load_recordings(paths: list[str]) -> list[Recording]:
+    """
+    Every finished battle in the logs at `paths`
+
+    A battle that was logged by both players is one recording with both of its sides
+    """
+    recordings = {}
+    for path in sorted(paths):
+        for battle_tag, lines in read_battle_log(path).items():
+            if not _is_finished_battle(lines):
+                continue
+            request_json = next(
+                (r for r in map(_get_request_json, lines) if r is not None), None
+            )
+            if request_json is None:
+                continue
+
+            if battle_tag not in recordings:
+                recordings[battle_tag] = Recording(
+                    battle_tag,
+                    battle_tag.split("-")[1],
+                    {
+                        split_line[2]: split_line[3]
+                        for split_line in (line.split("|") for line in lines)
+                        if split_line[1] == "player" and len(split_line) > 3
+                    },
+                )
+            side = request_json[constants.SIDE]
+            recordings[battle_tag].sides[side[constants.ID]] = RecordedSide(
+                side["name"], lines
+            )
+
+    return list(recordings.values())
+
+
+def split_messages(lines: list[str]) -> list[str]:
+    # Showdown sends each request as its own message, followed by the lines it is the request for
+    messages = []
+    message_lines = []
+    for line in lines:
+        if line.startswith(SKIPPED_LINE_PREFIXES):
+            continue
+        if message_lines and (
+            line.startswith("|request|") or message_lines[-1].startswith("|request|")
+        ):
+            messages.append("\n".join(message_lines))
+            message_lines = []
+        message_lines.append(line)
+
+    if message_lines:
+        messages.append("\n".join(message_lines))
+    return messages
+
+
+def rename_players(line: str, renames: dict[str, str]) -> str:
+    """Replaces the recorded player names in a line with the names of who is playing the replay"""
+    split_line = line.split("|")
+    if line.startswith("|player|") and len(split_line) > 3:
+        split_line[3] = renames.get(split_line[3], split_line[3])
+    elif line.startswith(constants.WIN_STRING):
+        split_line[2] = renames.get(split_line[2].strip(), split_line[2])
+    elif (request_json := _get_request_json(line)) is not None:
+        side = request_json[constants.SIDE]
+        side["name"] = renames.get(side["name"], side["name"])
+        return "|request|{}".format(json.dumps(request_json))
+
+    return "|".join(split_line)
+
+
+def needs_decision(message: str) -> bool:
+    request_json = _get_request_json(message)
+    return request_json is not None and not request_json.get(constants.WAIT, False)
+
+
+class _LoginRequestHandler(BaseHTTPRequestHandler):
+    # every login succeeds, the stand-in does not check the assertion it is sent
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        data = urllib.parse.parse_qs(self.rfile.read(length).decode())
+        if "pass" in data:
+            body = "]{}".format(
+                json.dumps(
+                    {
+                        "actionsuccess": True,
+                        "assertion": "{},local".format(data["name"][0]),
+                    }
+                )
+            )
+        else:
+            body = "{},local".format(data.get("userid", [""])[0])
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class LocalShowdownServer:
+    def __init__(self, recordings: list[Recording], pair_searches: bool = False):
+        self.recordings = recordings
+
+        # if set, `/search` waits for another player to search for the same format
+        # otherwise every search starts a battle against the opponent from the recording
+        self.pair_searches = pair_searches
+
+        self.usernames: dict[ServerConnection, str] = {}
+        self.connections: dict[str, ServerConnection] = {}
+        self.battles: dict[str, LocalBattle] = {}
+        self.searches: dict[str, list[str]] = {}
+        self.challenges: dict[tuple[str, str], str] = {}
+        self.replays: set[asyncio.Task] = set()
+
+        self.battle_count = 0
+        self.finished_battles = 0
+        self.decision_count = 0
+        self.decision_latencies_ms: deque[float] = deque(maxlen=MAX_DECISION_LATENCIES)
+        self.start_time = time.time()
+
+        self.websocket_server = None
+        self.login_server = None
+
+    async def start(self, host: str, port: int, login_port: int):
+        self.login_server = ThreadingHTTPServer(
+            (host, login_port), _LoginRequestHandler
+        )
+        threading.Thread(target=self.login_server.serve_forever, daemon=True).start()
+        self.websocket_server = await websockets.serve(
+            self.handle_connection, host, port
+        )
+        self.start_time = time.time()
+        logger.info(
+            "Serving {} recorded battles on ws://{}:{}, logins on http://{}:{}".format(
+                len(self.recordings), host, port, host, login_port
+            )
+        )
+
+    async def close(self):
+        for replay in list(self.replays):
+            replay.cancel()
+        self.websocket_server.close()
+        await self.websocket_server.wait_closed()
+        self.login_server.shutdown()
+        self.login_server.server_close()
+
+    async def handle_connection(self, websocket: ServerConnection):
+        await websocket.send("|challstr|4|{}".format(secrets.token_hex(64)))
+        try:
+            async for message in websocket:
+                await self.handle_message(websocket, message)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            username = self.usernames.pop(websocket, None)
+            if (
+                username is not None
+                and self.connections.get(normalize_username(username)) is websocket
+            ):
+                self.connections.pop(normalize_username(username))
+                logger.info("{} disconnected".format(username))
+
+    async def send_to_user(self, username: str, message: str):
+        websocket = self.connections.get(normalize_username(username))
+        if websocket is None:
+            return
+        try:
+            await websocket.send(message)
+        except websockets.ConnectionClosed:
+            # a player that reconnects is caught up when they rejoin the room
+            pass
+
+    async def handle_message(self, websocket: ServerConnection, message):
+        room, _, command = message.partition("|")
+        if command.startswith("/trn "):
+            username = command[len("/trn ") :].split(",")[0]
+            self.usernames[websocket] = username
+            self.connections[normalize_username(username)] = websocket
+            await websocket.send("|updateuser| {}|1|1|{{}}".format(username))
+            logger.info("{} logged in".format(username))
+            return
+
+        username = self.usernames.get(websocket)
+        if username is None:
+            logger.debug("Ignoring message from a guest: {}".format(message))
+        elif room:
+            self.handle_battle_message(username, room, command)
+        elif command.startswith("/search "):
+            await self.search(username, command[len("/search ") :].strip())
+        elif command.startswith("/challenge "):
+            target, _, battle_format = command[len("/challenge ") :].partition(",")
+            await self.challenge(username, target.strip(), battle_format.strip())
+        elif command.startswith("/accept "):
+            await self.accept(username, command[len("/accept ") :].strip())
+        elif command.startswith("/join "):
+            await self.join(username, command[len("/join ") :].strip())
+        elif command.startswith("/leave "):
+            await self.leave(username, command[len("/leave ") :].strip())
+        else:
+            logger.debug("Ignoring message from {}: {}".format(username, message))
+
+    def handle_battle_message(self, username, battle_tag, command):
+        battle = self.battles.get(battle_tag)
+        if battle is None or not command.startswith(("/choose ", "/team ")):
+            return
+        if username in battle.waiting_for_choice:
+            battle.choices[username].put_nowait(command)
+
+    async def search(self, username, battle_format):
+        if not self.pair_searches:
+            await self.start_battle(battle_format, [username])
+            return
+
+        searching = self.searches.setdefault(battle_format, [])
+        if searching and searching[0] != username:
+            await self.start_battle(battle_format, [searching.pop(0), username])
+        elif username not in searching:
+            searching.append(username)
+
+    async def challenge(self, username, target, battle_format):
+        target_websocket = self.connections.get(normalize_username(target))
+        if target_websocket is None:
+            await self.send_to_user(
+                username, "|popup|{} is not connected".format(target)
+            )
+            return
+
+        target = self.usernames[target_websocket]
+        self.challenges[(normalize_username(username), normalize_username(target))] = (
+            battle_format
+        )
+        await self.send_to_user(
+            target,
+            "|pm| {}| {}|/challenge {}|{}|||".format(
+                username, target, battle_format, battle_format
+            ),
+        )
+
+    async def accept(self, username, challenger):
+        battle_format = self.challenges.pop(
+            (normalize_username(challenger), normalize_username(username)), None
+        )
+        if battle_format is None:
+            await self.send_to_user(
+                username, "|popup|{} has not challenged you".format(challenger)
+            )
+            return
+        await self.start_battle(battle_format, [challenger, username])
+
+    async def join(self, username, battle_tag):
+        battle = self.battles.get(battle_tag)
+        if battle is None or username not in battle.sent_messages:
+            if battle_tag.startswith("battle-"):
+                await self.send_to_user(
+                    username,
+                    '>{}\n|noinit|nonexistent|The room "{}" does not exist.'.format(
+                        battle_tag, battle_tag
+                    ),
+                )
+            return
+
+        # a rejoined room is sent the whole battle so far
+        await self.send_to_user(
+            username,
+            "\n".join([">{}".format(battle_tag)] + battle.sent_messages[username]),
+        )
+
+    async def leave(self, username, battle_tag):
+        battle = self.battles.get(battle_tag)
+        if battle is None:
+            return
+        await self.send_to_user(username, ">{}\n|deinit".format(battle_tag))
+        battle.sent_messages.pop(username, None)
+        if not battle.sent_messages:
+            self.battles.pop(battle_tag)
+
+    def find_recording(self, battle_format, num_players) -> Optional[Recording]:
+        recordings = [
+            r
+            for r in self.recordings
+            if r.battle_format == battle_format and len(r.sides) >= num_players
+        ]
+        if not recordings:
+            return None
+        # the recordings are played in turns
+        return recordings[self.battle_count % len(recordings)]
+
+    async def start_battle(self, battle_format, usernames: list[str]):
+        recording = self.find_recording(battle_format, len(usernames))
+        if recording is None:
+            logger.error(
+                "No recorded {} battles for {} players".format(
+                    battle_format, len(usernames)
+                )
+            )
+            for username in usernames:
+                await self.send_to_user(
+                    username,
+                    "|popup|There are no recorded {} battles".format(battle_format),
+                )
+            return
+
+        self.battle_count += 1
+        battle_tag = "battle-{}-{}".format(battle_format, self.battle_count)
+        battle = LocalBattle(
+            battle_tag, recording, dict(zip(sorted(recording.sides), usernames))
+        )
+        self.battles[battle_tag] = battle
+        logger.info(
+            "Started {} for {}, replaying {}".format(
+                battle_tag, ", ".join(usernames), recording.battle_tag
+            )
+        )
+
+        for side_id in battle.players:
+            replay = asyncio.create_task(self.replay_side(battle, side_id))
+            self.replays.add(replay)
+            replay.add_done_callback(self.replays.discard)
+
+    async def send_battle_message(self, battle: LocalBattle, username, message):
+        battle.sent_messages[username].append(message)
+        await self.send_to_user(
+            username, "\n".join([">{}".format(battle.battle_tag), message])
+        )
+
+    async def wait_for_choice(self, battle: LocalBattle, username, prompt_time):
+        try:
+            await asyncio.wait_for(battle.choices[username].get(), CHOICE_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "{} did not choose within {}s in {}".format(
+                    username, CHOICE_TIMEOUT_S, battle.battle_tag
+                )
+            )
+        else:
+            self.decision_count += 1
+            self.decision_latencies_ms.append((time.time() - prompt_time) * 1000)
+        battle.waiting_for_choice.discard(username)
+
+    async def replay_side(self, battle: LocalBattle, side_id):
+        username = battle.players[side_id]
+        names = dict(battle.recording.names)
+        names.update(battle.players)
+        renames = {
+            battle.recording.names[side]: player
+            for side, player in battle.players.items()
+            if side in battle.recording.names
+        }
+
+        battle.sent_messages[username] = []
+        await self.send_battle_message(
+            battle,
+            username,
+            "|init|battle\n|title|{} vs. {}\n|j|☆{}".format(
+                names.get("p1"), names.get("p2"), username
+            ),
+        )
+
+        prompt_time = None
+        for message in split_messages(battle.recording.sides[side_id].lines):
+            message = "\n".join(
+                rename_players(line, renames) for line in message.split("\n")
+            )
+
+            # the battle continues once the request that was answered is followed by the next one
+            if prompt_time is not None and (
+                message.startswith("|request|")
+                or constants.WIN_STRING in message
+                or constants.TIE_STRING in message
+            ):
+                await self.wait_for_choice(battle, username, prompt_time)
+                prompt_time = None
+
+            if needs_decision(message):
+                # choices that arrived too late for an earlier request are dropped
+                battle.choices[username] = asyncio.Queue()
+                battle.waiting_for_choice.add(username)
+            await self.send_battle_message(battle, username, message)
+            if username in battle.waiting_for_choice:
+                prompt_time = time.time()
+
+        battle.finished_players.add(username)
+        if battle.finished_players == set(battle.players.values()):
+            self.finished_battles += 1
+            logger.info(self.get_summary())
+
+    def get_summary(self) -> str:
+        elapsed_s = max(time.time() - self.start_time, 1e-9)
+        summary = "Finished {} battles in {}s ({} per minute), {} decisions, latency p50/p90/p99: {}/{}/{}ms"
+        return summary.format(
+            self.finished_battles,
+            round(elapsed_s),
+            round(60 * self.finished_battles / elapsed_s, 1),
+            self.decision_count,
+            round(get_percentile(self.decision_latencies_ms, 50)),
+            round(get_percentile(self.decision_latencies_ms, 90)),
+            round(get_percentile(self.decision_latencies_ms, 99)),
+        )
+
+
+async def run_local_server():
+    init_logging(env("LOG_LEVEL", "INFO"), False)
+    recordings = load_recordings(
+        glob.glob(os.path.join(env("LOCAL_SERVER_RECORDINGS", "logs"), "*.log"))
+    )
+    port = env.int("LOCAL_SERVER_PORT", 8000)
+    server = LocalShowdownServer(
+        recordings, pair_searches=env.bool("LOCAL_SERVER_PAIR_SEARCHES", False)
+    )
+    await server.start(env("LOCAL_SERVER_HOST", "localhost"), port, port + 1)
+    try:
+        await asyncio.Future()
+    finally:
+        logger.info(server.get_summary())
+        await server.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_local_server())
+    except KeyboardInterrupt:
+        pass
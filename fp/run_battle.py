@@ -2,17 +2,27 @@ import importlib
 import json
 import asyncio
 import concurrent.futures
-from copy import deepcopy
+import contextvars
+from collections import OrderedDict, deque
 import logging
+import time
+from typing import Optional
 
 from data.pkmn_sets import RandomBattleTeamDatasets, TeamDatasets
 from data.pkmn_sets import SmogonSets
+from data.pkmn_sets import start_battle_pkmn_sets
 import constants
 from config import FoulPlayConfig
 from fp.battle import LastUsedMove, Pokemon
-from fp.battle_bots.helpers import format_decision
+from fp.battle_bots.helpers import (
+    format_decision,
+    format_decision_from_request_json,
+    get_legal_options,
+)
+from fp.battle_bots.poke_engine_helpers import get_state_hash
 from fp.battle_modifier import async_update_battle
 from fp.helpers import normalize_name
+from fp.search_pool import SearchPool
 
 from fp.websocket_client import PSWebsocketClient
 
@@ -35,22 +45,134 @@ def extract_battle_factory_tier_from_msg(msg):
     return normalize_name(tier_name)
 
 
+class DecisionCache:
+    """
+    The decisions made in a battle, keyed by (battle_tag, rqid, state hash)
+
+    Showdown re-sends a request after a reconnect, an `/undo` or a timer reminder.
+    A request with an rqid and a state that was already searched is answered with
+    the same decision instead of searching again.
+    """
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self.decisions: OrderedDict[tuple, tuple[str, list[str]]] = OrderedDict()
+
+    @staticmethod
+    def get_key(battle) -> Optional[tuple]:
+        if battle.rqid is None:
+            return None
+
+        state_string = json.dumps(
+            [battle.request_json, battle.team_preview, battle.turn], sort_keys=True
+        )
+        return battle.battle_tag, battle.rqid, get_state_hash(state_string)
+
+    def get(self, key: Optional[tuple]) -> Optional[tuple[str, list[str]]]:
+        if key is None or key not in self.decisions:
+            return None
+        self.decisions.move_to_end(key)
+        return self.decisions[key]
+
+    def put(self, key: Optional[tuple], best_move: str, decision: list[str]):
+        if key is None:
+            return
+        self.decisions[key] = (best_move, decision)
+        self.decisions.move_to_end(key)
+        while len(self.decisions) > self.max_entries:
+            self.decisions.popitem(last=False)
+
+
+_decision_caches: dict[str, DecisionCache] = {}
+
+
+def get_decision_cache(battle_tag: str) -> DecisionCache:
+    if battle_tag not in _decision_caches:
+        _decision_caches[battle_tag] = DecisionCache()
+    return _decision_caches[battle_tag]
+
+
+def end_decision_cache(battle_tag: str):
+    _decision_caches.pop(battle_tag, None)
+
+
+# how long each request took to answer, from the request arriving to the decision being sent
+# only the most recent decisions are kept so a long running bot does not grow it forever
+MAX_DECISION_LATENCIES = 10000
+decision_latencies_ms: deque[float] = deque(maxlen=MAX_DECISION_LATENCIES)
+
+
+# the global scheduler for searches when several battles are played at once
+# searches run one at a time so each one gets every core of the search pool,
+# and battles waiting for a search are served in the order they asked
+_search_lock = asyncio.Lock()
+
+
+async def check_search_pool_health():
+    """
+    Restarts the search pool if its workers stopped answering
+
+    The check is skipped while a search holds the pool because its workers are busy,
+    and it runs off the event loop so the other battles keep being played while it waits
+    """
+    if _search_lock.locked():
+        return
+    async with _search_lock:
+        await asyncio.get_running_loop().run_in_executor(
+            None, SearchPool.ensure_healthy
+        )
+
+
 async def async_pick_move(battle):
-    battle_copy = deepcopy(battle)
+    decision_cache = get_decision_cache(battle.battle_tag)
+    cache_key = decision_cache.get_key(battle)
+    cached_decision = decision_cache.get(cache_key)
+    if cached_decision is not None:
+        best_move, decision = cached_decision
+        logger.info(
+            "Request {} was already answered, re-sending: {}".format(
+                battle.rqid, best_move
+            )
+        )
+        battle.user.last_selected_move = LastUsedMove(
+            battle.user.active.name, best_move.removesuffix("-tera"), battle.turn
+        )
+        return decision
+
+    if battle.request_json and not battle.team_preview:
+        legal_options = get_legal_options(battle.request_json)
+        if len(legal_options) == 1:
+            # there is nothing to search, skip copying the battle and preparing the search
+            best_move = legal_options[0]
+            logger.info("Only one option: {}".format(best_move))
+            battle.user.last_selected_move = LastUsedMove(
+                battle.user.active.name, best_move.removesuffix("-tera"), battle.turn
+            )
+            decision = format_decision_from_request_json(battle.request_json, best_move)
+            decision_cache.put(cache_key, best_move, decision)
+            return decision
+
+    battle_copy = battle.snapshot()
     if battle_copy.request_json:
         battle_copy.user.update_from_request_json(battle_copy.request_json)
 
     loop = asyncio.get_event_loop()
-    with concurrent.futures.ThreadPoolExecutor() as pool:
-        best_move = await loop.run_in_executor(pool, battle_copy.find_best_move)
+    async with _search_lock:
+        with concurrent.futures.ThreadPoolExecutor() as pool:
+            # the search sees the sets of this battle through a copy of its context
+            best_move = await loop.run_in_executor(
+                pool, contextvars.copy_context().run, battle_copy.find_best_move
+            )
     battle.user.last_selected_move = LastUsedMove(
         battle.user.active.name, best_move.removesuffix("-tera"), battle.turn
     )
-    return format_decision(battle_copy, best_move)
+    decision = format_decision(battle_copy, best_move)
+    decision_cache.put(cache_key, best_move, decision)
+    return decision
 
 
 async def handle_team_preview(battle, ps_websocket_client):
-    battle_copy = deepcopy(battle)
+    battle_copy = battle.snapshot()
     battle_copy.user.active = Pokemon.get_dummy()
     battle_copy.opponent.active = Pokemon.get_dummy()
     battle_copy.team_preview = True
@@ -77,28 +199,22 @@ async def handle_team_preview(battle, ps_websocket_client):
     await ps_websocket_client.send_message(battle.battle_tag, message)
 
 
-async def get_battle_tag_and_opponent(ps_websocket_client: PSWebsocketClient):
-    while True:
-        msg = await ps_websocket_client.receive_message()
-        split_msg = msg.split("|")
-        first_msg = split_msg[0]
-        if "battle" in first_msg:
-            battle_tag = first_msg.replace(">", "").strip()
-            user_name = split_msg[-1].replace("☆", "").strip()
-            opponent_name = (
-                split_msg[4].replace(user_name, "").replace("vs.", "").strip()
-            )
-            return battle_tag, opponent_name
+async def get_opponent_name(ps_websocket_client: PSWebsocketClient, battle_tag):
+    # the first message of a battle room is its init message, which has the title of the battle
+    msg = await ps_websocket_client.receive_room_message(battle_tag)
+    split_msg = msg.split("|")
+    user_name = split_msg[-1].replace("☆", "").strip()
+    return split_msg[4].replace(user_name, "").replace("vs.", "").strip()
 
 
 async def initialize_battle_with_tag(
-    ps_websocket_client: PSWebsocketClient, set_request_json=True
+    ps_websocket_client: PSWebsocketClient, battle_tag, set_request_json=True
 ):
     battle_module = importlib.import_module(
         "fp.battle_bots.{}.main".format(FoulPlayConfig.battle_bot_module)
     )
 
-    battle_tag, opponent_name = await get_battle_tag_and_opponent(ps_websocket_client)
+    opponent_name = await get_opponent_name(ps_websocket_client, battle_tag)
 
     if FoulPlayConfig.log_to_file:
         FoulPlayConfig.file_log_handler.do_rollover(
@@ -106,7 +222,7 @@ async def initialize_battle_with_tag(
         )
 
     while True:
-        msg = await ps_websocket_client.receive_message()
+        msg = await ps_websocket_client.receive_room_message(battle_tag)
         split_msg = msg.split("|")
         if split_msg[1].strip() == "request" and split_msg[2].strip():
             user_json = json.loads(split_msg[2].strip("'"))
@@ -128,7 +244,7 @@ async def read_messages_until_first_pokemon_is_seen(
     # keep reading messages until the opponent's first pokemon is seen
     # this is run when starting non team-preview battles
     while True:
-        msg = await ps_websocket_client.receive_message()
+        msg = await ps_websocket_client.receive_room_message(battle.battle_tag)
         if constants.START_STRING in msg:
             split_msg = msg.split(constants.START_STRING)[-1].split("\n")
             for line in split_msg:
@@ -144,10 +260,10 @@ async def read_messages_until_first_pokemon_is_seen(
 
 
 async def start_random_battle(
-    ps_websocket_client: PSWebsocketClient, pokemon_battle_type
+    ps_websocket_client: PSWebsocketClient, pokemon_battle_type, battle_tag
 ):
     battle, opponent_id, user_json = await initialize_battle_with_tag(
-        ps_websocket_client
+        ps_websocket_client, battle_tag
     )
     battle.battle_type = constants.RANDOM_BATTLE
     battle.generation = pokemon_battle_type[:4]
@@ -165,10 +281,10 @@ async def start_random_battle(
 
 
 async def start_standard_battle(
-    ps_websocket_client: PSWebsocketClient, pokemon_battle_type
+    ps_websocket_client: PSWebsocketClient, pokemon_battle_type, battle_tag
 ):
     battle, opponent_id, user_json = await initialize_battle_with_tag(
-        ps_websocket_client, set_request_json=False
+        ps_websocket_client, battle_tag, set_request_json=False
     )
     if "battlefactory" in pokemon_battle_type:
         battle.battle_type = constants.BATTLE_FACTORY
@@ -194,7 +310,7 @@ async def start_standard_battle(
     else:
         msg = ""
         while constants.START_TEAM_PREVIEW not in msg:
-            msg = await ps_websocket_client.receive_message()
+            msg = await ps_websocket_client.receive_room_message(battle_tag)
 
         preview_string_lines = msg.split(constants.START_TEAM_PREVIEW)[-1].split("\n")
 
@@ -234,11 +350,15 @@ async def start_standard_battle(
     return battle
 
 
-async def start_battle(ps_websocket_client, pokemon_battle_type):
+async def start_battle(ps_websocket_client, pokemon_battle_type, battle_tag):
     if "random" in pokemon_battle_type:
-        battle = await start_random_battle(ps_websocket_client, pokemon_battle_type)
+        battle = await start_random_battle(
+            ps_websocket_client, pokemon_battle_type, battle_tag
+        )
     else:
-        battle = await start_standard_battle(ps_websocket_client, pokemon_battle_type)
+        battle = await start_standard_battle(
+            ps_websocket_client, pokemon_battle_type, battle_tag
+        )
 
     await ps_websocket_client.send_message(battle.battle_tag, ["hf"])
     await ps_websocket_client.send_message(battle.battle_tag, ["/timer on"])
@@ -246,10 +366,11 @@ async def start_battle(ps_websocket_client, pokemon_battle_type):
     return battle
 
 
-async def pokemon_battle(ps_websocket_client, pokemon_battle_type):
-    battle = await start_battle(ps_websocket_client, pokemon_battle_type)
+async def pokemon_battle(ps_websocket_client, pokemon_battle_type, battle_tag):
+    start_battle_pkmn_sets()
+    battle = await start_battle(ps_websocket_client, pokemon_battle_type, battle_tag)
     while True:
-        msg = await ps_websocket_client.receive_message()
+        msg = await ps_websocket_client.receive_room_message(battle_tag)
         if battle_is_finished(battle.battle_tag, msg):
             if constants.WIN_STRING in msg:
                 winner = msg.split(constants.WIN_STRING)[-1].split("\n")[0].strip()
@@ -264,5 +385,7 @@ async def pokemon_battle(ps_websocket_client, pokemon_battle_type):
         else:
             action_required = await async_update_battle(battle, msg)
             if action_required and not battle.wait:
+                start_time = time.time()
                 best_move = await async_pick_move(battle)
                 await ps_websocket_client.send_message(battle.battle_tag, best_move)
+                decision_latencies_ms.append((time.time() - start_time) * 1000)
@@ -0,0 +1,272 @@
+import importlib
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# channel ids share this many stop flags, so only this many channels
+# can be open at once without one of them seeing another's flag
+MAX_OPEN_CHANNELS = 256
+
+# set in each worker by `_initialize_worker`
+_message_queue: Optional[multiprocessing.Queue] = None
+_stop_flags = None
+
+
+def _initialize_worker(
+    preload_modules: tuple[str, ...], message_queue: multiprocessing.Queue, stop_flags
+):
+    global _message_queue, _stop_flags
+    _message_queue = message_queue
+    _stop_flags = stop_flags
+
+    # Import the engine and the data files once when the worker starts
+    # so that individual searches don't pay for it
+    for module_name in preload_modules:
+        importlib.import_module(module_name)
+
+
+def publish(channel_id: int, message):
+    """
+    Send `message` from inside a worker to the channel opened with `SearchPool.open_channel`
+    This lets a job stream partial results back before it returns
+    """
+    _message_queue.put((channel_id, message))
+
+
+def channel_closed(channel_id: int) -> bool:
+    """
+    Checked from inside a worker: True once the channel has been closed by the process that opened it
+    A job streaming to a closed channel should stop, nobody is listening to its results anymore
+    """
+    return bool(_stop_flags[channel_id % MAX_OPEN_CHANNELS])
+
+
+class SharedStrings:
+    """
+    A list of strings written once into a shared memory block
+
+    Jobs are sent the block's name and the (offset, length) of the strings they need
+    instead of pickling the strings into every job. The creator must call `close()`
+    """
+
+    def __init__(self, strings: list[str]):
+        encoded = [s.encode() for s in strings]
+        self.shared_memory = SharedMemory(
+            create=True, size=max(sum(len(e) for e in encoded), 1)
+        )
+        self.locations: list[tuple[int, int]] = []
+        offset = 0
+        for e in encoded:
+            self.shared_memory.buf[offset : offset + len(e)] = e
+            self.locations.append((offset, len(e)))
+            offset += len(e)
+
+    @property
+    def name(self) -> str:
+        return self.shared_memory.name
+
+    def close(self):
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+
+
+def _attach_shared_memory(name: str) -> SharedMemory:
+    # only the process that created the block unlinks it, so attaching must not track it
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+    # before 3.13 attaching always registers the block with the resource tracker
+    # the workers share the tracker of the process that created the block (see `_create_executor`)
+    # where the block is already registered, and it is unregistered there when the block is unlinked
+    return SharedMemory(name=name)
+
+
+def read_shared_strings(name: str, locations: list[tuple[int, int]]) -> list[str]:
+    """Read strings out of a `SharedStrings` block from inside a job"""
+    shared_memory = _attach_shared_memory(name)
+    try:
+        return [
+            bytes(shared_memory.buf[offset : offset + length]).decode()
+            for offset, length in locations
+        ]
+    finally:
+        shared_memory.close()
+
+
+def _dispatch_messages(message_queue: multiprocessing.Queue, channels: dict, lock):
+    while True:
+        item = message_queue.get()
+        if item is None:
+            return
+        channel_id, message = item
+        with lock:
+            channel = channels.get(channel_id)
+        # messages for a channel that was already closed are dropped
+        if channel is not None:
+            channel.put(message)
+
+
+def _ping():
+    return os.getpid()
+
+
+class _SearchPool:
+    """
+    A long-lived pool of worker processes that every battle submits its searches to
+
+    The pool is created once at startup so that a search does not pay for
+    spawning processes and importing the engine/data on every decision.
+    If a worker dies the pool is replaced and the job is re-submitted.
+    """
+
+    def __init__(self):
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.max_workers = 1
+        self.preload_modules: tuple[str, ...] = ()
+        self.lock = threading.Lock()
+
+        self.message_queue: Optional[multiprocessing.Queue] = None
+        self.stop_flags = None
+        self.dispatcher: Optional[threading.Thread] = None
+        self.channels: dict[int, queue.Queue] = {}
+        self.channels_lock = threading.Lock()
+        self.channel_ids = itertools.count()
+
+    def start(self, max_workers: int, preload_modules: tuple[str, ...] = ()):
+        with self.lock:
+            self.max_workers = max_workers
+            self.preload_modules = tuple(preload_modules)
+            if self.executor is None:
+                self._create_executor()
+
+    def _create_executor(self):
+        logger.info("Starting search pool with {} workers".format(self.max_workers))
+        self._stop_dispatcher()
+        self.message_queue = multiprocessing.Queue()
+        with self.channels_lock:
+            self.stop_flags = multiprocessing.Array("b", MAX_OPEN_CHANNELS, lock=False)
+        self.dispatcher = threading.Thread(
+            target=_dispatch_messages,
+            args=(self.message_queue, self.channels, self.channels_lock),
+            daemon=True,
+        )
+        self.dispatcher.start()
+
+        # workers started before this process's resource tracker would each start their own tracker,
+        # which would collect every shared memory block they attach to and warn about them as leaked on exit
+        resource_tracker.ensure_running()
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=_initialize_worker,
+            initargs=(self.preload_modules, self.message_queue, self.stop_flags),
+        )
+
+        # workers are spawned lazily, make sure they exist before the first search
+        for fut in [self.executor.submit(_ping) for _ in range(self.max_workers)]:
+            fut.result()
+
+    def _stop_dispatcher(self):
+        if self.dispatcher is not None:
+            self.message_queue.put(None)
+            self.dispatcher.join()
+            self.message_queue.close()
+            self.dispatcher = None
+            self.message_queue = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                self._create_executor()
+            return self.executor
+
+    def restart(self, broken_executor: Optional[ProcessPoolExecutor] = None):
+        """
+        Replace the current executor with a new one
+
+        If `broken_executor` is given the pool is only replaced if it is still the current executor.
+        This allows multiple battles to notice the same crash without restarting the pool more than once
+        """
+        with self.lock:
+            if broken_executor is not None and broken_executor is not self.executor:
+                return
+            if self.executor is not None:
+                logger.warning("Restarting search pool")
+                self.executor.shutdown(wait=False, cancel_futures=True)
+            self._create_executor()
+
+    def submit(self, fn, *args) -> Future:
+        executor = self._get_executor()
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            logger.warning("Search pool is broken, restarting it")
+            self.restart(executor)
+            return self._get_executor().submit(fn, *args)
+
+    def run(self, fn, args_list: list[tuple]) -> list:
+        """
+        Run `fn` once for each set of args and return the results in order
+
+        The jobs are re-submitted once if the pool breaks while they are running
+        """
+        executor = self._get_executor()
+        futures = [self.submit(fn, *args) for args in args_list]
+        try:
+            return [fut.result() for fut in futures]
+        except BrokenProcessPool:
+            logger.warning("Search pool broke during a search, retrying")
+            self.restart(executor)
+            futures = [self.submit(fn, *args) for args in args_list]
+            return [fut.result() for fut in futures]
+
+    def open_channel(self) -> tuple[int, queue.Queue]:
+        """
+        Returns a channel id that jobs can `publish` to and the queue their messages arrive on
+        Messages arrive in the order each worker sent them
+        """
+        self._get_executor()
+        channel_id = next(self.channel_ids)
+        channel = queue.Queue()
+        with self.channels_lock:
+            self.channels[channel_id] = channel
+            self.stop_flags[channel_id % MAX_OPEN_CHANNELS] = 0
+        return channel_id, channel
+
+    def close_channel(self, channel_id: int):
+        """Stop listening to a channel and tell the jobs publishing to it to stop"""
+        with self.channels_lock:
+            self.channels.pop(channel_id, None)
+            if self.stop_flags is not None:
+                self.stop_flags[channel_id % MAX_OPEN_CHANNELS] = 1
+
+    def is_healthy(self, timeout: float = 5.0) -> bool:
+        try:
+            self._get_executor().submit(_ping).result(timeout=timeout)
+            return True
+        except Exception as e:
+            logger.warning("Search pool health check failed: {}".format(repr(e)))
+            return False
+
+    def ensure_healthy(self, timeout: float = 5.0):
+        if not self.is_healthy(timeout=timeout):
+            self.restart()
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True, cancel_futures=True)
+                self.executor = None
+            self._stop_dispatcher()
+
+
+SearchPool = _SearchPool()
@@ -1,8 +1,10 @@
 import asyncio
+import functools
 import websockets
 import requests
 import json
 import time
+from typing import Optional
 
 import logging
 
@@ -17,6 +19,85 @@ class SaveReplayError(Exception):
     pass
 
 
+class ConnectionLostError(Exception):
+    pass
+
+
+DEFAULT_LOGIN_URI = "https://play.pokemonshowdown.com/api/login"
+
+# global messages that nothing is waiting for are dropped after this many arrive
+MAX_GLOBAL_MESSAGES = 256
+
+# how long the server has to confirm a login with `|updateuser|`
+LOGIN_CONFIRMATION_TIMEOUT_S = 15
+
+# the wait before the first attempt to reconnect, doubled after every failed attempt
+RECONNECT_BACKOFF_S = 1
+
+# lines that are not part of the battle itself and may differ between
+# what was received live and the log that is sent when a room is rejoined
+NON_BATTLE_LINE_PREFIXES = (
+    "|request|",
+    "|t:|",
+    "|j|",
+    "|J|",
+    "|l|",
+    "|L|",
+    "|n|",
+    "|N|",
+    "|c|",
+    "|c:|",
+    "|raw|",
+    "|inactive|",
+    "|inactiveoff|",
+)
+
+
+def normalize_username(username: str) -> str:
+    # the server prefixes usernames with a rank symbol and `@!` for away or busy users
+    return "".join(c for c in username.lower() if c.isalnum())
+
+
+def get_room(msg: str) -> str:
+    # messages for a room start with `>room-id` on their first line
+    # messages without it are global (challstr, pms, updateuser, etc.)
+    if not msg.startswith(">"):
+        return ""
+    return msg.split("\n", 1)[0][1:].strip()
+
+
+def _is_battle_line(line: str) -> bool:
+    return line.startswith("|") and not line.startswith(NON_BATTLE_LINE_PREFIXES)
+
+
+def get_unseen_lines(seen_lines: list[str], log_lines: list[str]) -> list[str]:
+    """
+    The lines of a rejoined battle's log that were not received before the connection was lost
+
+    The log is the whole battle so far, so it starts with the lines that were already seen.
+    Lines that are not part of the battle are skipped on both sides while matching them up.
+    If the log differs from the seen lines, as many lines as were seen are still dropped from it
+    because they were already applied to the battle
+    """
+    seen_lines = [line for line in seen_lines if _is_battle_line(line)]
+    log_lines = [line for line in log_lines if _is_battle_line(line)]
+
+    num_matching = 0
+    while (
+        num_matching < min(len(seen_lines), len(log_lines))
+        and seen_lines[num_matching] == log_lines[num_matching]
+    ):
+        num_matching += 1
+
+    if num_matching < len(seen_lines):
+        logger.warning(
+            "Rejoined log differs from the lines seen after line {}".format(
+                num_matching
+            )
+        )
+    return log_lines[len(seen_lines) :]
+
+
 class PSWebsocketClient:
     websocket = None
     address = None
@@ -26,34 +107,208 @@ class PSWebsocketClient:
     last_message = None
     last_challenge_time = 0
 
+    def __init__(self, reconnect_attempts=0):
+        # a background task reads every message from the websocket once and puts it on the queue
+        # of the battle room it is for. Global messages go on their own queue
+        self.rooms: dict[str, asyncio.Queue] = {}
+        self.global_messages = asyncio.Queue(maxsize=MAX_GLOBAL_MESSAGES)
+        self.new_battles = asyncio.Queue()
+        self.reader = None
+        self.http_session = requests.Session()
+
+        # the lines received in each battle room, used to find what was missed while disconnected
+        self.room_logs: dict[str, list[str]] = {}
+        self.reconnect_attempts = reconnect_attempts
+        self.connected = asyncio.Event()
+        self.closing = False
+
     @classmethod
-    async def create(cls, username, password, address):
-        self = PSWebsocketClient()
+    async def create(
+        cls,
+        username,
+        password,
+        address,
+        reconnect_attempts=0,
+        login_uri=DEFAULT_LOGIN_URI,
+    ):
+        self = PSWebsocketClient(reconnect_attempts=reconnect_attempts)
         self.username = username
         self.password = password
         self.address = address
         self.websocket = await websockets.connect(self.address)
-        self.login_uri = "https://play.pokemonshowdown.com/api/login"
+        self.connected.set()
+        self.login_uri = login_uri
+        self.reader = asyncio.create_task(self._read_messages())
         return self
 
+    def route_message(self, msg: str):
+        room = get_room(msg)
+        if not room:
+            if self.global_messages.full():
+                self.global_messages.get_nowait()
+            self.global_messages.put_nowait(msg)
+            return
+
+        if room not in self.rooms:
+            # only battle rooms get a queue, the messages of chat rooms are not read by anything
+            if not room.startswith("battle-") or "|init|battle" not in msg:
+                logger.debug(
+                    "Dropping message for room without a queue: {}".format(room)
+                )
+                return
+            self.rooms[room] = asyncio.Queue()
+            self.room_logs[room] = []
+            self.new_battles.put_nowait(room)
+
+        elif "|init|battle" in msg:
+            # the room was rejoined after reconnecting and the server sent the whole battle again
+            unseen_lines = get_unseen_lines(self.room_logs[room], msg.split("\n")[1:])
+            logger.info(
+                "Rejoined {}, {} lines were missed".format(room, len(unseen_lines))
+            )
+            if not unseen_lines:
+                return
+            msg = "\n".join([">{}".format(room)] + unseen_lines)
+
+        elif "|noinit|" in msg:
+            # the room could not be rejoined, the battle is over or the server restarted
+            # it is dropped so that it is not joined again on the next reconnect
+            logger.error("Could not rejoin {}: {}".format(room, msg))
+            self.room_logs.pop(room, None)
+            self.rooms.pop(room).put_nowait(None)
+            return
+
+        self.room_logs[room].extend(msg.split("\n")[1:])
+        self.rooms[room].put_nowait(msg)
+
+    async def _read_socket(self):
+        # returns when the connection is closed
+        try:
+            async for message in self.websocket:
+                logger.debug("Received message from websocket: {}".format(message))
+                self.route_message(message)
+        except websockets.ConnectionClosed as e:
+            if not self.closing:
+                logger.error("Websocket connection lost: {}".format(repr(e)))
+
+    async def _read_messages(self):
+        try:
+            await self._read_socket()
+            while not self.closing and self.reconnect_attempts:
+                socket_reader = await self._reconnect()
+                if socket_reader is None:
+                    return
+                await socket_reader
+            logger.info("Websocket connection closed")
+        finally:
+            self.closing = True
+            self.connected.set()
+
+            # wake up everything that is waiting for a message
+            for messages in [self.global_messages, self.new_battles] + list(
+                self.rooms.values()
+            ):
+                if messages.full():
+                    messages.get_nowait()
+                messages.put_nowait(None)
+
+    async def _reconnect(self) -> Optional[asyncio.Task]:
+        """
+        Connects and logs in again, then rejoins every battle room that was open
+
+        Returns the task reading the new connection, or None if every attempt failed
+        """
+        self.connected.clear()
+        for attempt in range(self.reconnect_attempts):
+            delay = RECONNECT_BACKOFF_S * 2**attempt
+            logger.warning(
+                "Reconnecting in {}s, attempt {}/{}".format(
+                    delay, attempt + 1, self.reconnect_attempts
+                )
+            )
+            await asyncio.sleep(delay)
+
+            socket_reader = None
+            try:
+                self.websocket = await websockets.connect(self.address)
+                socket_reader = asyncio.create_task(self._read_socket())
+
+                # anything left from the old connection must not be mistaken for the new login
+                while not self.global_messages.empty():
+                    self.global_messages.get_nowait()
+                await self.login()
+
+                for room in self.rooms:
+                    await self._send("|/join {}".format(room))
+            except (OSError, websockets.WebSocketException, LoginError) as e:
+                logger.error("Could not reconnect: {}".format(repr(e)))
+                if socket_reader is not None:
+                    socket_reader.cancel()
+                continue
+
+            logger.info("Reconnected, rejoined {} battles".format(len(self.rooms)))
+            self.connected.set()
+            return socket_reader
+
+        logger.error("Giving up on reconnecting")
+        return None
+
+    @staticmethod
+    async def _receive(messages: asyncio.Queue):
+        msg = await messages.get()
+        if msg is None:
+            # leave the marker for the next reader of this queue
+            messages.put_nowait(None)
+            raise ConnectionLostError("The websocket connection was lost")
+        return msg
+
     async def join_room(self, room_name):
         message = "/join {}".format(room_name)
         await self.send_message("", [message])
         logger.debug("Joined room '{}'".format(room_name))
 
     async def receive_message(self):
-        message = await self.websocket.recv()
-        logger.debug("Received message from websocket: {}".format(message))
-        return message
+        """Returns the next message that is not for a battle room"""
+        return await self._receive(self.global_messages)
 
-    async def send_message(self, room, message_list):
-        message = room + "|" + "|".join(message_list)
+    async def receive_room_message(self, room):
+        if room not in self.rooms:
+            raise ConnectionLostError("The room {} was lost".format(room))
+        return await self._receive(self.rooms[room])
+
+    async def wait_for_new_battle(self) -> str:
+        """Returns the battle tag of the next battle room that is opened"""
+        return await self._receive(self.new_battles)
+
+    async def _send(self, message):
         logger.debug("Sending message to websocket: {}".format(message))
         await self.websocket.send(message)
         self.last_message = message
 
+    async def send_message(self, room, message_list):
+        message = room + "|" + "|".join(message_list)
+        while True:
+            # while reconnecting, messages are held until the connection is back
+            await self.connected.wait()
+            try:
+                await self._send(message)
+                return
+            except websockets.ConnectionClosed:
+                if self.closing or not self.reconnect_attempts:
+                    raise ConnectionLostError("The websocket connection was lost")
+                logger.warning(
+                    "Connection lost while sending, resending after reconnecting: {}".format(
+                        message
+                    )
+                )
+                self.connected.clear()
+
     async def close(self):
+        self.closing = True
         await self.websocket.close()
+        self.http_session.close()
+        if self.reader is not None:
+            await self.reader
 
     async def get_id_and_challstr(self):
         while True:
@@ -62,11 +317,33 @@ class PSWebsocketClient:
             if split_message[1] == "challstr":
                 return split_message[2], split_message[3]
 
+    async def _post(self, url, data):
+        # requests blocks, so the request is made off of the event loop
+        # the session keeps the connection to the login server alive between logins
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.http_session.post, url, data=data)
+        )
+
+    async def wait_for_login_confirmation(self):
+        # `|updateuser|` is sent with `named` set to 1 once the server accepted the assertion
+        while True:
+            message = await self.receive_message()
+            split_message = message.split("|")
+            if (
+                len(split_message) >= 4
+                and split_message[1] == "updateuser"
+                and split_message[3] == "1"
+                and normalize_username(split_message[2])
+                == normalize_username(self.username)
+            ):
+                return
+
     async def login(self):
         logger.info("Logging in...")
         client_id, challstr = await self.get_id_and_challstr()
         if self.password:
-            response = requests.post(
+            response = await self._post(
                 self.login_uri,
                 data={
                     "name": self.username,
@@ -76,7 +353,7 @@ class PSWebsocketClient:
             )
 
         else:
-            response = requests.post(
+            response = await self._post(
                 self.login_uri,
                 data={
                     "act": "getassertion",
@@ -96,10 +373,19 @@ class PSWebsocketClient:
             else:
                 assertion = response.text
 
-            message = ["/trn " + self.username + ",0," + assertion]
+            # sent directly, `send_message` waits for the connection to be logged in when reconnecting
+            await self._send("|/trn " + self.username + ",0," + assertion)
+            try:
+                await asyncio.wait_for(
+                    self.wait_for_login_confirmation(), LOGIN_CONFIRMATION_TIMEOUT_S
+                )
+            except asyncio.TimeoutError:
+                raise LoginError(
+                    "The server did not confirm the login within {}s".format(
+                        LOGIN_CONFIRMATION_TIMEOUT_S
+                    )
+                )
             logger.info("Successfully logged in")
-            await self.send_message("", message)
-            await asyncio.sleep(3)
         else:
             logger.error("Could not log-in\nDetails:\n{}".format(response.content))
             raise LoginError("Could not log-in")
@@ -160,8 +446,10 @@ class PSWebsocketClient:
         await self.send_message("", message)
 
         while True:
-            msg = await self.receive_message()
-            if battle_tag in msg and "deinit" in msg:
+            msg = await self.receive_room_message(battle_tag)
+            if "deinit" in msg:
+                self.rooms.pop(battle_tag, None)
+                self.room_logs.pop(battle_tag, None)
                 return
 
     async def save_replay(self, battle_tag):
@@ -8,8 +8,15 @@ import constants
 from config import FoulPlayConfig, init_logging
 
 from teams import load_team
-from fp.run_battle import pokemon_battle
-from fp.websocket_client import PSWebsocketClient
+from fp.battle_bots.poke_engine_helpers import end_search_session
+from fp.run_battle import (
+    check_search_pool_health,
+    decision_latencies_ms,
+    end_decision_cache,
+    pokemon_battle,
+)
+from fp.search_pool import SearchPool
+from fp.websocket_client import ConnectionLostError, PSWebsocketClient
 
 from data import all_move_json
 from data import pokedex
@@ -43,6 +50,94 @@ def check_dictionaries_are_unmodified(original_pokedex, original_move_json):
         logger.debug("Pokedex JSON unmodified!")
 
 
+def write_results(wins, losses):
+    # read by `supervisor.py` to report on every bot process it started
+    with open(FoulPlayConfig.results_file, "w") as f:
+        json.dump(
+            {
+                "username": FoulPlayConfig.username,
+                "wins": wins,
+                "losses": losses,
+                "decision_latencies_ms": list(decision_latencies_ms),
+            },
+            f,
+        )
+
+
+async def find_match(ps_websocket_client: PSWebsocketClient):
+    team = load_team(FoulPlayConfig.team)
+    if FoulPlayConfig.bot_mode == constants.CHALLENGE_USER:
+        await ps_websocket_client.challenge_user(
+            FoulPlayConfig.user_to_challenge, FoulPlayConfig.pokemon_mode, team
+        )
+    elif FoulPlayConfig.bot_mode == constants.ACCEPT_CHALLENGE:
+        await ps_websocket_client.accept_challenge(
+            FoulPlayConfig.pokemon_mode, team, FoulPlayConfig.room_name
+        )
+    elif FoulPlayConfig.bot_mode == constants.SEARCH_LADDER:
+        await ps_websocket_client.search_for_match(FoulPlayConfig.pokemon_mode, team)
+    else:
+        raise ValueError("Invalid Bot Mode: {}".format(FoulPlayConfig.bot_mode))
+
+
+async def pokemon_battle_in_room(ps_websocket_client: PSWebsocketClient, battle_tag):
+    try:
+        return await pokemon_battle(
+            ps_websocket_client, FoulPlayConfig.pokemon_mode, battle_tag
+        )
+    except ConnectionLostError:
+        if ps_websocket_client.closing:
+            raise
+        # the connection came back but this battle could not be rejoined
+        logger.error("Lost {}".format(battle_tag))
+        return None
+    finally:
+        end_search_session(battle_tag)
+        end_decision_cache(battle_tag)
+
+
+async def play_battle(ps_websocket_client: PSWebsocketClient):
+    # the battle room is opened by the server once a match is found
+    await find_match(ps_websocket_client)
+    battle_tag = await ps_websocket_client.wait_for_new_battle()
+    return battle_tag, asyncio.create_task(
+        pokemon_battle_in_room(ps_websocket_client, battle_tag)
+    )
+
+
+async def run_battles(ps_websocket_client: PSWebsocketClient, on_battle_finished):
+    for _ in range(FoulPlayConfig.run_count):
+        _, battle = await play_battle(ps_websocket_client)
+        await on_battle_finished(await battle)
+
+
+async def run_concurrent_battles(
+    ps_websocket_client: PSWebsocketClient, on_battle_finished
+):
+    # keeps `BATTLE_CONCURRENCY` battles in flight over one connection
+    # a new match is looked for as soon as a battle finishes
+    battle_slots = asyncio.Semaphore(FoulPlayConfig.concurrent_battles)
+
+    async def finish(battle):
+        try:
+            await on_battle_finished(await battle)
+        finally:
+            battle_slots.release()
+
+    battles = []
+    for _ in range(FoulPlayConfig.run_count):
+        await battle_slots.acquire()
+        battle_tag, battle = await play_battle(ps_websocket_client)
+        logger.info(
+            "Started {}, {} battles in progress".format(
+                battle_tag, len(ps_websocket_client.rooms)
+            )
+        )
+        battles.append(asyncio.create_task(finish(battle)))
+
+    await asyncio.gather(*battles)
+
+
 async def run_foul_play():
     FoulPlayConfig.configure()
     init_logging(FoulPlayConfig.log_level, FoulPlayConfig.log_to_file)
@@ -51,44 +146,46 @@ async def run_foul_play():
     original_pokedex = deepcopy(pokedex)
     original_move_json = deepcopy(all_move_json)
 
+    # start the search workers after the mods are applied so every worker sees the modified data
+    SearchPool.start(
+        FoulPlayConfig.parallelism,
+        preload_modules=(
+            "fp.battle_bots.{}.main".format(FoulPlayConfig.battle_bot_module),
+        ),
+    )
+
     ps_websocket_client = await PSWebsocketClient.create(
-        FoulPlayConfig.username, FoulPlayConfig.password, FoulPlayConfig.websocket_uri
+        FoulPlayConfig.username,
+        FoulPlayConfig.password,
+        FoulPlayConfig.websocket_uri,
+        reconnect_attempts=FoulPlayConfig.reconnect_attempts,
+        login_uri=FoulPlayConfig.login_uri,
     )
     await ps_websocket_client.login()
 
-    battles_run = 0
     wins = 0
     losses = 0
-    while True:
-        team = load_team(FoulPlayConfig.team)
-        if FoulPlayConfig.bot_mode == constants.CHALLENGE_USER:
-            await ps_websocket_client.challenge_user(
-                FoulPlayConfig.user_to_challenge, FoulPlayConfig.pokemon_mode, team
-            )
-        elif FoulPlayConfig.bot_mode == constants.ACCEPT_CHALLENGE:
-            await ps_websocket_client.accept_challenge(
-                FoulPlayConfig.pokemon_mode, team, FoulPlayConfig.room_name
-            )
-        elif FoulPlayConfig.bot_mode == constants.SEARCH_LADDER:
-            await ps_websocket_client.search_for_match(
-                FoulPlayConfig.pokemon_mode, team
-            )
-        else:
-            raise ValueError("Invalid Bot Mode: {}".format(FoulPlayConfig.bot_mode))
 
-        winner = await pokemon_battle(ps_websocket_client, FoulPlayConfig.pokemon_mode)
+    async def on_battle_finished(winner):
+        nonlocal wins, losses
         if winner == FoulPlayConfig.username:
             wins += 1
         else:
             losses += 1
 
         logger.info("W: {}\tL: {}".format(wins, losses))
+        if FoulPlayConfig.results_file:
+            write_results(wins, losses)
         check_dictionaries_are_unmodified(original_pokedex, original_move_json)
+        await check_search_pool_health()
+
+    if FoulPlayConfig.concurrent_battles > 1:
+        await run_concurrent_battles(ps_websocket_client, on_battle_finished)
+    else:
+        await run_battles(ps_websocket_client, on_battle_finished)
 
-        battles_run += 1
-        if battles_run >= FoulPlayConfig.run_count:
-            break
     await ps_websocket_client.close()
+    SearchPool.shutdown()
 
 
 if __name__ == "__main__":
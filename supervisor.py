@@ -0,0 +1,189 @@
+import functools
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from config import env, init_logging
+from fp.helpers import get_percentile
+
+logger = logging.getLogger(__name__)
+
+SHARD_LOG_DIR = "logs"
+
+
+def parse_accounts(accounts: str) -> list[tuple[str, str]]:
+    # "username:password,username:password", the password can be left out for accounts without one
+    parsed_accounts = []
+    for account in accounts.split(","):
+        if not account.strip():
+            continue
+        username, _, password = account.strip().partition(":")
+        parsed_accounts.append((username, password))
+    return parsed_accounts
+
+
+def get_cpu_slices(num_shards: int, cpus: list[int]) -> list[list[int]]:
+    """
+    Splits the cpus into one contiguous slice per shard
+    Shards share cpus if there are more shards than cpus
+    """
+    if num_shards >= len(cpus):
+        return [[cpus[i % len(cpus)]] for i in range(num_shards)]
+
+    slice_size, extra = divmod(len(cpus), num_shards)
+    slices = []
+    start = 0
+    for i in range(num_shards):
+        end = start + slice_size + (1 if i < extra else 0)
+        slices.append(cpus[start:end])
+        start = end
+    return slices
+
+
+def get_shard_parallelism(configured_parallelism: Optional[str], num_cpus: int) -> int:
+    # each shard searches with at most the cores of its own slice
+    # the env file is already loaded into the environment, so a configured parallelism can only be lowered
+    if configured_parallelism:
+        return max(min(int(configured_parallelism), num_cpus), 1)
+    return num_cpus
+
+
+def get_available_cpus() -> list[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def summarize_results(shard_results: list[dict]) -> list[str]:
+    lines = [
+        "{} {} {} {} {} {} {}".format(
+            "account".ljust(20),
+            "W".rjust(5),
+            "L".rjust(5),
+            "turns".rjust(7),
+            "p50 ms".rjust(8),
+            "p90 ms".rjust(8),
+            "p99 ms".rjust(8),
+        )
+    ]
+    totals = {"username": "total", "wins": 0, "losses": 0, "decision_latencies_ms": []}
+    for result in shard_results + [totals]:
+        if result is not totals:
+            totals["wins"] += result["wins"]
+            totals["losses"] += result["losses"]
+            totals["decision_latencies_ms"] += result["decision_latencies_ms"]
+
+        latencies = result["decision_latencies_ms"]
+        lines.append(
+            "{} {} {} {} {} {} {}".format(
+                result["username"].ljust(20),
+                str(result["wins"]).rjust(5),
+                str(result["losses"]).rjust(5),
+                str(len(latencies)).rjust(7),
+                str(round(get_percentile(latencies, 50))).rjust(8),
+                str(round(get_percentile(latencies, 90))).rjust(8),
+                str(round(get_percentile(latencies, 99))).rjust(8),
+            )
+        )
+
+    num_battles = totals["wins"] + totals["losses"]
+    if num_battles:
+        lines.append(
+            "Win rate: {}% over {} battles".format(
+                round(100 * totals["wins"] / num_battles, 1), num_battles
+            )
+        )
+    return lines
+
+
+def start_shard(
+    index: int, username: str, password: str, cpus: list[int], results_file: str
+) -> subprocess.Popen:
+    shard_env = os.environ.copy()
+    shard_env["PS_USERNAME"] = username
+    shard_env["PS_PASSWORD"] = password
+    shard_env["RESULTS_FILE"] = results_file
+
+    shard_env["MCTS_PARALLELISM"] = str(
+        get_shard_parallelism(shard_env.get("MCTS_PARALLELISM"), len(cpus))
+    )
+
+    os.makedirs(SHARD_LOG_DIR, exist_ok=True)
+    log_file = open(
+        os.path.join(SHARD_LOG_DIR, "shard_{}_{}.log".format(index, username)), "w"
+    )
+
+    logger.info("Starting {} on cpus {}".format(username, cpus))
+    return subprocess.Popen(
+        [sys.executable, "run.py"],
+        env=shard_env,
+        stdout=log_file,
+        stderr=subprocess.STDOUT,
+        # the search workers the shard starts inherit its cpus
+        preexec_fn=(
+            functools.partial(os.sched_setaffinity, 0, cpus)
+            if hasattr(os, "sched_setaffinity")
+            else None
+        ),
+    )
+
+
+def run_supervisor():
+    """
+    Plays on every account in `SHARD_ACCOUNTS` at the same time, one `run.py` process per account
+
+    Every process is pinned to its own slice of the cpus and is configured by the same
+    environment as `run.py`, with the account set per process. The wins, losses, and
+    the latencies of their most recent decisions are reported for each account and in total once all of them finish
+    """
+    init_logging(env("LOG_LEVEL", "INFO"), False)
+    accounts = parse_accounts(env("SHARD_ACCOUNTS"))
+    if not accounts:
+        raise ValueError("SHARD_ACCOUNTS must have at least one account")
+
+    cpu_slices = get_cpu_slices(len(accounts), get_available_cpus())
+    with tempfile.TemporaryDirectory() as results_dir:
+        results_files = [
+            os.path.join(results_dir, "shard_{}.json".format(i))
+            for i in range(len(accounts))
+        ]
+        start_time = time.time()
+        shards = [
+            start_shard(i, username, password, cpus, results_file)
+            for i, ((username, password), cpus, results_file) in enumerate(
+                zip(accounts, cpu_slices, results_files)
+            )
+        ]
+
+        try:
+            for (username, _), shard in zip(accounts, shards):
+                return_code = shard.wait()
+                if return_code != 0:
+                    logger.error("{} exited with code {}".format(username, return_code))
+        except KeyboardInterrupt:
+            logger.info("Stopping every shard")
+            for shard in shards:
+                shard.terminate()
+            for shard in shards:
+                shard.wait()
+
+        shard_results = []
+        for (username, _), results_file in zip(accounts, results_files):
+            if not os.path.exists(results_file):
+                logger.warning("{} did not finish any battles".format(username))
+                continue
+            with open(results_file) as f:
+                shard_results.append(json.load(f))
+
+    logger.info("Ran for {}s".format(round(time.time() - start_time)))
+    for line in summarize_results(shard_results):
+        logger.info(line)
+
+
+if __name__ == "__main__":
+    run_supervisor()
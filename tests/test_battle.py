@@ -1,7 +1,11 @@
 import unittest
 
+import constants
+
 from fp.battle import LastUsedMove
 from fp.battle import Battle
+from fp.battle import Boosts
+from fp.battle import SideConditions
 from fp.battle import Battler
 from fp.battle import Pokemon
 from fp.battle import Move
@@ -163,3 +167,96 @@ class TestBattlerActiveLockedIntoMove(unittest.TestCase):
         self.assertFalse(self.battler.active.get_move("thunderbolt").disabled)
         self.assertFalse(self.battler.active.get_move("agility").disabled)
         self.assertFalse(self.battler.active.get_move("doubleteam").disabled)
+
+
+class TestBattleSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.battle = Battle("battle-gen9ou-1")
+        self.battle.request_json = {"rqid": 1}
+        self.battle.user.active = Pokemon("pikachu", 100)
+        self.battle.user.active.add_move("thunderbolt")
+        self.battle.opponent.active = Pokemon("charizard", 100)
+        self.battle.opponent.reserve = [Pokemon("blastoise", 100)]
+
+    def test_changing_the_snapshot_does_not_change_the_battle(self):
+        snapshot = self.battle.snapshot()
+        snapshot.user.active.moves[0].disabled = True
+        snapshot.user.active.boosts["speed"] = 2
+        snapshot.user.active.stats["speed"] = 1
+        snapshot.user.active.volatile_statuses.append("confusion")
+        snapshot.opponent.active.hidden_power_possibilities.clear()
+        snapshot.opponent.active.impossible_items.add("leftovers")
+        snapshot.opponent.active.set_spread("jolly", "0,252,0,0,4,252")
+        snapshot.opponent.reserve.append(Pokemon("venusaur", 100))
+        snapshot.opponent.reserve[0].item = "leftovers"
+        snapshot.opponent.side_conditions["stealthrock"] = 1
+
+        self.assertFalse(self.battle.user.active.moves[0].disabled)
+        self.assertEqual(0, self.battle.user.active.boosts["speed"])
+        self.assertNotEqual(1, self.battle.user.active.stats["speed"])
+        self.assertEqual([], self.battle.user.active.volatile_statuses)
+        self.assertNotEqual(
+            set(), self.battle.opponent.active.hidden_power_possibilities
+        )
+        self.assertEqual(set(), self.battle.opponent.active.impossible_items)
+        self.assertEqual("serious", self.battle.opponent.active.nature)
+        self.assertEqual(["blastoise"], [p.name for p in self.battle.opponent.reserve])
+        self.assertEqual(constants.UNKNOWN_ITEM, self.battle.opponent.reserve[0].item)
+        self.assertEqual(0, self.battle.opponent.side_conditions["stealthrock"])
+
+    def test_unchanged_data_is_shared(self):
+        snapshot = self.battle.snapshot()
+
+        self.assertIs(self.battle.request_json, snapshot.request_json)
+        self.assertIs(
+            self.battle.opponent.active.base_stats, snapshot.opponent.active.base_stats
+        )
+
+    def test_battle_without_an_active_pokemon(self):
+        self.battle.user.active = None
+
+        self.assertIsNone(self.battle.snapshot().user.active)
+
+
+class TestBoosts(unittest.TestCase):
+    def test_boosts_default_to_0(self):
+        self.assertEqual(0, Boosts()[constants.SPEED])
+
+    def test_missing_boosts_are_equal_to_0(self):
+        boosts = Boosts({constants.SPEED: 1, constants.ATTACK: 0})
+
+        self.assertEqual({constants.SPEED: 1}, boosts)
+        self.assertEqual({constants.SPEED: 1}, dict(boosts))
+        self.assertNotEqual({constants.SPEED: 2}, boosts)
+
+    def test_copy_is_independent(self):
+        boosts = Boosts({constants.SPEED: 1})
+        boosts_copy = boosts.copy()
+        boosts_copy[constants.SPEED] = 2
+
+        self.assertEqual(1, boosts[constants.SPEED])
+
+    def test_pokemon_boosts_can_be_set_from_a_dict(self):
+        pkmn = Pokemon("pikachu", 100)
+        pkmn.boosts = {constants.ATTACK: 2}
+
+        self.assertIsInstance(pkmn.boosts, Boosts)
+        self.assertEqual(2, pkmn.boosts[constants.ATTACK])
+
+
+class TestSideConditions(unittest.TestCase):
+    def test_unknown_side_conditions_are_kept(self):
+        side_conditions = SideConditions()
+        side_conditions["gmaxsteelsurge"] += 1
+        side_conditions[constants.STEALTH_ROCK] += 1
+
+        self.assertEqual(
+            {"gmaxsteelsurge": 1, constants.STEALTH_ROCK: 1}, side_conditions
+        )
+
+    def test_copy_is_independent(self):
+        side_conditions = SideConditions({"gmaxsteelsurge": 1})
+        side_conditions_copy = side_conditions.copy()
+        side_conditions_copy["gmaxsteelsurge"] = 0
+
+        self.assertEqual(1, side_conditions["gmaxsteelsurge"])
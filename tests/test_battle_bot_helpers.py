@@ -0,0 +1,193 @@
+import unittest
+
+import constants
+from data.pkmn_sets import TeamDatasets
+from fp.battle import Battle, Pokemon
+from fp.battle_bots.helpers import (
+    fill_in_battle_factory_unknowns,
+    format_decision_from_request_json,
+    get_legal_options,
+    prepare_sampled_battles,
+)
+
+Battle.__abstractmethods__ = set()
+
+
+def make_pokemon(name, active=False, condition="100/100"):
+    return {
+        "ident": "p1: {}".format(name.capitalize()),
+        "details": "{}, L80".format(name.capitalize()),
+        "condition": condition,
+        "active": active,
+    }
+
+
+def make_move(move_id, disabled=False, pp=10):
+    return {"move": move_id, "id": move_id, "pp": pp, "disabled": disabled}
+
+
+class TestGetLegalOptions(unittest.TestCase):
+    def setUp(self):
+        self.request_json = {
+            "active": [
+                {
+                    "moves": [
+                        make_move("thunderbolt"),
+                        make_move("voltswitch"),
+                    ]
+                }
+            ],
+            "side": {
+                "pokemon": [
+                    make_pokemon("pikachu", active=True),
+                    make_pokemon("charmander"),
+                    make_pokemon("squirtle", condition="0 fnt"),
+                ]
+            },
+            "rqid": 3,
+        }
+
+    def test_moves_and_switches_are_options(self):
+        self.assertEqual(
+            ["thunderbolt", "voltswitch", "switch charmander"],
+            get_legal_options(self.request_json),
+        )
+
+    def test_disabled_moves_are_not_options(self):
+        self.request_json["active"][0]["moves"][0]["disabled"] = True
+        self.request_json["active"][0]["moves"][1]["pp"] = 0
+
+        self.assertEqual(["switch charmander"], get_legal_options(self.request_json))
+
+    def test_trapped_pokemon_cannot_switch(self):
+        self.request_json["active"][0][constants.TRAPPED] = True
+
+        self.assertEqual(
+            ["thunderbolt", "voltswitch"], get_legal_options(self.request_json)
+        )
+
+    def test_locked_move_is_the_only_option(self):
+        self.request_json["active"][0] = {
+            "moves": [make_move("outrage")],
+            constants.TRAPPED: True,
+        }
+
+        self.assertEqual(["outrage"], get_legal_options(self.request_json))
+
+    def test_force_switch_only_has_switches(self):
+        self.request_json.pop("active")
+        self.request_json[constants.FORCE_SWITCH] = [True]
+
+        self.assertEqual(["switch charmander"], get_legal_options(self.request_json))
+
+    def test_tera_moves_are_options(self):
+        self.request_json["active"][0][constants.CAN_TERASTALLIZE] = "Electric"
+        self.request_json["active"][0][constants.TRAPPED] = True
+
+        self.assertEqual(
+            ["thunderbolt", "thunderbolt-tera", "voltswitch", "voltswitch-tera"],
+            get_legal_options(self.request_json),
+        )
+
+    def test_hiddenpower_uses_the_typed_name(self):
+        self.request_json["active"][0]["moves"] = [
+            {"move": "Hidden Power Fire", "id": "hiddenpower", "pp": 10}
+        ]
+        self.request_json["active"][0][constants.TRAPPED] = True
+
+        self.assertEqual(["hiddenpowerfire"], get_legal_options(self.request_json))
+
+
+class TestFormatDecisionFromRequestJson(unittest.TestCase):
+    def setUp(self):
+        self.request_json = {
+            "active": [{"moves": [make_move("thunderbolt")]}],
+            "side": {
+                "pokemon": [
+                    make_pokemon("pikachu", active=True),
+                    make_pokemon("squirtle", condition="0 fnt"),
+                    make_pokemon("charmander"),
+                ]
+            },
+            "rqid": 3,
+        }
+
+    def test_switch_uses_the_request_index(self):
+        self.assertEqual(
+            ["/switch 3", "3"],
+            format_decision_from_request_json(self.request_json, "switch charmander"),
+        )
+
+    def test_move_with_mega_evolution(self):
+        self.request_json["active"][0][constants.CAN_MEGA_EVO] = True
+
+        self.assertEqual(
+            ["/choose move thunderbolt mega", "3"],
+            format_decision_from_request_json(self.request_json, "thunderbolt"),
+        )
+
+    def test_z_move(self):
+        self.request_json["active"][0][constants.CAN_Z_MOVE] = [{"move": "Gigavolt"}]
+
+        self.assertEqual(
+            ["/choose move thunderbolt zmove", "3"],
+            format_decision_from_request_json(self.request_json, "thunderbolt"),
+        )
+
+    def test_forced_switch_without_an_active_pokemon_request(self):
+        del self.request_json["active"]
+
+        self.assertEqual(
+            ["/switch 3", "3"],
+            format_decision_from_request_json(self.request_json, "switch charmander"),
+        )
+
+    def test_dynamax_only_on_the_last_pokemon(self):
+        self.request_json["active"][0][constants.CAN_DYNAMAX] = True
+        self.assertEqual(
+            ["/choose move thunderbolt", "3"],
+            format_decision_from_request_json(self.request_json, "thunderbolt"),
+        )
+
+        self.request_json["side"]["pokemon"][2] = make_pokemon(
+            "charmander", condition="0 fnt"
+        )
+        self.assertEqual(
+            ["/choose move thunderbolt dynamax", "3"],
+            format_decision_from_request_json(self.request_json, "thunderbolt"),
+        )
+
+
+class TestPrepareSampledBattles(unittest.TestCase):
+    def setUp(self):
+        TeamDatasets.__init__()
+        TeamDatasets.initialize("gen4ou", {"dragonite", "azelf"})
+        self.battle = Battle(None)
+        self.battle.opponent.active = Pokemon("dragonite", 100)
+        self.battle.opponent.reserve = [Pokemon("azelf", 100)]
+
+    def test_each_battle_has_a_set_from_the_datasets(self):
+        battles = prepare_sampled_battles(
+            self.battle, 4, fill_in_battle_factory_unknowns
+        )
+
+        self.assertEqual(4, len(battles))
+        for b, _ in battles:
+            moves = [m.name for m in b.opponent.active.moves]
+            self.assertIn(
+                moves,
+                [s.pkmn_moveset.moves for s in TeamDatasets.pkmn_sets["dragonite"]],
+            )
+
+    def test_chances_sum_to_one(self):
+        battles = prepare_sampled_battles(
+            self.battle, 4, fill_in_battle_factory_unknowns
+        )
+
+        self.assertAlmostEqual(1.0, sum(chance for _, chance in battles))
+
+    def test_original_battle_is_not_modified(self):
+        prepare_sampled_battles(self.battle, 2, fill_in_battle_factory_unknowns)
+
+        self.assertEqual([], self.battle.opponent.active.moves)
+        self.assertEqual([], self.battle.opponent.reserve[0].moves)
@@ -4642,7 +4642,6 @@ class TestInactiveOff(unittest.TestCase):
 
         self.user_active = Pokemon("caterpie", 100)
         self.battle.user.active = self.user_active
-        self.battle.user.active.previous_hp = self.battle.user.active.hp
 
         self.username = "CoolUsername"
 
@@ -1,6 +1,11 @@
 import unittest
 
+import constants
 from data.pkmn_sets import spreads_are_alike
+from data import pokedex
+from fp.helpers import calculate_speed_stats
+from fp.helpers import calculate_stats
+from fp.helpers import get_percentile
 from fp.helpers import get_pokemon_info_from_condition
 from fp.helpers import normalize_name
 
@@ -69,3 +74,69 @@ class TestGetPokemonInfoFromCondition(unittest.TestCase):
         condition_string = "0/100 fnt"
 
         self.assertEqual(0, get_pokemon_info_from_condition(condition_string)[0])
+
+
+class TestGetPercentile(unittest.TestCase):
+    def test_percentile_of_no_values_is_zero(self):
+        self.assertEqual(0, get_percentile([], 50))
+
+    def test_percentile(self):
+        self.assertEqual(90, get_percentile(list(range(100)), 90))
+
+    def test_highest_percentile_is_the_largest_value(self):
+        self.assertEqual(3, get_percentile([3, 1, 2], 100))
+
+
+class TestCalculateStats(unittest.TestCase):
+    def setUp(self):
+        self.base_stats = pokedex["garchomp"][constants.BASESTATS]
+
+    def test_stats_for_a_spread(self):
+        self.assertEqual(
+            {
+                constants.HITPOINTS: 357,
+                constants.ATTACK: 359,
+                constants.DEFENSE: 226,
+                constants.SPECIAL_ATTACK: 176,
+                constants.SPECIAL_DEFENSE: 207,
+                constants.SPEED: 333,
+            },
+            calculate_stats(
+                self.base_stats, 100, evs=(0, 252, 0, 0, 4, 252), nature="jolly"
+            ),
+        )
+
+    def test_changing_the_returned_stats_does_not_change_later_results(self):
+        stats = calculate_stats(self.base_stats, 100)
+        stats.pop(constants.HITPOINTS)
+
+        self.assertIn(constants.HITPOINTS, calculate_stats(self.base_stats, 100))
+
+
+class TestCalculateSpeedStats(unittest.TestCase):
+    def setUp(self):
+        self.base_stats = pokedex["garchomp"][constants.BASESTATS]
+
+    def test_speeds_match_calculate_stats(self):
+        spreads = [
+            ("jolly", (0, 252, 0, 0, 4, 252)),
+            ("adamant", (0, 252, 0, 0, 4, 252)),
+            ("brave", (252, 252, 0, 0, 4, 0)),
+            ("timid", (0, 0, 0, 252, 4, 250)),
+            ("serious", (85, 85, 85, 85, 85, 85)),
+        ]
+
+        self.assertEqual(
+            [
+                calculate_stats(self.base_stats, 84, evs=evs, nature=nature)[
+                    constants.SPEED
+                ]
+                for nature, evs in spreads
+            ],
+            calculate_speed_stats(self.base_stats[constants.SPEED], 84, spreads),
+        )
+
+    def test_no_spreads(self):
+        self.assertEqual(
+            [], calculate_speed_stats(self.base_stats[constants.SPEED], 100, [])
+        )
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from fp.local_server import (
+    LocalShowdownServer,
+    load_recordings,
+    needs_decision,
+    read_battle_log,
+    rename_players,
+    split_messages,
+)
+from fp.websocket_client import PSWebsocketClient
+
+
+def request_line(side_id, name, **kwargs):
+    request_json = {"side": {"id": side_id, "name": name, "pokemon": []}, "rqid": 1}
+    request_json.update(kwargs)
+    return "|request|{}".format(json.dumps(request_json))
+
+
+def battle_lines(side_id, name):
+    return [
+        "|init|battle",
+        "|title|alice vs. bob",
+        "|j|☆{}".format(name),
+        request_line(side_id, name),
+        "|",
+        "|player|p1|alice|1|",
+        "|player|p2|bob|2|",
+        "|start",
+        "|turn|1",
+        "|c|☆bob|hi",
+        request_line(side_id, name, wait=True),
+        "|",
+        "|win|alice",
+    ]
+
+
+def write_battle_log(path, battle_tag, lines):
+    with open(path, "w") as f:
+        f.write("INFO     Logging in...\n")
+        f.write(
+            "DEBUG    Received message from websocket: >{}\n".format(battle_tag)
+            + "\n".join(lines)
+            + "\n"
+        )
+        f.write("DEBUG    Received message from websocket: |updatesearch|{}\n")
+        f.write("|not|a|battle|line\n")
+
+
+class TestLoadRecordings(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.log_dir.cleanup)
+
+    def log_path(self, name):
+        return os.path.join(self.log_dir.name, name)
+
+    def test_battle_lines_are_read_from_the_log(self):
+        lines = battle_lines("p1", "alice")
+        write_battle_log(self.log_path("a.log"), "battle-gen9randombattle-5", lines)
+
+        self.assertEqual(
+            {"battle-gen9randombattle-5": lines},
+            read_battle_log(self.log_path("a.log")),
+        )
+
+    def test_both_sides_of_a_battle_are_one_recording(self):
+        write_battle_log(
+            self.log_path("a.log"),
+            "battle-gen9randombattle-5",
+            battle_lines("p1", "alice"),
+        )
+        write_battle_log(
+            self.log_path("b.log"),
+            "battle-gen9randombattle-5",
+            battle_lines("p2", "bob"),
+        )
+
+        recordings = load_recordings([self.log_path("a.log"), self.log_path("b.log")])
+
+        self.assertEqual(1, len(recordings))
+        self.assertEqual("gen9randombattle", recordings[0].battle_format)
+        self.assertEqual({"p1": "alice", "p2": "bob"}, recordings[0].names)
+        self.assertEqual(["p1", "p2"], sorted(recordings[0].sides))
+
+    def test_unfinished_battles_are_not_recordings(self):
+        write_battle_log(
+            self.log_path("a.log"),
+            "battle-gen9randombattle-5",
+            battle_lines("p1", "alice")[:-1],
+        )
+
+        self.assertEqual([], load_recordings([self.log_path("a.log")]))
+
+
+class TestSplitMessages(unittest.TestCase):
+    def test_requests_are_their_own_messages(self):
+        messages = split_messages(battle_lines("p1", "alice"))
+
+        self.assertEqual(4, len(messages))
+        self.assertTrue(messages[0].startswith("|request|"))
+        self.assertEqual(
+            "|\n|player|p1|alice|1|\n|player|p2|bob|2|\n|start\n|turn|1", messages[1]
+        )
+        self.assertTrue(messages[2].startswith("|request|"))
+        self.assertEqual("|\n|win|alice", messages[3])
+
+    def test_only_requests_without_wait_need_a_decision(self):
+        self.assertTrue(needs_decision(request_line("p1", "alice")))
+        self.assertFalse(needs_decision(request_line("p1", "alice", wait=True)))
+        self.assertFalse(needs_decision("|turn|1"))
+
+
+class TestRenamePlayers(unittest.TestCase):
+    def test_player_and_winner_are_renamed(self):
+        renames = {"alice": "localbot"}
+
+        self.assertEqual(
+            "|player|p1|localbot|1|", rename_players("|player|p1|alice|1|", renames)
+        )
+        self.assertEqual("|win|localbot", rename_players("|win|alice", renames))
+        self.assertEqual("|win|bob", rename_players("|win|bob", renames))
+
+    def test_request_side_is_renamed(self):
+        line = rename_players(request_line("p1", "alice"), {"alice": "localbot"})
+
+        self.assertEqual("localbot", json.loads(line.split("|", 2)[2])["side"]["name"])
+
+
+class TestLocalShowdownServer(unittest.TestCase):
+    def setUp(self):
+        log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(log_dir.cleanup)
+        log_path = os.path.join(log_dir.name, "a.log")
+        write_battle_log(
+            log_path, "battle-gen9randombattle-5", battle_lines("p1", "alice")
+        )
+        self.server = LocalShowdownServer(load_recordings([log_path]))
+
+    def test_battle_is_replayed_to_a_client(self):
+        async def play():
+            await self.server.start("localhost", 0, 0)
+            port = self.server.websocket_server.sockets[0].getsockname()[1]
+            login_port = self.server.login_server.server_address[1]
+            client = await PSWebsocketClient.create(
+                "localbot",
+                "password",
+                "ws://localhost:{}".format(port),
+                login_uri="http://localhost:{}".format(login_port),
+            )
+            try:
+                await client.login()
+                await client.search_for_match("gen9randombattle", None)
+                battle_tag = await client.wait_for_new_battle()
+                messages = [await client.receive_room_message(battle_tag)]
+                while "|turn|1" not in messages[-1]:
+                    messages.append(await client.receive_room_message(battle_tag))
+                await client.send_message(battle_tag, ["/choose move 1|1"])
+                while "|win|" not in messages[-1]:
+                    messages.append(await client.receive_room_message(battle_tag))
+                return battle_tag, messages
+            finally:
+                await client.close()
+                await self.server.close()
+
+        battle_tag, messages = asyncio.run(asyncio.wait_for(play(), 10))
+
+        self.assertEqual("battle-gen9randombattle-1", battle_tag)
+        self.assertIn("|title|localbot vs. bob", messages[0])
+        self.assertTrue(messages[0].endswith("|j|☆localbot"))
+        self.assertIn("|player|p1|localbot|1|", messages[2])
+        self.assertTrue(messages[-1].endswith("|win|localbot"))
+        self.assertEqual(1, len(self.server.decision_latencies_ms))
+        self.assertEqual(1, self.server.decision_count)
+        self.assertEqual(1, self.server.finished_battles)
@@ -0,0 +1,105 @@
+import unittest
+
+from poke_engine import Pokemon as PokeEnginePokemon
+from poke_engine import Side as PokeEngineSide
+
+from fp.battle_bots.minimax.priors import (
+    MovePrior,
+    defender_can_switch,
+    get_dominated_moves,
+)
+
+
+class TestGetDominatedMoves(unittest.TestCase):
+    def test_immune_damaging_move_is_dominated(self):
+        priors = [
+            MovePrior("earthquake", 0.0, 0, 0),
+            MovePrior("icebeam", 0.4, 80, 95),
+        ]
+
+        self.assertEqual({"earthquake"}, get_dominated_moves(priors))
+
+    def test_weaker_plain_move_is_dominated(self):
+        priors = [
+            MovePrior("tackle", 0.1, 20, 24),
+            MovePrior("return", 0.4, 80, 95),
+        ]
+
+        self.assertEqual({"tackle"}, get_dominated_moves(priors))
+
+    def test_overlapping_damage_is_not_dominated(self):
+        priors = [
+            MovePrior("tackle", 0.1, 20, 24),
+            MovePrior("return", 0.4, 22, 95),
+        ]
+
+        self.assertEqual(set(), get_dominated_moves(priors))
+
+    def test_less_accurate_move_does_not_dominate(self):
+        priors = [
+            MovePrior("tackle", 0.1, 20, 24),
+            MovePrior("megakick", 0.4, 80, 95),
+        ]
+
+        self.assertEqual(set(), get_dominated_moves(priors))
+
+    def test_moves_with_secondary_effects_are_not_dominated(self):
+        priors = [
+            MovePrior("thunderbolt", 0.2, 40, 48),
+            MovePrior("return", 0.4, 80, 95),
+        ]
+
+        self.assertEqual(set(), get_dominated_moves(priors))
+
+    def test_status_moves_are_not_dominated(self):
+        priors = [
+            MovePrior("swordsdance", None),
+            MovePrior("return", 0.4, 80, 95),
+        ]
+
+        self.assertEqual(set(), get_dominated_moves(priors))
+
+    def test_variable_power_move_is_not_dominated(self):
+        priors = [
+            MovePrior("eruption", 0.1, 20, 24),
+            MovePrior("hex", 0.1, 20, 24),
+            MovePrior("payback", 0.1, 20, 24),
+            MovePrior("return", 0.4, 80, 95),
+        ]
+
+        self.assertEqual(set(), get_dominated_moves(priors))
+
+    def test_variable_power_move_does_not_dominate(self):
+        priors = [
+            MovePrior("tackle", 0.1, 20, 24),
+            MovePrior("facade", 0.4, 80, 95),
+        ]
+
+        self.assertEqual(set(), get_dominated_moves(priors))
+
+    def test_move_of_another_category_does_not_dominate(self):
+        priors = [
+            MovePrior("tackle", 0.1, 20, 24),
+            MovePrior("dazzlinggleam", 0.4, 80, 95),
+        ]
+
+        self.assertEqual(set(), get_dominated_moves(priors))
+
+
+class TestDefenderCanSwitch(unittest.TestCase):
+    def make_side(self, reserve_hp: list[int], force_trapped=False):
+        return PokeEngineSide(
+            active_index="0",
+            pokemon=[PokeEnginePokemon(id="pikachu", level=100, hp=100)]
+            + [PokeEnginePokemon(id="pikachu", level=100, hp=hp) for hp in reserve_hp],
+            force_trapped=force_trapped,
+        )
+
+    def test_defender_with_an_alive_reserve_can_switch(self):
+        self.assertTrue(defender_can_switch(self.make_side([0, 50])))
+
+    def test_defender_without_alive_reserves_cannot_switch(self):
+        self.assertFalse(defender_can_switch(self.make_side([0, 0])))
+
+    def test_trapped_defender_cannot_switch(self):
+        self.assertFalse(defender_can_switch(self.make_side([50], force_trapped=True)))
@@ -1,6 +1,8 @@
+import contextvars
 import unittest
 
-from data.pkmn_sets import TeamDatasets, SmogonSets
+from data.pkmn_sets import TeamDatasets, SmogonSets, start_battle_pkmn_sets
+from fp.battle import Pokemon
 
 
 class TestTeamDatasets(unittest.TestCase):
@@ -95,3 +97,94 @@ class TestSmogonDatasets(unittest.TestCase):
         self.assertNotEqual(initial_len, len_after_pop)
         SmogonSets.add_new_pokemon("azelf")
         self.assertEqual(len_after_pop, len(SmogonSets.pkmn_sets["dragonite"]))
+
+
+class TestTeamDatasetsGetAllRemainingSets(unittest.TestCase):
+    def setUp(self):
+        TeamDatasets.__init__()
+        TeamDatasets.initialize("gen4ou", {"dragonite"})
+
+    def test_all_sets_remain_for_unrevealed_pokemon(self):
+        pkmn = Pokemon("dragonite", 100)
+        self.assertEqual(
+            len(TeamDatasets.pkmn_sets["dragonite"]),
+            len(TeamDatasets.get_all_remaining_sets(pkmn)),
+        )
+
+    def test_revealed_item_removes_sets(self):
+        pkmn = Pokemon("dragonite", 100)
+        pkmn.item = "not_an_item_in_any_set"
+        self.assertEqual([], TeamDatasets.get_all_remaining_sets(pkmn))
+        self.assertEqual(
+            len(TeamDatasets.pkmn_sets["dragonite"]),
+            len(TeamDatasets.get_all_remaining_sets(pkmn, match_traits=False)),
+        )
+
+
+class TestTeamDatasetsInitializeSameMode(unittest.TestCase):
+    def setUp(self):
+        TeamDatasets.__init__()
+
+    def test_initializing_the_same_mode_keeps_existing_raw_sets(self):
+        TeamDatasets.initialize("gen4ou", {"dragonite"})
+        TeamDatasets.initialize("gen4ou", {"azelf"})
+
+        self.assertIn("dragonite", TeamDatasets.raw_pkmn_sets)
+        self.assertNotIn("dragonite", TeamDatasets.pkmn_sets)
+        self.assertIn("azelf", TeamDatasets.pkmn_sets)
+
+    def test_initializing_a_different_mode_removes_existing_pokemon(self):
+        TeamDatasets.initialize("gen4ou", {"dragonite"})
+        TeamDatasets.initialize("gen5ou", {"azelf"})
+
+        self.assertNotIn("dragonite", TeamDatasets.raw_pkmn_sets)
+        self.assertNotIn("dragonite", TeamDatasets.pkmn_sets)
+        self.assertIn("azelf", TeamDatasets.pkmn_sets)
+
+
+class TestBattlePkmnSets(unittest.TestCase):
+    def setUp(self):
+        TeamDatasets.__init__()
+        TeamDatasets.initialize("gen4ou", {"dragonite"})
+        self.num_dragonite_sets = len(TeamDatasets.pkmn_sets["dragonite"])
+
+    @staticmethod
+    def start_battle():
+        start_battle_pkmn_sets()
+        TeamDatasets.initialize("gen4ou", {"dragonite"})
+        return TeamDatasets.pkmn_sets["dragonite"]
+
+    def test_consecutive_battles_each_start_with_every_set(self):
+        first_battle_sets = contextvars.Context().run(self.start_battle)
+        first_battle_sets.pop(0)
+        second_battle_sets = contextvars.Context().run(self.start_battle)
+
+        self.assertEqual(self.num_dragonite_sets, len(second_battle_sets))
+
+    def test_removing_sets_in_one_battle_does_not_change_a_battle_in_progress(self):
+        first_battle = contextvars.Context()
+        second_battle = contextvars.Context()
+        first_battle_sets = first_battle.run(self.start_battle)
+        second_battle_sets = second_battle.run(self.start_battle)
+
+        first_battle.run(
+            TeamDatasets.remove_item_possibility, "dragonite", "choiceband"
+        )
+        first_battle_sets.pop(0)
+
+        self.assertEqual(self.num_dragonite_sets, len(second_battle_sets))
+        self.assertIs(
+            second_battle_sets,
+            second_battle.run(lambda: TeamDatasets.pkmn_sets["dragonite"]),
+        )
+
+    def test_search_in_a_copy_of_the_battle_context_sees_its_sets(self):
+        battle = contextvars.Context()
+        battle_sets = battle.run(self.start_battle)
+        battle_sets.pop(0)
+
+        search_context = battle.run(contextvars.copy_context)
+
+        self.assertIs(
+            battle_sets, search_context.run(lambda: TeamDatasets.pkmn_sets["dragonite"])
+        )
@@ -0,0 +1,416 @@
+import threading
+import time
+import unittest
+
+import constants
+
+from poke_engine import IterativeDeepeningResult, MctsResult, MctsSideResult
+from poke_engine import State as PokeEngineState
+
+from fp.battle import Battle, LastUsedMove, Pokemon
+from fp.search_pool import SearchPool
+from fp.battle_bots.poke_engine_helpers import (
+    SearchSession,
+    WorldResult,
+    battle_to_poke_engine_state,
+    deduplicate_states,
+    get_state_signature,
+    get_transition,
+    get_worst_case_move_values,
+    merge_mcts_results,
+    poke_engine_get_damage_rolls,
+    poke_engine_get_damage_rolls_for_variants,
+    pokemon_to_poke_engine_pkmn,
+    search_worlds,
+    select_safest_move,
+    with_disabled_moves,
+)
+
+Battle.__abstractmethods__ = set()
+
+
+def make_mcts_result(side_one_visits: dict, total_score_per_visit=0.5):
+    return MctsResult(
+        side_one=[
+            MctsSideResult(
+                move_choice=move,
+                total_score=visits * total_score_per_visit,
+                visits=visits,
+            )
+            for move, visits in side_one_visits.items()
+        ],
+        side_two=[MctsSideResult(move_choice="tackle", total_score=0, visits=1)],
+        total_visits=sum(side_one_visits.values()),
+    )
+
+
+def side_one_visits(mcts_result):
+    return {o.move_choice: o.visits for o in mcts_result.side_one}
+
+
+class TestMergeMctsResults(unittest.TestCase):
+    def test_visits_are_summed_for_each_move(self):
+        merged = merge_mcts_results(
+            [
+                make_mcts_result({"tackle": 10, "growl": 5}),
+                make_mcts_result({"tackle": 20, "switch pikachu": 5}),
+            ]
+        )
+
+        self.assertEqual(
+            {"tackle": 30, "growl": 5, "switch pikachu": 5}, side_one_visits(merged)
+        )
+        self.assertEqual(40, merged.total_visits)
+
+    def test_weights_scale_each_result(self):
+        merged = merge_mcts_results(
+            [
+                make_mcts_result({"tackle": 10}),
+                make_mcts_result({"tackle": 20}),
+            ],
+            [0.5, 1.0],
+        )
+
+        self.assertEqual({"tackle": 25}, side_one_visits(merged))
+        self.assertEqual(12.5, merged.side_one[0].total_score)
+
+
+class TestSearchSession(unittest.TestCase):
+    def setUp(self):
+        self.session = SearchSession(max_entries=2, decay=0.5)
+        self.transition = ("tackle", "growl")
+
+    def test_first_search_of_a_state_is_unchanged(self):
+        result = make_mcts_result({"tackle": 10})
+
+        self.assertEqual(
+            [result], self.session.warm_start(self.transition, [("state", result)])
+        )
+
+    def test_same_state_and_transition_is_warm_started(self):
+        self.session.warm_start(
+            self.transition, [("state", make_mcts_result({"tackle": 10}))]
+        )
+        [result] = self.session.warm_start(
+            self.transition, [("state", make_mcts_result({"tackle": 10}))]
+        )
+
+        self.assertEqual({"tackle": 15}, side_one_visits(result))
+
+    def test_different_transition_is_not_warm_started(self):
+        self.session.warm_start(
+            self.transition, [("state", make_mcts_result({"tackle": 10}))]
+        )
+        [result] = self.session.warm_start(
+            ("switch pikachu", "growl"), [("state", make_mcts_result({"tackle": 10}))]
+        )
+
+        self.assertEqual({"tackle": 10}, side_one_visits(result))
+
+    def test_worlds_of_one_decision_are_not_warm_started_with_each_other(self):
+        results = self.session.warm_start(
+            self.transition,
+            [
+                ("state", make_mcts_result({"swordsdance": 100, "earthquake": 0})),
+                ("state", make_mcts_result({"swordsdance": 0, "earthquake": 100})),
+            ],
+        )
+
+        self.assertEqual(
+            [
+                {"swordsdance": 100, "earthquake": 0},
+                {"swordsdance": 0, "earthquake": 100},
+            ],
+            [side_one_visits(r) for r in results],
+        )
+
+    def test_each_previous_world_warm_starts_one_world(self):
+        self.session.warm_start(
+            self.transition,
+            [
+                ("state", make_mcts_result({"tackle": 10})),
+                ("state", make_mcts_result({"tackle": 20})),
+            ],
+        )
+        results = self.session.warm_start(
+            self.transition,
+            [
+                ("state", make_mcts_result({"tackle": 10})),
+                ("state", make_mcts_result({"tackle": 10})),
+                ("state", make_mcts_result({"tackle": 10})),
+            ],
+        )
+
+        self.assertEqual(
+            [{"tackle": 15}, {"tackle": 20}, {"tackle": 10}],
+            [side_one_visits(r) for r in results],
+        )
+
+    def test_oldest_entries_are_evicted(self):
+        for state in ["a", "b", "c"]:
+            self.session.warm_start(
+                self.transition, [(state, make_mcts_result({"tackle": 1}))]
+            )
+
+        self.assertEqual(
+            [(self.transition, "b"), (self.transition, "c")],
+            list(self.session.results.keys()),
+        )
+
+
+class TestSearchSessionConsecutiveTurns(unittest.TestCase):
+    def setUp(self):
+        self.session = SearchSession(decay=0.5)
+        self.battle = Battle(None)
+        self.battle.turn = 1
+        self.battle.user.active = Pokemon("pikachu", 100)
+        self.battle.user.active.add_move("thunderbolt")
+        self.battle.user.active.add_move("voltswitch")
+        self.battle.user.reserve = [Pokemon("charizard", 100)]
+        self.battle.opponent.active = Pokemon("gyarados", 100)
+        self.battle.opponent.active.add_move("waterfall")
+
+    def play_turn(self):
+        self.battle.turn += 1
+        self.battle.user.active.hp -= 10
+        self.battle.opponent.active.hp -= 10
+        self.battle.user.active.get_move("thunderbolt").current_pp -= 1
+        self.battle.opponent.active.get_move("waterfall").current_pp -= 1
+        self.battle.user.last_used_move = LastUsedMove(
+            "pikachu", "thunderbolt", self.battle.turn
+        )
+        self.battle.opponent.last_used_move = LastUsedMove(
+            "gyarados", "waterfall", self.battle.turn
+        )
+
+    def signature(self):
+        return get_state_signature(battle_to_poke_engine_state(self.battle))
+
+    def search(self, visits):
+        [result] = self.session.warm_start(
+            get_transition(self.battle),
+            [(self.signature(), make_mcts_result(visits))],
+        )
+        return result
+
+    def test_next_turn_of_the_same_matchup_is_warm_started(self):
+        self.play_turn()
+        self.search({"thunderbolt": 10, "voltswitch": 10})
+        self.play_turn()
+        result = self.search({"thunderbolt": 10, "voltswitch": 10})
+
+        self.assertEqual({"thunderbolt": 15, "voltswitch": 15}, side_one_visits(result))
+
+    def test_options_that_are_no_longer_available_are_dropped(self):
+        self.play_turn()
+        self.search({"thunderbolt": 10, "voltswitch": 10})
+        self.play_turn()
+        result = self.search({"thunderbolt": 10})
+
+        self.assertEqual({"thunderbolt": 15}, side_one_visits(result))
+        self.assertEqual(15, result.total_visits)
+
+    def test_different_active_pokemon_is_not_warm_started(self):
+        self.play_turn()
+        self.search({"thunderbolt": 10, "voltswitch": 10})
+        self.play_turn()
+        self.battle.user.active, self.battle.user.reserve[0] = (
+            self.battle.user.reserve[0],
+            self.battle.user.active,
+        )
+        result = self.search({"thunderbolt": 10, "voltswitch": 10})
+
+        self.assertEqual({"thunderbolt": 10, "voltswitch": 10}, side_one_visits(result))
+
+    def test_boosts_change_the_signature(self):
+        signature = self.signature()
+        self.battle.opponent.active.boosts[constants.ATTACK] = 2
+
+        self.assertNotEqual(signature, self.signature())
+
+    def test_hazards_change_the_signature(self):
+        signature = self.signature()
+        self.battle.user.side_conditions[constants.STEALTH_ROCK] = 1
+
+        self.assertNotEqual(signature, self.signature())
+
+    def test_weather_changes_the_signature(self):
+        signature = self.signature()
+        self.battle.weather = constants.RAIN
+
+        self.assertNotEqual(signature, self.signature())
+
+    def test_terrain_changes_the_signature(self):
+        signature = self.signature()
+        self.battle.field = constants.ELECTRIC_TERRAIN
+
+        self.assertNotEqual(signature, self.signature())
+
+
+class TestDeduplicateStates(unittest.TestCase):
+    def test_identical_states_are_merged(self):
+        unique_states = deduplicate_states(
+            [PokeEngineState(), PokeEngineState(), PokeEngineState(weather="rain")],
+            [0.25, 0.25, 0.5],
+        )
+
+        self.assertEqual(2, len(unique_states))
+        self.assertEqual(0.5, unique_states[0].weight)
+        self.assertEqual(2, unique_states[0].count)
+        self.assertEqual(0.5, unique_states[1].weight)
+        self.assertEqual(1, unique_states[1].count)
+
+    def test_distinct_states_are_kept_in_order(self):
+        states = [PokeEngineState(weather="rain"), PokeEngineState(weather="sun")]
+        unique_states = deduplicate_states(states, [0.5, 0.5])
+
+        self.assertEqual(states, [s.state for s in unique_states])
+
+
+class TestGetWorstCaseMoveValues(unittest.TestCase):
+    def test_each_row_gives_the_worst_case_of_one_move(self):
+        id_result = IterativeDeepeningResult(
+            side_one=["tackle", "growl"],
+            side_two=["tackle", "growl"],
+            matrix=[0.1, 0.9, 0.4, 0.5],
+            depth_searched=2,
+        )
+
+        self.assertEqual(
+            {"tackle": 0.1, "growl": 0.4}, get_worst_case_move_values(id_result)
+        )
+
+    def test_pruned_entries_are_skipped(self):
+        id_result = IterativeDeepeningResult(
+            side_one=["tackle", "growl"],
+            side_two=["tackle", "growl"],
+            matrix=[0.1, None, None, None],
+            depth_searched=2,
+        )
+
+        self.assertEqual({"tackle": 0.1}, get_worst_case_move_values(id_result))
+
+
+class TestSelectSafestMove(unittest.TestCase):
+    def test_single_world_picks_the_best_worst_case(self):
+        self.assertEqual(
+            "growl", select_safest_move([({"tackle": 0.1, "growl": 0.4}, 1.0)])
+        )
+
+    def test_worlds_are_weighted_by_chance(self):
+        move_values = [
+            ({"tackle": 0.9, "growl": 0.4}, 0.25),
+            ({"tackle": 0.1, "growl": 0.4}, 0.75),
+        ]
+
+        self.assertEqual("growl", select_safest_move(move_values))
+
+    def test_move_missing_from_a_world_gets_its_lowest_value(self):
+        move_values = [
+            ({"tackle": 0.9, "growl": 0.4}, 0.5),
+            ({"growl": 0.4, "switch pikachu": 0.2}, 0.5),
+        ]
+
+        # tackle: 0.5 * 0.9 + 0.5 * 0.2
+        self.assertEqual("tackle", select_safest_move(move_values))
+
+
+class TestPokemonToPokeEnginePkmn(unittest.TestCase):
+    def setUp(self):
+        self.pkmn = Pokemon("pikachu", 100)
+        self.pkmn.add_move("thunderbolt")
+        self.pkmn.add_move("voltswitch")
+
+    def test_unchanged_pokemon_reuses_the_engine_pokemon(self):
+        self.assertIs(
+            pokemon_to_poke_engine_pkmn(self.pkmn),
+            pokemon_to_poke_engine_pkmn(self.pkmn),
+        )
+
+    def test_pokemon_is_built_again_after_its_hp_changes(self):
+        before = pokemon_to_poke_engine_pkmn(self.pkmn)
+        self.pkmn.hp -= 10
+
+        after = pokemon_to_poke_engine_pkmn(self.pkmn)
+
+        self.assertIsNot(before, after)
+        self.assertEqual(self.pkmn.hp, after.hp)
+
+    def test_pokemon_is_built_again_after_a_move_is_used(self):
+        before = pokemon_to_poke_engine_pkmn(self.pkmn)
+        self.pkmn.get_move("thunderbolt").current_pp -= 1
+
+        after = pokemon_to_poke_engine_pkmn(self.pkmn)
+
+        self.assertIsNot(before, after)
+        self.assertEqual(
+            self.pkmn.get_move("thunderbolt").current_pp, after.moves[0].pp
+        )
+
+    def test_disabling_moves_does_not_change_the_shared_engine_pokemon(self):
+        engine_pkmn = pokemon_to_poke_engine_pkmn(self.pkmn)
+
+        pruned = with_disabled_moves(engine_pkmn, {"thunderbolt"})
+
+        self.assertTrue(pruned.moves[0].disabled)
+        self.assertFalse(engine_pkmn.moves[0].disabled)
+        self.assertIs(engine_pkmn, pokemon_to_poke_engine_pkmn(self.pkmn))
+
+
+class TestPokeEngineGetDamageRollsForVariants(unittest.TestCase):
+    def setUp(self):
+        self.battle = Battle(None)
+        self.battle.user.active = Pokemon("pikachu", 100)
+        self.battle.user.active.add_move("thunderbolt")
+        self.battle.opponent.active = Pokemon("gyarados", 100)
+        self.battle.opponent.active.add_move("waterfall")
+
+        self.variants = [
+            ("intimidate", "leftovers", "adamant", (0, 252, 0, 0, 4, 252)),
+            ("moxie", "choiceband", "jolly", (252, 0, 252, 0, 4, 0)),
+        ]
+
+    def get_damage_rolls(self, ability, item, nature, evs):
+        battle = self.battle.snapshot()
+        battle.opponent.active.ability = ability
+        battle.opponent.active.item = item
+        battle.opponent.active.set_spread(nature, evs)
+        return poke_engine_get_damage_rolls(battle, "thunderbolt", "waterfall", True)
+
+    def test_rolls_match_a_state_built_for_each_variant(self):
+        rolls = poke_engine_get_damage_rolls_for_variants(
+            self.battle, "thunderbolt", "waterfall", True, self.variants
+        )
+
+        self.assertEqual(
+            [self.get_damage_rolls(*variant) for variant in self.variants], rolls
+        )
+
+    def test_battle_is_not_changed(self):
+        poke_engine_get_damage_rolls_for_variants(
+            self.battle, "thunderbolt", "waterfall", True, self.variants
+        )
+
+        self.assertIsNone(self.battle.opponent.active.ability)
+        self.assertEqual("serious", self.battle.opponent.active.nature)
+
+
+class TestSearchWorldsPoolRestart(unittest.TestCase):
+    def setUp(self):
+        SearchPool.start(1)
+        # the worker is busy so the search's batch is still queued when the pool is restarted
+        for _ in range(2):
+            SearchPool.submit(time.sleep, 0.5)
+
+    def tearDown(self):
+        SearchPool.shutdown()
+
+    def test_search_ends_when_the_pool_is_restarted(self):
+        restart = threading.Timer(0.2, SearchPool.restart)
+        restart.start()
+        start = time.time()
+        results = list(search_worlds([PokeEngineState().to_string()], [1.0], 1000))
+        restart.join()
+
+        self.assertEqual([WorldResult(0, None, 0)], results)
+        self.assertLess(time.time() - start, 2)
@@ -0,0 +1,72 @@
+import unittest
+from dataclasses import dataclass
+
+from fp.battle_bots.policy_aggregator import PolicyAggregator
+
+
+# same shape as poke_engine's MctsResult / MctsSideResult
+@dataclass
+class SideResult:
+    move_choice: str
+    total_score: float
+    visits: int
+
+
+@dataclass
+class SearchResult:
+    side_one: list[SideResult]
+    total_visits: int
+
+
+def make_result(visits: dict) -> SearchResult:
+    return SearchResult(
+        side_one=[SideResult(move, 0.5 * v, v) for move, v in visits.items()],
+        total_visits=sum(visits.values()),
+    )
+
+
+class TestPolicyAggregator(unittest.TestCase):
+    def setUp(self):
+        self.aggregator = PolicyAggregator()
+
+    def test_policy_is_weighted_by_sample_chance(self):
+        self.aggregator.add(make_result({"tackle": 75, "growl": 25}), 0.5, 0)
+        self.aggregator.add(make_result({"tackle": 25, "growl": 75}), 0.25, 1)
+
+        self.assertEqual({"tackle": 0.4375, "growl": 0.3125}, self.aggregator.policy())
+        self.assertEqual("tackle", self.aggregator.best_move())
+
+    def test_newer_result_replaces_older_result_for_the_same_world(self):
+        self.aggregator.add(make_result({"tackle": 10, "growl": 90}), 1.0, 0)
+        self.aggregator.add(make_result({"tackle": 90, "growl": 10}), 1.0, 0)
+
+        self.assertEqual(1, self.aggregator.num_results)
+        self.assertEqual("tackle", self.aggregator.best_move())
+
+    def test_clear_winner_with_many_visits_is_converged(self):
+        self.aggregator.add(make_result({"tackle": 90000, "growl": 10000}), 1.0, 0)
+
+        self.assertTrue(self.aggregator.is_converged(pending_weight=0))
+
+    def test_close_policy_is_not_converged(self):
+        self.aggregator.add(make_result({"tackle": 5050, "growl": 4950}), 1.0, 0)
+
+        self.assertFalse(self.aggregator.is_converged(pending_weight=0))
+
+    def test_few_visits_are_not_converged(self):
+        self.aggregator.add(make_result({"tackle": 14, "growl": 6}), 1.0, 0)
+
+        self.assertFalse(self.aggregator.is_converged(pending_weight=0))
+
+    def test_pending_worlds_can_overtake_the_leader(self):
+        self.aggregator.add(make_result({"tackle": 90000, "growl": 10000}), 0.5, 0)
+
+        self.assertFalse(self.aggregator.is_converged(pending_weight=0.5))
+
+    def test_single_option_is_converged(self):
+        self.aggregator.add(make_result({"switch pikachu": 100}), 0.1, 0)
+
+        self.assertTrue(self.aggregator.is_converged(pending_weight=0.9))
+
+    def test_no_results_is_not_converged(self):
+        self.assertFalse(self.aggregator.is_converged(pending_weight=1.0))
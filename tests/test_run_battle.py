@@ -0,0 +1,92 @@
+import asyncio
+import time
+import unittest
+
+from fp.battle import Battle
+from fp.run_battle import DecisionCache, _search_lock, check_search_pool_health
+from fp.search_pool import SearchPool
+
+Battle.__abstractmethods__ = set()
+
+
+class TestDecisionCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = DecisionCache(max_entries=2)
+        self.battle = Battle("battle-gen9ou-1")
+        self.battle.rqid = 3
+        self.battle.turn = 1
+        self.battle.request_json = {"rqid": 3, "active": [{"moves": []}]}
+
+    def test_same_request_is_answered_from_the_cache(self):
+        self.cache.put(self.cache.get_key(self.battle), "tackle", ["/choose move 1"])
+
+        self.assertEqual(
+            ("tackle", ["/choose move 1"]),
+            self.cache.get(self.cache.get_key(self.battle)),
+        )
+
+    def test_different_rqid_is_not_cached(self):
+        self.cache.put(self.cache.get_key(self.battle), "tackle", ["/choose move 1"])
+        self.battle.rqid = 4
+
+        self.assertIsNone(self.cache.get(self.cache.get_key(self.battle)))
+
+    def test_different_state_with_the_same_rqid_is_not_cached(self):
+        self.cache.put(self.cache.get_key(self.battle), "tackle", ["/choose move 1"])
+        self.battle.request_json = {"rqid": 3, "forceSwitch": [True]}
+
+        self.assertIsNone(self.cache.get(self.cache.get_key(self.battle)))
+
+    def test_battle_without_an_rqid_is_never_cached(self):
+        self.battle.rqid = None
+        self.cache.put(self.cache.get_key(self.battle), "tackle", ["/choose move 1"])
+
+        self.assertEqual(0, len(self.cache.decisions))
+
+    def test_least_recently_used_decision_is_evicted(self):
+        for rqid in [1, 2, 3]:
+            self.battle.rqid = rqid
+            self.cache.put(self.cache.get_key(self.battle), "tackle", [str(rqid)])
+
+        self.assertEqual([2, 3], [rqid for _, rqid, _ in self.cache.decisions.keys()])
+
+
+class TestCheckSearchPoolHealth(unittest.TestCase):
+    def setUp(self):
+        SearchPool.start(1)
+        self.executor = SearchPool.executor
+        # keeps the only worker busy so the health check has to wait for it
+        self.busy = SearchPool.submit(time.sleep, 1)
+
+    def tearDown(self):
+        self.busy.result()
+        SearchPool.shutdown()
+
+    def test_pool_is_not_checked_while_a_search_holds_it(self):
+        async def check_during_search():
+            async with _search_lock:
+                start = time.time()
+                await check_search_pool_health()
+                return time.time() - start
+
+        self.assertLess(asyncio.run(check_during_search()), 0.5)
+        self.assertIs(self.executor, SearchPool.executor)
+
+    def test_event_loop_keeps_running_during_the_check(self):
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.05)
+
+        async def check():
+            ticker = asyncio.create_task(tick())
+            await check_search_pool_health()
+            ticker.cancel()
+
+        asyncio.run(check())
+
+        self.assertGreater(ticks, 5)
+        self.assertIs(self.executor, SearchPool.executor)
@@ -0,0 +1,154 @@
+import os
+import subprocess
+import sys
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+
+import time
+
+from fp.search_pool import (
+    SharedStrings,
+    _SearchPool,
+    channel_closed,
+    publish,
+    read_shared_strings,
+)
+
+
+def add(a, b):
+    return a + b
+
+
+def count_to(channel_id, n):
+    for i in range(n):
+        publish(channel_id, i)
+    return n
+
+
+def publish_until_closed(channel_id):
+    count = 0
+    while not channel_closed(channel_id):
+        publish(channel_id, count)
+        count += 1
+        time.sleep(0.01)
+    return count
+
+
+def crash():
+    os._exit(1)
+
+
+class TestSearchPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = _SearchPool()
+        self.pool.start(2)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_run_returns_results_in_order(self):
+        results = self.pool.run(add, [(1, 2), (3, 4), (5, 6)])
+
+        self.assertEqual([3, 7, 11], results)
+
+    def test_workers_are_reused_between_runs(self):
+        executor = self.pool.executor
+        self.pool.run(add, [(1, 2)])
+        self.pool.run(add, [(1, 2)])
+
+        self.assertIs(executor, self.pool.executor)
+
+    def test_pool_is_restarted_after_a_worker_crashes(self):
+        with self.assertRaises(BrokenProcessPool):
+            self.pool.submit(crash).result()
+
+        self.assertEqual(3, self.pool.submit(add, 1, 2).result())
+
+    def test_unhealthy_pool_is_replaced(self):
+        with self.assertRaises(BrokenProcessPool):
+            self.pool.submit(crash).result()
+        broken_executor = self.pool.executor
+
+        self.pool.ensure_healthy()
+
+        self.assertIsNot(broken_executor, self.pool.executor)
+        self.assertTrue(self.pool.is_healthy())
+
+    def test_restart_with_stale_executor_does_nothing(self):
+        stale_executor = self.pool.executor
+        self.pool.restart()
+        current_executor = self.pool.executor
+
+        self.pool.restart(stale_executor)
+
+        self.assertIs(current_executor, self.pool.executor)
+
+    def test_published_messages_arrive_on_their_channel(self):
+        channel_id, channel = self.pool.open_channel()
+        other_channel_id, other_channel = self.pool.open_channel()
+
+        self.pool.run(count_to, [(channel_id, 3), (other_channel_id, 1)])
+
+        self.assertEqual([0, 1, 2], [channel.get(timeout=5) for _ in range(3)])
+        self.assertEqual(0, other_channel.get(timeout=5))
+        self.assertTrue(channel.empty())
+
+    def test_channels_work_after_a_restart(self):
+        self.pool.restart()
+        channel_id, channel = self.pool.open_channel()
+
+        self.pool.run(count_to, [(channel_id, 1)])
+
+        self.assertEqual(0, channel.get(timeout=5))
+
+    def test_closing_a_channel_stops_its_jobs(self):
+        channel_id, channel = self.pool.open_channel()
+        fut = self.pool.submit(publish_until_closed, channel_id)
+        channel.get(timeout=5)
+
+        self.pool.close_channel(channel_id)
+
+        self.assertGreater(fut.result(timeout=5), 0)
+
+    def test_jobs_can_read_shared_strings(self):
+        shared_strings = SharedStrings(["abc", "", "défg"])
+        try:
+            result = self.pool.submit(
+                read_shared_strings,
+                shared_strings.name,
+                [shared_strings.locations[2], shared_strings.locations[0]],
+            ).result()
+        finally:
+            shared_strings.close()
+
+        self.assertEqual(["défg", "abc"], result)
+
+
+READ_SHARED_STRINGS_SCRIPT = """
+from fp.search_pool import SharedStrings, _SearchPool, read_shared_strings
+
+pool = _SearchPool()
+pool.start(2)
+for _ in range(3):
+    shared_strings = SharedStrings(["abc"])
+    try:
+        pool.run(
+            read_shared_strings, [(shared_strings.name, shared_strings.locations)] * 4
+        )
+    finally:
+        shared_strings.close()
+pool.shutdown()
+"""
+
+
+class TestSharedStringsResourceTracking(unittest.TestCase):
+    def test_reading_shared_strings_in_workers_does_not_leak(self):
+        result = subprocess.run(
+            [sys.executable, "-c", READ_SHARED_STRINGS_SCRIPT],
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+
+        self.assertEqual(0, result.returncode, result.stderr)
+        self.assertNotIn("resource_tracker", result.stderr)
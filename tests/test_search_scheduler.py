@@ -0,0 +1,42 @@
+import time
+import unittest
+
+from fp.battle_bots.mcts_randbats.search_scheduler import (
+    AGGREGATION_MARGIN_MS,
+    DeadlineScheduler,
+)
+
+
+class TestDeadlineScheduler(unittest.TestCase):
+    def test_search_budget_leaves_room_for_aggregation(self):
+        scheduler = DeadlineScheduler(1000, 4)
+
+        self.assertLessEqual(scheduler.search_budget_ms(), 1000 - AGGREGATION_MARGIN_MS)
+        self.assertGreater(scheduler.search_budget_ms(), 900)
+
+    def test_time_before_the_search_counts_against_the_budget(self):
+        scheduler = DeadlineScheduler(100, 4)
+        time.sleep(0.05)
+
+        self.assertLessEqual(scheduler.search_budget_ms(), 50)
+
+    def test_search_budget_is_zero_when_over_budget(self):
+        scheduler = DeadlineScheduler(0, 1)
+
+        self.assertEqual(0, scheduler.search_budget_ms())
+
+    def test_skipped_searches_are_counted(self):
+        scheduler = DeadlineScheduler(200, 4)
+        scheduler.record(100)
+        scheduler.record(0)
+
+        report = scheduler.report()
+        self.assertEqual(1, report.searches_completed)
+        self.assertEqual(1, report.searches_skipped)
+
+    def test_search_time_is_split_between_workers(self):
+        scheduler = DeadlineScheduler(200, 2)
+        for _ in range(4):
+            scheduler.record(50)
+
+        self.assertEqual(100, scheduler.report().search_ms)
@@ -0,0 +1,69 @@
+import unittest
+
+from supervisor import (
+    get_cpu_slices,
+    get_shard_parallelism,
+    parse_accounts,
+    summarize_results,
+)
+
+
+class TestParseAccounts(unittest.TestCase):
+    def test_accounts_with_and_without_passwords(self):
+        self.assertEqual(
+            [("bot1", "hunter2"), ("bot2", "")], parse_accounts("bot1:hunter2,bot2")
+        )
+
+    def test_password_can_contain_a_colon(self):
+        self.assertEqual([("bot1", "a:b")], parse_accounts("bot1:a:b"))
+
+    def test_empty_entries_are_ignored(self):
+        self.assertEqual([("bot1", "")], parse_accounts("bot1, ,"))
+
+
+class TestGetCpuSlices(unittest.TestCase):
+    def test_cpus_are_split_evenly(self):
+        self.assertEqual([[0, 1], [2, 3]], get_cpu_slices(2, [0, 1, 2, 3]))
+
+    def test_leftover_cpus_go_to_the_first_shards(self):
+        self.assertEqual([[0, 1], [2]], get_cpu_slices(2, [0, 1, 2]))
+
+    def test_shards_share_cpus_when_there_are_more_shards_than_cpus(self):
+        self.assertEqual([[0], [1], [0]], get_cpu_slices(3, [0, 1]))
+
+
+class TestGetShardParallelism(unittest.TestCase):
+    def test_defaults_to_the_number_of_cpus(self):
+        self.assertEqual(4, get_shard_parallelism(None, 4))
+
+    def test_configured_parallelism_is_capped_by_the_cpus(self):
+        self.assertEqual(4, get_shard_parallelism("16", 4))
+
+    def test_lower_configured_parallelism_is_kept(self):
+        self.assertEqual(2, get_shard_parallelism("2", 4))
+
+
+class TestSummarizeResults(unittest.TestCase):
+    def test_totals_and_win_rate(self):
+        lines = summarize_results(
+            [
+                {
+                    "username": "bot1",
+                    "wins": 3,
+                    "losses": 1,
+                    "decision_latencies_ms": [100, 200],
+                },
+                {
+                    "username": "bot2",
+                    "wins": 1,
+                    "losses": 3,
+                    "decision_latencies_ms": [300],
+                },
+            ]
+        )
+
+        self.assertTrue(lines[3].startswith("total"))
+        self.assertEqual(
+            ["total", "4", "4", "3", "200", "300", "300"], lines[3].split()
+        )
+        self.assertEqual("Win rate: 50.0% over 8 battles", lines[4])
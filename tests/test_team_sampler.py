@@ -0,0 +1,83 @@
+import unittest
+
+from data.pkmn_sets import PokemonMoveset, PokemonSet, PredictedPokemonSet
+from fp.battle import Battle, Pokemon
+from fp.battle_bots.mcts_randbats.team_sampler import (
+    MAX_SAMPLED_BATTLES,
+    get_num_battles_to_sample,
+    get_set_entropy,
+)
+
+# so we can instantiate a Battle object for testing
+Battle.__abstractmethods__ = set()
+
+
+def make_sets(*counts):
+    return [
+        PredictedPokemonSet(
+            pkmn_set=PokemonSet(
+                ability="static",
+                item="lightball",
+                nature="serious",
+                evs=(85, 85, 85, 85, 85, 85),
+                count=count,
+            ),
+            pkmn_moveset=PokemonMoveset(moves=()),
+        )
+        for count in counts
+    ]
+
+
+class TestGetSetEntropy(unittest.TestCase):
+    def test_one_set_has_no_entropy(self):
+        self.assertEqual(0, get_set_entropy(make_sets(10)))
+
+    def test_two_equally_likely_sets_is_one_bit(self):
+        self.assertEqual(1, get_set_entropy(make_sets(5, 5)))
+
+    def test_uneven_sets_have_less_entropy(self):
+        self.assertLess(get_set_entropy(make_sets(9, 1)), 1)
+
+    def test_no_sets_has_no_entropy(self):
+        self.assertEqual(0, get_set_entropy([]))
+
+
+class TestGetNumBattlesToSample(unittest.TestCase):
+    def setUp(self):
+        self.battle = Battle(None)
+        self.battle.opponent.active = Pokemon("pikachu", 100)
+        self.battle.opponent.reserve = [
+            Pokemon(name, 100)
+            for name in ["charmander", "squirtle", "bulbasaur", "eevee", "snorlax"]
+        ]
+        self.sets = {
+            p.name: make_sets(1)
+            for p in [self.battle.opponent.active] + self.battle.opponent.reserve
+        }
+
+    def test_certain_sets_need_one_battle(self):
+        self.assertEqual(1, get_num_battles_to_sample(self.battle, self.sets))
+
+    def test_uncertain_sets_need_more_battles(self):
+        self.sets["pikachu"] = make_sets(1, 1)
+        self.sets["eevee"] = make_sets(1, 1)
+
+        self.assertEqual(4, get_num_battles_to_sample(self.battle, self.sets))
+
+    def test_fainted_pokemon_do_not_add_uncertainty(self):
+        self.sets["eevee"] = make_sets(1, 1)
+        self.battle.opponent.reserve[3].hp = 0
+
+        self.assertEqual(1, get_num_battles_to_sample(self.battle, self.sets))
+
+    def test_unrevealed_pokemon_add_uncertainty(self):
+        self.battle.opponent.reserve = self.battle.opponent.reserve[:3]
+
+        self.assertEqual(4, get_num_battles_to_sample(self.battle, self.sets))
+
+    def test_number_of_battles_is_capped(self):
+        self.battle.opponent.reserve = []
+
+        self.assertEqual(
+            MAX_SAMPLED_BATTLES, get_num_battles_to_sample(self.battle, self.sets)
+        )
@@ -0,0 +1,79 @@
+import unittest
+
+from config import FoulPlayConfig
+from fp.battle import Battle, Move, Pokemon
+from fp.battle_bots.time_management import (
+    FORCED_SEARCH_TIME_MS,
+    get_num_user_options,
+    get_search_time_ms,
+)
+
+# so we can instantiate a Battle object for testing
+Battle.__abstractmethods__ = set()
+
+
+class TestTimeManagement(unittest.TestCase):
+    def setUp(self):
+        FoulPlayConfig.search_time_ms = 1000
+        FoulPlayConfig.dynamic_search_time = True
+
+        self.battle = Battle(None)
+        self.battle.turn = 10
+        self.battle.user.active = Pokemon("pikachu", 100)
+        self.battle.user.active.moves = [
+            Move(m) for m in ["thunderbolt", "volttackle", "agility", "surf"]
+        ]
+        self.battle.user.reserve = [
+            Pokemon(name, 100) for name in ["charmander", "squirtle", "bulbasaur"]
+        ]
+        self.battle.opponent.active = Pokemon("eevee", 100)
+        self.battle.opponent.reserve = [
+            Pokemon(name, 100) for name in ["snorlax", "gengar", "alakazam"]
+        ]
+
+    def tearDown(self):
+        FoulPlayConfig.dynamic_search_time = False
+
+    def test_fixed_search_time_when_disabled(self):
+        FoulPlayConfig.dynamic_search_time = False
+        self.battle.force_switch = True
+        self.battle.user.reserve = self.battle.user.reserve[:1]
+
+        self.assertEqual(1000, get_search_time_ms(self.battle))
+
+    def test_user_options_include_moves_and_switches(self):
+        self.assertEqual(7, get_num_user_options(self.battle))
+
+    def test_trapped_user_can_only_use_moves(self):
+        self.battle.user.trapped = True
+        self.battle.user.active.moves[0].disabled = True
+
+        self.assertEqual(3, get_num_user_options(self.battle))
+
+    def test_force_switch_with_one_reserve_is_not_searched(self):
+        self.battle.force_switch = True
+        self.battle.user.reserve[1].hp = 0
+        self.battle.user.reserve[2].hp = 0
+
+        self.assertEqual(FORCED_SEARCH_TIME_MS, get_search_time_ms(self.battle))
+
+    def test_fewer_options_get_less_time(self):
+        search_time_ms = get_search_time_ms(self.battle)
+        self.battle.user.trapped = True
+
+        self.assertLess(get_search_time_ms(self.battle), search_time_ms)
+
+    def test_endgame_gets_more_time(self):
+        for pkmn in self.battle.user.reserve + self.battle.opponent.reserve:
+            pkmn.hp = 0
+
+        self.assertGreater(get_search_time_ms(self.battle), 1000 * 0.5)
+
+    def test_battle_timer_caps_search_time(self):
+        search_time_ms = get_search_time_ms(self.battle)
+
+        self.battle.time_remaining = 60
+        self.assertEqual(search_time_ms, get_search_time_ms(self.battle))
+
+        self.battle.time_remaining = 5
+        self.assertEqual(500, get_search_time_ms(self.battle))
@@ -0,0 +1,188 @@
+import asyncio
+import unittest
+
+from fp.websocket_client import (
+    ConnectionLostError,
+    PSWebsocketClient,
+    get_room,
+    get_unseen_lines,
+)
+
+
+INIT_MESSAGE = ">battle-gen9randombattle-1\n|init|battle\n|title|a vs. b"
+
+
+class TestGetRoom(unittest.TestCase):
+    def test_room_is_read_from_the_first_line(self):
+        self.assertEqual("battle-gen9randombattle-1", get_room(INIT_MESSAGE))
+
+    def test_global_message_has_no_room(self):
+        self.assertEqual("", get_room("|challstr|4|abc"))
+
+
+class TestRouteMessage(unittest.TestCase):
+    def setUp(self):
+        self.client = PSWebsocketClient()
+
+    def test_global_messages_go_to_the_global_queue(self):
+        self.client.route_message("|challstr|4|abc")
+
+        self.assertEqual("|challstr|4|abc", self.client.global_messages.get_nowait())
+
+    def test_init_message_opens_a_new_battle(self):
+        self.client.route_message(INIT_MESSAGE)
+
+        self.assertEqual(
+            "battle-gen9randombattle-1", self.client.new_battles.get_nowait()
+        )
+        self.assertEqual(
+            INIT_MESSAGE,
+            self.client.rooms["battle-gen9randombattle-1"].get_nowait(),
+        )
+
+    def test_messages_go_to_their_own_battle(self):
+        self.client.route_message(INIT_MESSAGE)
+        self.client.route_message(INIT_MESSAGE.replace("-1", "-2"))
+        self.client.route_message(">battle-gen9randombattle-2\n|turn|2")
+
+        self.assertEqual(1, self.client.rooms["battle-gen9randombattle-1"].qsize())
+        self.assertEqual(2, self.client.rooms["battle-gen9randombattle-2"].qsize())
+        self.assertTrue(self.client.global_messages.empty())
+
+    def test_messages_for_rooms_without_a_queue_are_dropped(self):
+        self.client.route_message(">battle-gen9randombattle-1\n|turn|2")
+        self.client.route_message(">lobby\n|init|chat")
+
+        self.assertEqual({}, self.client.rooms)
+        self.assertTrue(self.client.new_battles.empty())
+        self.assertTrue(self.client.global_messages.empty())
+
+    def test_oldest_global_message_is_dropped_when_the_queue_is_full(self):
+        for i in range(self.client.global_messages.maxsize + 1):
+            self.client.route_message("|pm|{}".format(i))
+
+        self.assertEqual("|pm|1", self.client.global_messages.get_nowait())
+
+    def test_lost_connection_is_raised_to_every_reader(self):
+        self.client.global_messages.put_nowait(None)
+
+        async def receive_twice():
+            for _ in range(2):
+                with self.assertRaises(ConnectionLostError):
+                    await self.client.receive_message()
+
+        asyncio.run(receive_twice())
+
+
+class TestWaitForLoginConfirmation(unittest.TestCase):
+    def setUp(self):
+        self.client = PSWebsocketClient()
+        self.client.username = "Foul Play"
+
+    def wait(self):
+        async def wait_for_login_confirmation():
+            await asyncio.wait_for(self.client.wait_for_login_confirmation(), 0.1)
+
+        asyncio.run(wait_for_login_confirmation())
+
+    def test_named_updateuser_confirms_the_login(self):
+        self.client.route_message("|updateuser| Guest 1|0|1|{}")
+        self.client.route_message("|updateuser| foulplay@!|1|1|{}")
+
+        self.wait()
+
+    def test_guest_updateuser_does_not_confirm_the_login(self):
+        self.client.route_message("|updateuser| Guest 1|0|1|{}")
+
+        with self.assertRaises(asyncio.TimeoutError):
+            self.wait()
+
+
+class TestGetUnseenLines(unittest.TestCase):
+    def test_lines_after_the_seen_lines_are_unseen(self):
+        seen = ["|init|battle", "|turn|1", "|move|p1a: Pikachu|Thunderbolt"]
+        log = seen + ["|move|p2a: Eevee|Tackle", "|turn|2"]
+
+        self.assertEqual(
+            ["|move|p2a: Eevee|Tackle", "|turn|2"], get_unseen_lines(seen, log)
+        )
+
+    def test_requests_and_chat_are_skipped_while_matching(self):
+        seen = ["|init|battle", '|request|{"rqid": 1}', "|turn|1", "|c|a|hi"]
+        log = ["|init|battle", "|j|a", "|turn|1", "|t:|123", "|turn|2"]
+
+        self.assertEqual(["|turn|2"], get_unseen_lines(seen, log))
+
+    def test_nothing_is_unseen_when_nothing_was_missed(self):
+        seen = ["|init|battle", "|turn|1"]
+
+        self.assertEqual([], get_unseen_lines(seen, seen))
+
+    def test_seen_lines_are_dropped_when_the_log_differs(self):
+        seen = ["|init|battle", "|turn|1", "|-damage|p2a: Eevee|50/100"]
+        log = ["|init|battle", "|turn|1", "|-damage|p2a: Eevee|49/100", "|turn|2"]
+
+        self.assertEqual(["|turn|2"], get_unseen_lines(seen, log))
+
+
+class TestRejoinBattleRoom(unittest.TestCase):
+    def setUp(self):
+        self.client = PSWebsocketClient()
+        self.client.route_message(INIT_MESSAGE)
+        self.client.route_message(">battle-gen9randombattle-1\n|turn|1")
+        self.room = self.client.rooms["battle-gen9randombattle-1"]
+        while not self.room.empty():
+            self.room.get_nowait()
+
+    def test_rejoining_only_sends_the_missed_lines(self):
+        self.client.route_message(INIT_MESSAGE + "\n|turn|1\n|turn|2")
+
+        self.assertEqual(">battle-gen9randombattle-1\n|turn|2", self.room.get_nowait())
+        self.assertEqual(1, self.client.new_battles.qsize())
+
+    def test_rejoining_without_missed_lines_sends_nothing(self):
+        self.client.route_message(INIT_MESSAGE + "\n|turn|1")
+
+        self.assertTrue(self.room.empty())
+
+    def test_room_that_cannot_be_rejoined_is_lost(self):
+        self.client.route_message(
+            ">battle-gen9randombattle-1\n|noinit|nonexistent|The room does not exist."
+        )
+
+        async def receive():
+            await self.client.receive_room_message("battle-gen9randombattle-1")
+
+        with self.assertRaises(ConnectionLostError):
+            asyncio.run(receive())
+
+    def test_room_that_cannot_be_rejoined_is_not_joined_again(self):
+        self.client.route_message(
+            ">battle-gen9randombattle-1\n|noinit|nonexistent|The room does not exist."
+        )
+
+        self.assertNotIn("battle-gen9randombattle-1", self.client.rooms)
+        self.assertNotIn("battle-gen9randombattle-1", self.client.room_logs)
+        self.assertIsNone(self.room.get_nowait())
+
+
+class TestLeaveBattle(unittest.TestCase):
+    def setUp(self):
+        self.client = PSWebsocketClient()
+        self.client.route_message(INIT_MESSAGE)
+        self.sent = []
+
+        async def send(message):
+            self.sent.append(message)
+
+        self.client._send = send
+        self.client.connected.set()
+
+    def test_room_and_its_log_are_removed(self):
+        self.client.route_message(">battle-gen9randombattle-1\n|deinit")
+
+        asyncio.run(self.client.leave_battle("battle-gen9randombattle-1"))
+
+        self.assertEqual(["|/leave battle-gen9randombattle-1"], self.sent)
+        self.assertEqual({}, self.client.rooms)
+        self.assertEqual({}, self.client.room_logs)